@@ -5,6 +5,7 @@
 import logging
 import os
 import sys
+from contextvars import ContextVar
 from subprocess import check_output
 
 import sentry_sdk
@@ -55,29 +56,63 @@ except ModuleNotFoundError:
     raise
 
 
-logger_extra: dict[str, str] = {}
+# The rule and the log level of the current context: the rules running
+# concurrently in threads must not change them for each other.
+log_rule: ContextVar[str | None] = ContextVar("log_rule", default=None)
+log_level: ContextVar[int] = ContextVar("log_level", default=logging.INFO)
 
 
-def create_logger(logger_extra):
+class ContextFilter(logging.Filter):
+    """Filter the log records with the level of the current context and tag
+    them with its rule"""
+
+    def filter(self, record):
+        if record.levelno < log_level.get():
+            return False
+
+        rule = log_rule.get()
+        if rule is not None:
+            record.bugbot_rule = rule
+        return True
+
+
+def set_log_level(level: int) -> None:
+    """Set the log level of the current context
+
+    The level of the root logger is lowered to the lowest level used by a
+    context, so the records are only created when a context may keep them.
+    """
+    log_level.set(level)
+    root = logging.getLogger()
+    if level < root.level:
+        root.setLevel(level)
+
+
+def create_logger():
     path = utils.get_config("common", "log")
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    context_filter = ContextFilter()
 
+    # The level of each context is checked by the filter
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    logger.setLevel(log_level.get())
+    logger.addFilter(context_filter)
 
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
+    handler.addFilter(context_filter)
     logger.addHandler(handler)
 
     error = logging.FileHandler(path)
     error.setLevel(logging.ERROR)
     error.setFormatter(formatter)
+    error.addFilter(context_filter)
     logger.addHandler(error)
 
-    return logging.LoggerAdapter(logger, logger_extra)
+    return logger
 
 
-logger = create_logger(logger_extra)
+logger = create_logger()
 
 
 def _handle_uncaught_exception(exc_type, exc_value, exc_traceback):
@@ -90,3 +125,14 @@ def _handle_uncaught_exception(exc_type, exc_value, exc_traceback):
 
 
 sys.excepthook = _handle_uncaught_exception
+
+# The requests are counted before the HTTP cache, so only the ones which
+# reach the network are counted.
+from . import metrics  # noqa: E402
+
+metrics.install()
+
+if utils.get_config("http_cache", "enabled", False):
+    from . import http_cache
+
+    http_cache.install()
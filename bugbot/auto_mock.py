@@ -15,6 +15,7 @@ from urllib.parse import parse_qsl, urlparse
 from urllib.request import Request, urlopen
 
 import responses
+from requests.exceptions import ConnectionError
 
 from bugbot import logger
 
@@ -28,27 +29,33 @@ class MockTestCase(unittest.TestCase):
     """
 
     mock_urls: List[str] = []
+    mock_methods: List[str] = [responses.GET]
+    # When False, a request without a mock file fails instead of being sent
+    allow_network: bool = True
 
     def setUp(self):
         # Setup mock callbacks
         for mock_url in self.mock_urls:
             url_re = re.compile(rf"^{mock_url}")
-            responses.add_callback(
-                responses.GET,
-                url_re,
-                callback=self._request_callback,
-                content_type="application/json",
-            )
+            for method in self.mock_methods:
+                responses.add_callback(
+                    method,
+                    url_re,
+                    callback=self._request_callback,
+                    content_type="application/json",
+                )
 
     def _request_callback(self, request):
         logger.debug("Mock request %s %s", request.method, request.url)
-        path = self._build_path(request.method, request.url)
+        path = self._build_path(request.method, request.url, request.body)
 
         if os.path.exists(path):
             # Load local file
             logger.info("Using mock file %s", path)
             with open(path, "r") as file:
                 response = json.load(file)
+        elif not self.allow_network:
+            raise ConnectionError(f"No mock file {path} for {request.url}")
         else:
             # Build from actual request
             logger.info("Building mock file %s", path)
@@ -60,9 +67,9 @@ class MockTestCase(unittest.TestCase):
 
         return (response["status"], response["headers"], response["body"])
 
-    def _build_path(self, method, url):
+    def _build_path(self, method, url, body=None):
         """
-        Build a unique filename from method & url
+        Build a unique filename from method & url (& body if any)
         """
         # Build directory to request
         out = urlparse(url)
@@ -79,6 +86,10 @@ class MockTestCase(unittest.TestCase):
         if len(query_str) > 150:
             hashed_query = hashlib.md5(query_str.encode("utf-8")).hexdigest()
             query_str = f"{query_str[0:100]}_{hashed_query}"
+        if body:
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            query_str += "_" + hashlib.md5(body).hexdigest()
         filename = f"{method}_{query_str}.json"
 
         # Build directory
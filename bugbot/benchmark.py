@@ -0,0 +1,317 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Benchmark rules offline by replaying recorded HTTP traffic.
+
+The responses of Bugzilla, Socorro, Phabricator, ... are replayed from the
+mock files of `bugbot.auto_mock` (under `tests/mocks`), so the rules run in
+dry-run mode without any network access. For each rule, we measure the wall
+time, the CPU time, the peak of memory allocated by Python and the number of
+requests, and we compare them to a baseline.
+
+The rules are taken from the `benchmark` section of the configuration. Most
+of the queries depend on the date, so the rules should be given a fixed
+`--date` to replay the same requests every day. Each run starts from an
+empty cache directory and without the data shared between the rules (people,
+bugs store, ...), so the measures don't depend on the previous runs.
+
+Usage:
+    # Record the missing mock files (needs the network) and the baseline
+    python -m bugbot.benchmark --record --update-baseline
+    # Check for regressions
+    python -m bugbot.benchmark
+"""
+
+import argparse
+import json
+import logging
+import os
+import shlex
+import tempfile
+import time
+import tracemalloc
+from typing import NamedTuple
+from unittest import mock
+
+import responses
+
+from bugbot import logger, templates, utils
+from bugbot.auto_mock import MockTestCase
+from bugbot.bug.analyzer import BugsStore
+from bugbot.bugbug_utils import PredictionCache
+from bugbot.bugzilla_users import BugzillaUsers
+from bugbot.cache import SQLiteCacheEntries
+from bugbot.components import Components
+from bugbot.crash.processed_crashes import ProcessedCrashes
+from bugbot.crash.signature_index import CrashSignatureIndex
+from bugbot.http_cache import ResponseStore
+from bugbot.people import People
+from bugbot.phabricator_users import PhabricatorUsers
+from bugbot.round_robin import RoundRobin
+from bugbot.runner import RuleInvocation, get_module_name, run_rule
+from bugbot.topcrash import TopcrashSnapshot
+from bugbot.url_shortener import UrlShortener
+
+BASELINE_PATH = "tests/benchmarks/baseline.json"
+MOCK_URLS = [
+    "https://bugzilla.mozilla.org",
+    "https://crash-stats.mozilla.org",
+    "https://phabricator.services.mozilla.com",
+    "https://hg.mozilla.org",
+    "https://whattrainisitnow.com",
+    "https://bugbug.moz.tools",
+]
+MEASURES = ("wall", "cpu", "peak_memory", "requests")
+SHARED = [
+    BugsStore,
+    BugzillaUsers,
+    Components,
+    CrashSignatureIndex,
+    People,
+    PhabricatorUsers,
+    PredictionCache,
+    ProcessedCrashes,
+    ResponseStore,
+    SQLiteCacheEntries,
+    TopcrashSnapshot,
+    UrlShortener,
+]
+
+
+class Measure(NamedTuple):
+    """The resources used by a rule"""
+
+    rule: str
+    success: bool
+    wall: float
+    cpu: float
+    peak_memory: int
+    requests: int
+
+
+class ErrorCounter(logging.Handler):
+    """Count the errors logged"""
+
+    def __init__(self):
+        super(ErrorCounter, self).__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class ReplayTestCase(MockTestCase):
+    mock_urls = MOCK_URLS
+    mock_methods = [responses.GET, responses.POST]
+    allow_network = False
+
+
+def get_invocation(command: str) -> RuleInvocation:
+    """Get the invocation from a command like `no_assignee --date 2024-01-15`;
+    the rule is always run in dry-run mode"""
+    rule, *args = shlex.split(command)
+    return RuleInvocation(
+        get_module_name(rule), [arg for arg in args if arg != "--production"]
+    )
+
+
+def reset_shared_data() -> None:
+    """Forget the data shared between the rules of the process"""
+    for cls in SHARED:
+        cls._instance = None
+    RoundRobin._instances.clear()
+    templates._env = None
+
+
+def replay(command: str, record: bool = False) -> Measure:
+    """Run a rule with the HTTP traffic replayed from the mock files.
+
+    Args:
+        command: the rule and its arguments.
+        record: if True, the requests without a mock file are sent and their
+            response is recorded.
+    """
+    invocation = get_invocation(command)
+    case = ReplayTestCase()
+    case.allow_network = record
+
+    # The rules log their exceptions instead of raising them
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    cache_dir = tempfile.TemporaryDirectory()
+    common = mock.patch.dict(utils._get_config()["common"], {"cache": cache_dir.name})
+    common.start()
+    reset_shared_data()
+    responses.start()
+    try:
+        case.setUp()
+        tracemalloc.reset_peak()
+        memory, _ = tracemalloc.get_traced_memory()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        result = run_rule(invocation)
+
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        _, peak = tracemalloc.get_traced_memory()
+        requests = len(responses.calls)
+    finally:
+        responses.stop()
+        responses.reset()
+        reset_shared_data()
+        common.stop()
+        cache_dir.cleanup()
+        logging.getLogger().removeHandler(errors)
+
+    success = result.success and errors.count == 0
+    return Measure(command, success, wall, cpu, peak - memory, requests)
+
+
+def run(commands: list[str], repeat: int = 1, record: bool = False) -> list[Measure]:
+    """Benchmark the rules.
+
+    Each run starts with an empty cache, so the data shared between the
+    rules (people, bugs store, ...) are loaded by every rule. When the rules
+    are run several times, the best measures are kept.
+    """
+    tracemalloc.start()
+    try:
+        measures = []
+        for command in commands:
+            runs = [replay(command, record) for _ in range(repeat)]
+            measures.append(
+                Measure(
+                    command,
+                    all(m.success for m in runs),
+                    min(m.wall for m in runs),
+                    min(m.cpu for m in runs),
+                    min(m.peak_memory for m in runs),
+                    min(m.requests for m in runs),
+                )
+            )
+    finally:
+        tracemalloc.stop()
+
+    return measures
+
+
+def compare(
+    measures: list[Measure],
+    baseline: dict[str, dict[str, float]],
+    thresholds: dict[str, float],
+) -> list[str]:
+    """Compare the measures to the baseline.
+
+    Args:
+        measures: the new measures.
+        baseline: the measures of reference by rule command.
+        thresholds: the maximal relative increase of each measure (e.g., 0.2
+            for +20%).
+
+    Returns:
+        The description of the regressions.
+    """
+    regressions = []
+    for measure in measures:
+        if not measure.success:
+            regressions.append(f"{measure.rule}: failed")
+            continue
+
+        reference = baseline.get(measure.rule)
+        if reference is None:
+            continue
+
+        for key, threshold in thresholds.items():
+            new, old = getattr(measure, key), reference[key]
+            if new > old * (1 + threshold):
+                regressions.append(
+                    f"{measure.rule}: {key} {old:g} -> {new:g} (threshold +{threshold:.0%})"
+                )
+
+    return regressions
+
+
+def load_baseline(path: str) -> dict[str, dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as In:
+        return json.load(In)
+
+
+def save_baseline(measures: list[Measure], path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        measure.rule: {key: getattr(measure, key) for key in MEASURES}
+        for measure in measures
+    }
+    with open(path, "w") as Out:
+        json.dump(data, Out, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark rules with the recorded HTTP traffic"
+    )
+    parser.add_argument(
+        "-r",
+        "--rules",
+        dest="rules",
+        nargs="+",
+        default=utils.get_config("benchmark", "rules", []),
+        help="The rules with their arguments (e.g., 'no_assignee --date 2024-01-15')",
+    )
+    parser.add_argument(
+        "--baseline",
+        dest="baseline",
+        default=BASELINE_PATH,
+        help="The file with the measures of reference",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        dest="update_baseline",
+        action="store_true",
+        help="Save the measures as the new baseline",
+    )
+    parser.add_argument(
+        "--record",
+        dest="record",
+        action="store_true",
+        help="Send the requests without a mock file and record their responses",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=utils.get_config("benchmark", "repeat", 1),
+        help="The number of runs of each rule (the best measures are kept)",
+    )
+    args = parser.parse_args()
+
+    measures = run(args.rules, args.repeat, args.record)
+    for measure in measures:
+        logger.info(
+            "%s: %s, wall %.2fs, cpu %.2fs, peak memory %.1fMB, %d requests",
+            measure.rule,
+            "ok" if measure.success else "failed",
+            measure.wall,
+            measure.cpu,
+            measure.peak_memory / 1e6,
+            measure.requests,
+        )
+
+    if args.update_baseline:
+        save_baseline(measures, args.baseline)
+        logger.info("Baseline saved in %s", args.baseline)
+    else:
+        regressions = compare(
+            measures,
+            load_baseline(args.baseline),
+            utils.get_config("benchmark", "thresholds", {}),
+        )
+        for regression in regressions:
+            logger.error("Regression: %s", regression)
+        if regressions:
+            raise SystemExit(1)
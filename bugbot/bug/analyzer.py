@@ -2,7 +2,10 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-
+import copy
+import threading
+import time
+from collections import OrderedDict, defaultdict
 from functools import cached_property
 from typing import Any, Iterable, NamedTuple
 
@@ -168,13 +171,139 @@ class BugNotInStoreError(LookupError):
 
 
 class BugsStore:
-    """A class to retrieve bugs."""
+    """A class to retrieve bugs.
+
+    The store remembers the fields that were fetched for each bug, so a bug is
+    requested again to Bugzilla only for the fields or the bugs that are
+    missing, or when the data is older than `max_age` seconds. The expired
+    bugs, and the oldest ones above `max_bugs`, are removed when a bug is
+    added.
+    """
+
+    # The pseudo-field recorded when the bugs are fetched with the default
+    # fields (i.e., no `include_fields`).
+    DEFAULT_FIELDS = "_default"
+
+    _instance = None
 
     def __init__(
-        self, bugs: Iterable[dict] = (), versions_map: dict[str, int] | None = None
+        self,
+        bugs: Iterable[dict] = (),
+        versions_map: dict[str, int] | None = None,
+        max_age: float | None = None,
+        max_bugs: int | None = None,
     ):
-        self.bugs = {bug["id"]: BugAnalyzer(bug, self) for bug in bugs}
+        """Constructor
+
+        Args:
+            bugs: The bugs to put in the store.
+            versions_map: The versions to use instead of the current ones.
+            max_age: The number of seconds after which the data of a bug must
+                be fetched again. If `None`, the data never expires.
+            max_bugs: The maximum number of bugs kept in the store. If `None`,
+                the number of bugs is not bounded.
+        """
+        # The bugs are ordered by the time they were fetched
+        self.bugs: OrderedDict[int, BugAnalyzer] = OrderedDict()
         self.versions_map = versions_map
+        self.max_age = max_age
+        self.max_bugs = max_bugs
+        self._fields: dict[int, set[str]] = {}
+        self._fetched_at: dict[int, float] = {}
+        self._lock = threading.RLock()
+        for bug in bugs:
+            self.add_bug(bug)
+
+    @staticmethod
+    def get_instance() -> "BugsStore":
+        """Get the store shared by all the rules running in this process."""
+        if BugsStore._instance is None:
+            BugsStore._instance = BugsStore(
+                max_age=utils.get_config("common", "bugs_store_max_age", 900),
+                max_bugs=utils.get_config("common", "bugs_store_max_bugs", 10000),
+            )
+        return BugsStore._instance
+
+    @staticmethod
+    def _get_fields(include_fields: Iterable[str] | str | None) -> set[str]:
+        if include_fields is None:
+            return {BugsStore.DEFAULT_FIELDS}
+        if isinstance(include_fields, str):
+            return {include_fields, "id"}
+        return set(include_fields) | {"id"}
+
+    def add_bug(
+        self, bug: dict, include_fields: Iterable[str] | str | None = None
+    ) -> "BugAnalyzer":
+        """Add or complete a bug in the store.
+
+        Args:
+            bug: The bug data as returned by Bugzilla.
+            include_fields: The fields that were requested to get the bug; if
+                `None`, only the fields in the bug data are known.
+
+        Returns:
+            The bug in the store.
+        """
+        fields = set(bug.keys())
+        if include_fields is not None:
+            fields |= self._get_fields(include_fields)
+
+        bug_id = bug["id"]
+        with self._lock:
+            if bug_id in self.bugs and not self._is_expired(bug_id):
+                self.bugs[bug_id]._bug.update(bug)
+                self._fields[bug_id] |= fields
+            else:
+                self._remove(bug_id)
+                self.bugs[bug_id] = BugAnalyzer(bug, self)
+                self._fields[bug_id] = fields
+                self._fetched_at[bug_id] = time.monotonic()
+
+            bug_analyzer = self.bugs[bug_id]
+            self._evict()
+
+        return bug_analyzer
+
+    def add_bugs(
+        self, bugs: Iterable[dict], include_fields: Iterable[str] | str | None
+    ) -> None:
+        """Add the bugs fetched with the given fields to the store.
+
+        The data are copied, so the bugs can be modified afterwards.
+        """
+        for bug in bugs:
+            self.add_bug(copy.deepcopy(bug), include_fields)
+
+    def invalidate(self, bug_ids: Iterable[int | str]) -> None:
+        """Remove bugs from the store (e.g., because they have been changed).
+
+        Args:
+            bug_ids: The ids of the bugs to remove.
+        """
+        with self._lock:
+            for bug_id in bug_ids:
+                self._remove(int(bug_id))
+
+    def _remove(self, bug_id: int) -> None:
+        self.bugs.pop(bug_id, None)
+        self._fields.pop(bug_id, None)
+        self._fetched_at.pop(bug_id, None)
+
+    def _evict(self) -> None:
+        """Remove the expired bugs and the oldest ones above `max_bugs`"""
+        while self.bugs:
+            bug_id = next(iter(self.bugs))
+            if not self._is_expired(bug_id) and (
+                self.max_bugs is None or len(self.bugs) <= self.max_bugs
+            ):
+                break
+            self._remove(bug_id)
+
+    def _is_expired(self, bug_id: int) -> bool:
+        if self.max_age is None or bug_id not in self._fetched_at:
+            return False
+        return time.monotonic() - self._fetched_at[bug_id] > self.max_age
 
     def get_bug_by_id(self, bug_id: int) -> BugAnalyzer:
         """Get a bug by its id.
@@ -210,29 +339,75 @@ class BugsStore:
 
     def fetch_bugs(
         self, bug_ids: Iterable[int], include_fields: list[str] | None = None
-    ):
+    ) -> dict[int, "BugAnalyzer"]:
         """Fetches the bugs from Bugzilla.
 
+        Only the bugs that aren't already in the store and the fields that
+        weren't already fetched are requested.
+
         Args:
             bug_ids: The ids of the bugs to fetch.
             include_fields: The fields to include when fetching the bugs.
+
+        Returns:
+            The bugs by id, even if they have been removed from the store in
+            the meantime. The bugs that cannot be accessed are absent.
         """
-        bug_ids = {
-            bug_id
-            for bug_id in bug_ids
-            # TODO: We only fetch bugs that aren't already in the store.
-            # However, the new fetch request might be specifying fields that
-            # aren't in the existing bug. We need at some point to handle such
-            # cases (currently, we do not have this requirement).
-            if bug_id not in self.bugs
-        }
-        if not bug_ids:
-            return
+        fields = self._get_fields(include_fields)
+        found: dict[int, BugAnalyzer] = {}
+
+        # Group the bugs by the fields to request, so we need one query per
+        # group instead of one per bug.
+        missing: dict[frozenset[str] | None, set[int]] = defaultdict(set)
+        with self._lock:
+            for bug_id in set(bug_ids):
+                bug_id = int(bug_id)
+                if bug_id not in self.bugs or self._is_expired(bug_id):
+                    missing[None].add(bug_id)
+                    continue
+
+                found[bug_id] = self.bugs[bug_id]
 
-        def bug_handler(bug):
-            self.bugs[bug["id"]] = BugAnalyzer(bug, self)
+                missing_fields = fields - self._fields[bug_id]
+                if missing_fields:
+                    if BugsStore.DEFAULT_FIELDS in missing_fields:
+                        missing[None].add(bug_id)
+                    else:
+                        missing[frozenset(missing_fields | {"id"})].add(bug_id)
+
+        for group, ids in missing.items():
+            group_fields = (
+                None
+                if group is None and include_fields is None
+                else sorted(fields if group is None else group)
+            )
+
+            def bug_handler(bug, group_fields=group_fields):
+                found[bug["id"]] = self.add_bug(bug, group_fields)
+
+            Bugzilla(
+                sorted(ids), bughandler=bug_handler, include_fields=group_fields
+            ).wait()
+
+        return found
+
+    def get_bugs(
+        self, bug_ids: Iterable[int], include_fields: list[str] | None = None
+    ) -> dict[int, dict]:
+        """Get the bugs, fetching from Bugzilla only what is missing.
+
+        Args:
+            bug_ids: The ids of the bugs to get.
+            include_fields: The fields needed.
+
+        Returns:
+            A copy of the data of the bugs, by bug id. The bugs that cannot be
+            accessed are absent.
+        """
+        bugs = self.fetch_bugs(bug_ids, include_fields)
 
-        Bugzilla(bug_ids, bughandler=bug_handler, include_fields=include_fields).wait()
+        with self._lock:
+            return {bug_id: copy.deepcopy(bug._bug) for bug_id, bug in bugs.items()}
 
     @cached_property
     def current_version_flags(self) -> list[tuple[str, str, int]]:
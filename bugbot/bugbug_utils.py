@@ -2,15 +2,106 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
 import os
+import threading
 import time
-from typing import Iterable
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 import requests
 
+from bugbot import utils
+from bugbot.cache import SQLiteStore
+
 BUGBUG_HTTP_SERVER = os.environ.get("BUGBUG_HTTP_SERVER", "https://bugbug.moz.tools/")
 
 
+class PredictionCache(SQLiteStore):
+    """Save the bugbug predictions between the runs.
+
+    A prediction is saved by model and bug, with the last change time of the
+    bug: it is reused as long as the bug has not changed, and for `max_age`
+    seconds at most so the predictions of a retrained model are eventually
+    used.
+    """
+
+    FILENAME = "bugbug_predictions.sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS predictions ("
+        "model TEXT NOT NULL, "
+        "bug_id INTEGER NOT NULL, "
+        "last_change_time TEXT NOT NULL, "
+        "data TEXT NOT NULL, "
+        "created REAL NOT NULL, "
+        "PRIMARY KEY (model, bug_id))"
+    ]
+    EXPIRES = {"predictions": "created"}
+
+    def __init__(self, path: str, max_age: float = 7 * 24 * 3600) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            max_age: the number of seconds a prediction is kept.
+        """
+        super().__init__(path, max_age)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "PredictionCache":
+        return cls(
+            path,
+            utils.get_config("common", "bugbug_prediction_max_age", 7 * 24 * 3600),
+        )
+
+    def get(self, model: str, change_times: Dict[int, str]) -> Dict[int, dict]:
+        """Get the saved predictions of the bugs which didn't change
+
+        Args:
+            model: the name of the model.
+            change_times: the last change times by bug id.
+        """
+        res = {}
+        bug_ids = list(change_times)
+        oldest = time.time() - self.max_age
+        with self._lock:
+            for i in range(0, len(bug_ids), 500):
+                chunk = bug_ids[i : i + 500]
+                rows = self.db.execute(
+                    "SELECT bug_id, last_change_time, data FROM predictions "
+                    "WHERE model = ? AND created >= ? AND bug_id IN ({})".format(
+                        ", ".join("?" * len(chunk))
+                    ),
+                    [model, oldest] + chunk,
+                )
+                for bug_id, last_change_time, data in rows:
+                    if change_times[bug_id] == last_change_time:
+                        res[bug_id] = json.loads(data)
+        return res
+
+    def put(self, model: str, predictions: Dict[int, Tuple[str, dict]]) -> None:
+        """Save some predictions
+
+        Args:
+            model: the name of the model.
+            predictions: the last change time of the bug and the prediction by
+                bug id.
+        """
+        now = time.time()
+        with self._lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO predictions "
+                "(model, bug_id, last_change_time, data, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (model, bug_id, last_change_time, json.dumps(data), now)
+                    for bug_id, (last_change_time, data) in predictions.items()
+                ],
+            )
+            self.db.commit()
+
+
 def classification_http_request(url, bug_ids):
     response = requests.post(
         url, headers={"X-Api-Key": "autonag"}, json={"bugs": bug_ids}
@@ -21,52 +112,134 @@ def classification_http_request(url, bug_ids):
     return response.json()
 
 
-def get_bug_ids_classification(
-    model: str, bugs: Iterable, retry_count: int = 21, retry_sleep: int = 10
-):
-    """Get the classification for a list of bug ids.
+def get_change_times(bugs: Iterable) -> Dict[int, str]:
+    """Get the last change times of the bugs when they are known"""
+    if not isinstance(bugs, dict):
+        return {}
+
+    return {
+        int(bug_id): bug["last_change_time"]
+        for bug_id, bug in bugs.items()
+        if isinstance(bug, dict) and bug.get("last_change_time")
+    }
+
+
+def classify_bugs(
+    model: str,
+    bugs: Iterable,
+    batch_size: int = 1000,
+    timeout: float = 210,
+    min_sleep: float = 1,
+    max_sleep: float = 30,
+) -> Iterator[Tuple[str, dict]]:
+    """Classify bugs, the classifications are generated as soon as they are
+    ready.
+
+    All the batches are submitted before waiting for any of them, then the
+    pending ones are polled again. The delay between two polls starts at
+    `min_sleep` and is doubled after each poll, up to `max_sleep`, unless some
+    classifications were ready; the time spent by the caller to handle the
+    classifications is part of it.
 
     Args:
         model: The model to use for the classification.
-        bug_ids: The list of bug ids to classify, if a dictionary is passed, the
-            keys will be used as bug ids.
-        retry_count: The number of times to retry the request.
-        retry_sleep: The number of seconds to sleep between retries.
+        bugs: The bug ids to classify, if a dictionary is passed, the keys will
+            be used as bug ids and the classifications of the bugs with the
+            same `last_change_time` as in a previous run will be reused.
+        batch_size: The maximum number of bugs in a request.
+        timeout: The number of seconds to wait for the classifications.
+        min_sleep: The minimal number of seconds between two polls.
+        max_sleep: The maximal number of seconds between two polls.
 
     Returns:
-        A dictionary with the bug ids as keys and the classification as values.
+        The bug ids (as strings) with their classification.
     """
     # Copy the bug ids to avoid mutating it
     bug_ids = set(map(int, bugs))
     if len(bug_ids) == 0:
-        return {}
+        return
+
+    change_times = get_change_times(bugs)
+    cache = PredictionCache.get_instance() if change_times else None
+    if cache is not None:
+        for bug_id, bug_data in cache.get(model, change_times).items():
+            bug_ids.remove(bug_id)
+            yield str(bug_id), bug_data
 
     url = f"{BUGBUG_HTTP_SERVER}/{model}/predict/batch"
+    bug_ids_list = sorted(bug_ids)
+    batches: List[List[int]] = [
+        bug_ids_list[i : i + batch_size]
+        for i in range(0, len(bug_ids_list), batch_size)
+    ]
+    deadline = time.monotonic() + timeout
+    sleep = min_sleep
+
+    while batches:
+        poll_start = time.monotonic()
+        pending = []
+        progress = False
+        for batch in batches:
+            response = classification_http_request(url, batch)
 
-    json_response = {}
+            # The http service returns strings for backward compatibility reasons
+            ready = {
+                int(bug_id): bug_data
+                for bug_id, bug_data in response["bugs"].items()
+                if bug_data.get("ready", True)
+            }
+            if cache is not None:
+                cache.put(
+                    model,
+                    {
+                        bug_id: (change_times[bug_id], bug_data)
+                        for bug_id, bug_data in ready.items()
+                        if bug_id in change_times
+                    },
+                )
+
+            for bug_id, bug_data in ready.items():
+                progress = True
+                yield str(bug_id), bug_data
+
+            batch = [bug_id for bug_id in batch if bug_id not in ready]
+            if batch:
+                pending.append(batch)
+
+        batches = pending
+        if not batches:
+            break
 
-    for _ in range(retry_count):
-        response = classification_http_request(url, list(bug_ids))
+        if progress:
+            sleep = min_sleep
+        wake_up = poll_start + sleep
+        if wake_up > deadline:
+            count = sum(map(len, batches))
+            msg = f"Couldn't get {count} bug classifications in {timeout} seconds, aborting"
+            raise Exception(msg)
 
-        # Check which bug ids are ready
-        for bug_id, bug_data in response["bugs"].items():
-            if not bug_data.get("ready", True):
-                continue
+        time.sleep(max(0, wake_up - time.monotonic()))
+        sleep = min(2 * sleep, max_sleep)
 
-            # The bug is ready, add it to the json_response and pop it
-            # up from the current batch
-            # The http service returns strings for backward compatibility reasons
-            bug_ids.remove(int(bug_id))
-            json_response[bug_id] = bug_data
 
-        if len(bug_ids) == 0:
-            break
-        else:
-            time.sleep(retry_sleep)
+def get_bug_ids_classification(
+    model: str, bugs: Iterable, retry_count: int = 21, retry_sleep: int = 10
+):
+    """Get the classification for a list of bug ids.
 
-    else:
-        total_sleep = retry_count * retry_sleep
-        msg = f"Couldn't get {len(bug_ids)} bug classifications in {total_sleep} seconds, aborting"
-        raise Exception(msg)
+    Args:
+        model: The model to use for the classification.
+        bug_ids: The list of bug ids to classify, if a dictionary is passed, the
+            keys will be used as bug ids.
+        retry_count: The number of times `retry_sleep` seconds to wait for the
+            classifications.
+        retry_sleep: The maximal number of seconds to sleep between two polls.
 
-    return json_response
+    Returns:
+        A dictionary with the bug ids as keys and the classification as values.
+    """
+    return dict(
+        classify_bugs(
+            model, bugs, timeout=retry_count * retry_sleep, max_sleep=retry_sleep
+        )
+    )
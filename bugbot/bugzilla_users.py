@@ -0,0 +1,272 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from libmozdata.bugzilla import BugzillaUser
+
+from bugbot import logger, utils
+from bugbot.cache import SQLiteStore
+
+
+class BugzillaUsers(SQLiteStore):
+    """Resolve the profiles of Bugzilla users by batch.
+
+    The callers declare the users they will need with `prefetch`; the pending
+    users are then resolved all at once, with the chunked multi-user requests
+    of `BugzillaUser`, when one of them is requested. The users can be given by
+    email or by ID, and each caller asks for the fields it needs (by default:
+    id, name, email, nick and last seen date); a saved profile is fetched again
+    only when it misses some of them.
+
+    The profiles are saved in a SQLite database under the cache directory and
+    are reused by the other rules and runs for `ttl` seconds. The users which
+    Bugzilla reports as unknown are saved for `negative_ttl` seconds only; the
+    users missing because a request failed are not saved, so they are
+    requested again.
+    """
+
+    FILENAME = "bugzilla_users.sqlite"
+    FIELDS = ["id", "name", "email", "nick", "last_seen_date"]
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS users ("
+        "name TEXT PRIMARY KEY, "
+        "id INTEGER, "
+        "data TEXT, "
+        "fields TEXT NOT NULL, "
+        "fetched REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS users_id ON users (id)",
+    ]
+
+    def __init__(
+        self, path: str, ttl: float = 24 * 3600, negative_ttl: float = 3600
+    ) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            ttl: the number of seconds during which a profile is valid.
+            negative_ttl: the number of seconds during which an unknown user
+                is not requested again.
+        """
+        super().__init__(path, ttl)
+        self.negative_ttl = negative_ttl
+        self.users: Dict[str, Optional[dict]] = {}
+        self.names_by_id: Dict[int, str] = {}
+        # The fields which were requested for each profile: Bugzilla omits the
+        # fields the bot is not allowed to see
+        self.fields: Dict[str, Set[str]] = {}
+        self.pending: Set[Union[str, int]] = set()
+        self.pending_fields: Set[str] = set()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "BugzillaUsers":
+        return cls(
+            path,
+            utils.get_config("common", "bugzilla_users_ttl", 24 * 3600),
+            utils.get_config("common", "bugzilla_users_negative_ttl", 3600),
+        )
+
+    def _get_oldest(self) -> List[float]:
+        """Get the oldest fetch times of the valid profiles and unknown users"""
+        now = time.time()
+        return [now - self.max_age, now - self.negative_ttl]
+
+    def _purge(self, db: sqlite3.Connection) -> None:
+        db.execute(
+            "DELETE FROM users WHERE fetched < ? OR (data IS NULL AND fetched < ?)",
+            self._get_oldest(),
+        )
+
+    @staticmethod
+    def _get_key(id_or_name: Union[str, int]) -> Union[str, int]:
+        if isinstance(id_or_name, int) or id_or_name.isdigit():
+            return int(id_or_name)
+        return id_or_name
+
+    def _get_cached(self, key: Union[str, int]) -> Optional[dict]:
+        if isinstance(key, int):
+            key = self.names_by_id.get(key, key)
+        return self.users.get(key)
+
+    def _is_resolved(self, key: Union[str, int], fields: Iterable[str]) -> bool:
+        if isinstance(key, int):
+            if key not in self.names_by_id:
+                return False
+            key = self.names_by_id[key]
+        if key not in self.users:
+            return False
+        return self.users[key] is None or self.fields[key].issuperset(fields)
+
+    def _add(self, name: str, user: Optional[dict], fields: Set[str]) -> None:
+        self.users[name] = user
+        self.fields[name] = fields
+        if user is not None and "id" in user:
+            self.names_by_id[user["id"]] = name
+
+    def prefetch(
+        self, names: Iterable[Union[str, int]], fields: Optional[List[str]] = None
+    ) -> None:
+        """Declare some users which will be resolved with the next request
+
+        Args:
+            names: the Bugzilla emails or IDs of the users.
+            fields: the fields needed in the profiles.
+        """
+        fields = self.FIELDS if fields is None else fields
+        with self._lock:
+            for name in names:
+                if not name:
+                    continue
+                key = self._get_key(name)
+                if not self._is_resolved(key, fields):
+                    self.pending.add(key)
+            self.pending_fields.update(fields)
+
+    def _load(self, keys: List[Union[str, int]]) -> None:
+        """Load the valid profiles from the database"""
+        oldest = self._get_oldest()
+        names = [key for key in keys if isinstance(key, str)]
+        ids = [key for key in keys if isinstance(key, int)]
+        for column, values in (("name", names), ("id", ids)):
+            for i in range(0, len(values), 500):
+                chunk = values[i : i + 500]
+                rows = self.db.execute(
+                    "SELECT name, data, fields FROM users "
+                    "WHERE fetched >= ? AND (data IS NOT NULL OR fetched >= ?) "
+                    "AND {} IN ({})".format(column, ", ".join("?" * len(chunk))),
+                    oldest + chunk,
+                )
+                for name, data, fields in rows:
+                    self._add(
+                        name,
+                        None if data is None else json.loads(data),
+                        set(fields.split(",")),
+                    )
+
+    def _fetch(self, keys: List[Union[str, int]], fields: List[str]) -> None:
+        """Fetch the profiles from Bugzilla and save them"""
+        found: Dict[Union[str, int], dict] = {}
+        # The users which Bugzilla reported as unknown
+        unknown: Set[Union[str, int]] = set()
+
+        def handler(user, data):
+            # The names given by the callers may differ in case
+            data[user["name"].lower()] = user
+            if "id" in user:
+                data[user["id"]] = user
+
+        def fault_handler(fault, data):
+            if "name" in fault:
+                unknown.add(fault["name"].lower())
+            if "id" in fault:
+                unknown.add(int(fault["id"]))
+
+        include_fields = set(fields) | {"name"}
+        if any(isinstance(key, int) for key in keys):
+            include_fields.add("id")
+
+        BugzillaUser(
+            user_names=keys,
+            include_fields=sorted(include_fields),
+            user_handler=handler,
+            fault_user_handler=fault_handler,
+            user_data=found,
+        ).wait()
+
+        now = time.time()
+        rows = []
+        failed = 0
+        for key in keys:
+            normalized_key = key.lower() if isinstance(key, str) else key
+            user = found.get(normalized_key)
+            if user is None:
+                if normalized_key not in unknown:
+                    # The request failed, the user will be requested again
+                    failed += 1
+                    continue
+                if isinstance(key, int):
+                    # Without the email, an unknown ID cannot be saved
+                    continue
+                name = key
+                user_fields = include_fields
+            else:
+                name = key if isinstance(key, str) else user["name"]
+                # Keep the fields which were fetched for the other callers
+                user = dict(self.users.get(name) or {}, **user)
+                user_fields = include_fields | self.fields.get(name, set())
+            self._add(name, user, user_fields)
+            rows.append(
+                (
+                    name,
+                    None if user is None else user.get("id"),
+                    None if user is None else json.dumps(user),
+                    ",".join(sorted(user_fields)),
+                    now,
+                )
+            )
+
+        if failed:
+            logger.warning("Could not get %d Bugzilla users", failed)
+
+        self.db.executemany(
+            "INSERT OR REPLACE INTO users (name, id, data, fields, fetched) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.db.commit()
+
+    def resolve(self) -> None:
+        """Resolve the pending users"""
+        with self._lock:
+            keys = sorted(self.pending, key=str)
+            fields = sorted(self.pending_fields)
+            self.pending.clear()
+            self.pending_fields.clear()
+            if not keys:
+                return
+
+            self._load(keys)
+            missing = [key for key in keys if not self._is_resolved(key, fields)]
+            if missing:
+                self._fetch(missing, fields)
+
+    def get_users(
+        self, names: Iterable[Union[str, int]], fields: Optional[List[str]] = None
+    ) -> Dict[Union[str, int], Optional[dict]]:
+        """Get the profiles of the users
+
+        Args:
+            names: the Bugzilla emails or IDs of the users.
+            fields: the fields needed in the profiles.
+
+        Returns:
+            The profiles by user, None for the unknown users.
+        """
+        names = list(names)
+        self.prefetch(names, fields)
+        self.resolve()
+        with self._lock:
+            return {name: self._get_cached(self._get_key(name)) for name in names}
+
+    def is_unknown(self, name: Union[str, int]) -> bool:
+        """Check whether Bugzilla reported a user as unknown"""
+        key = self._get_key(name)
+        with self._lock:
+            if isinstance(key, int):
+                key = self.names_by_id.get(key, key)
+            return key in self.users and self.users[key] is None
+
+    def get_user(self, name: Union[str, int]) -> Optional[dict]:
+        return self.get_users([name])[name]
+
+    def get_nick(self, name: str) -> Optional[str]:
+        user = self.get_user(name)
+        return None if user is None else user["nick"]
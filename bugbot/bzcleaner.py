@@ -5,22 +5,34 @@
 # mypy: disallow-untyped-defs
 
 import argparse
+import json
 import logging
 import os
 import sys
-import time
 from collections import defaultdict
 from collections.abc import Iterable, Mapping
+from concurrent.futures import as_completed
 from datetime import datetime
 from typing import Any, cast
 
 from dateutil.relativedelta import relativedelta
-from jinja2 import Environment, FileSystemLoader, Template
-from libmozdata import config
+from jinja2 import Template
+from libmozdata import config, connection
 from libmozdata import utils as lmdutils
 from libmozdata.bugzilla import Bugzilla
-
-from bugbot import db, logger, logger_extra, mail, utils
+from tenacity import retry, retry_if_result, stop_after_attempt, wait_random_exponential
+
+from bugbot import (
+    db,
+    log_rule,
+    logger,
+    mail,
+    metrics,
+    set_log_level,
+    templates,
+    utils,
+)
+from bugbot.bug.analyzer import BugsStore
 from bugbot.cache import Cache
 from bugbot.nag_me import Nag
 
@@ -73,6 +85,7 @@ class BzCleaner(object):
         self.cache = Cache(self.name(), self.max_days_in_cache())
         self.test_mode = utils.get_config("common", "test", False)
         self.versions: Any = None
+        self.metrics = metrics.RuleMetrics(self.name())
 
     def _set_rule_name(self) -> None:
         module = sys.modules[self.__class__.__module__]
@@ -383,6 +396,10 @@ class BzCleaner(object):
             for k in ["product", "component"]:
                 res[k] = bug[k]
 
+        if "last_change_time" in bug:
+            # Used to reuse the classifications of the bugs which didn't change
+            res["last_change_time"] = bug["last_change_time"]
+
         if isinstance(self, Nag):
             bug = self.set_people_to_nag(bug, res)
             if not bug:
@@ -466,31 +483,77 @@ class BzCleaner(object):
     ) -> dict[str, Any]:
         """Get the bugs"""
         bugs = self.get_data()
-        params = self.get_bz_params(date)
-        self.amend_bzparams(params, bug_ids)
+        with self.metrics.phase("bz_params"):
+            params = self.get_bz_params(date)
+            self.amend_bzparams(params, bug_ids)
         self.query_url = utils.get_bz_search_url(params)
 
         if isinstance(self, Nag):
             self.query_params: dict = params
 
-        old_CHUNK_SIZE = Bugzilla.BUGZILLA_CHUNK_SIZE
-        try:
-            if chunk_size:
-                Bugzilla.BUGZILLA_CHUNK_SIZE = chunk_size
+        with self.metrics.phase("search"):
+            self._search_bugs(params, bugs, chunk_size)
 
-            Bugzilla(
-                params,
-                bughandler=self.bughandler,
-                bugdata=bugs,
-                timeout=self.get_config("bz_query_timeout"),
-            ).get_data().wait()
-        finally:
-            Bugzilla.BUGZILLA_CHUNK_SIZE = old_CHUNK_SIZE
-
-        self.get_comments(bugs)
+        with self.metrics.phase("comments"):
+            self.get_comments(bugs)
 
         return bugs
 
+    def _paginate(self, params: BzParams, chunk_size: int) -> list[BzParams]:
+        """Split a search in pages of `chunk_size` bugs.
+
+        Bugzilla splits the searches in pages of `Bugzilla.BUGZILLA_CHUNK_SIZE`
+        bugs, which is global, so the pages of another size are made here.
+        """
+        if not {"count_only", "limit", "order", "offset"}.isdisjoint(params):
+            return [params]
+
+        count: dict[str, int] = {}
+        Bugzilla(
+            queries=[
+                connection.Query(
+                    Bugzilla.API_URL,
+                    {**params, "count_only": 1},
+                    lambda res, data: data.update(res),
+                    count,
+                )
+            ],
+            timeout=self.get_config("bz_query_timeout"),
+        ).wait()
+
+        return [
+            {**params, "limit": chunk_size, "order": "bug_id", "offset": offset}
+            for offset in range(0, count.get("bug_count", 0), chunk_size)
+        ]
+
+    def _search_bugs(
+        self,
+        params: BzParams,
+        bugs: dict[str, Any],
+        chunk_size: int | None = None,
+    ) -> None:
+        bughandler = self.bughandler
+        if self.get_config("share_bugs", False):
+            # The bugs are kept in the shared store, so the other rules can
+            # reuse them instead of fetching them again.
+            store = BugsStore.get_instance()
+            include_fields = cast(list[str] | str | None, params.get("include_fields"))
+
+            def bughandler(bug: Bug, data: dict[str, Any]) -> None:
+                store.add_bugs([dict(bug)], include_fields)
+                self.bughandler(bug, data)
+
+        queries = self._paginate(params, chunk_size) if chunk_size else params
+        if not queries:
+            return
+
+        Bugzilla(
+            queries,
+            bughandler=bughandler,
+            bugdata=bugs,
+            timeout=self.get_config("bz_query_timeout"),
+        ).get_data().wait()
+
     def commenthandler(self, bug: Bug, bugid: str | int, data: dict[str, Any]) -> None:
         return
 
@@ -580,10 +643,8 @@ class BzCleaner(object):
 
         template_name = self.needinfo_template_name()
         assert bool(template_name)
-        env = Environment(loader=FileSystemLoader("templates"))
-        template = env.get_template(template_name)
 
-        return template
+        return templates.get_template(template_name)
 
     def has_individual_autofix(self, changes: dict[Any, Any]) -> bool:
         # check if we have a dictionary with bug numbers as keys
@@ -672,27 +733,92 @@ class BzCleaner(object):
         if db_extra is None:
             db_extra = {}
 
-        max_retries = utils.get_config("common", "bugzilla_max_retries", 3)
         bugzilla_cls = SilentBugzilla if no_bugmail else Bugzilla
+        max_workers = utils.get_config("common", "bugzilla_max_workers", 4)
 
+        # Bugs getting exactly the same change are updated with one request
+        groups: dict[str, tuple[dict, list[str]]] = {}
         for bugid, ch in new_changes.items():
-            added = False
-            for _ in range(max_retries):
-                failures = bugzilla_cls([str(bugid)]).put(ch)
-                if failures:
-                    time.sleep(1)
-                else:
-                    added = True
-                    db.BugChange.add(rule_name, bugid, extra=db_extra.get(bugid, ""))
-                    break
-            if not added:
-                logger.error(
-                    "%s: Cannot put data for bug %s (change => %s): %s",
-                    rule_name,
-                    bugid,
+            key = json.dumps(ch, sort_keys=True)
+            if key not in groups:
+                groups[key] = (ch, [])
+            groups[key][1].append(str(bugid))
+
+        applied: list[str] = []
+        with utils.ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(BzCleaner._put_change, bugzilla_cls, ch, bugids): (
                     ch,
-                    failures,
+                    bugids,
                 )
+                for ch, bugids in groups.values()
+            }
+            for future in as_completed(futures):
+                ch, bugids = futures[future]
+                try:
+                    succeeded, failed = future.result()
+                except Exception:
+                    logger.exception(
+                        "%s: Cannot put data for bugs %s", rule_name, bugids
+                    )
+                    succeeded, failed = [], []
+
+                applied += succeeded
+                if failed:
+                    logger.error(
+                        "%s: Cannot put data for bugs %s (change => %s)",
+                        rule_name,
+                        failed,
+                        ch,
+                    )
+
+        db.BugChange.add_many(
+            rule_name, [(bugid, db_extra.get(bugid, "")) for bugid in applied]
+        )
+        # The data we have about the bugs are not up to date anymore
+        BugsStore.get_instance().invalidate(new_changes.keys())
+
+    @staticmethod
+    def _put_change(
+        bugzilla_cls: type[Bugzilla], change: dict, bugids: list[str]
+    ) -> tuple[list[str], list[str]]:
+        """Put the same change on several bugs
+
+        Args:
+            bugzilla_cls: the class used to perform the request.
+            change: the change to apply.
+            bugids: the bugs to change.
+
+        Returns:
+            The bugs that have been changed and the ones that failed.
+        """
+        max_retries = utils.get_config("common", "bugzilla_max_retries", 3)
+        applied: list[str] = []
+        batches = [bugids]
+
+        @retry(
+            wait=wait_random_exponential(multiplier=1, max=30),
+            stop=stop_after_attempt(max_retries),
+            retry=retry_if_result(bool),
+            retry_error_callback=lambda state: state.outcome.result(),
+        )
+        def put_batches() -> list[str]:
+            nonlocal batches
+            failed = []
+            for batch in batches:
+                # `put` adds the bug ids to the data, so we give it a copy
+                failures = {
+                    str(bugid) for bugid in bugzilla_cls(batch).put(dict(change))
+                }
+                for bugid in batch:
+                    (failed if bugid in failures else applied).append(bugid)
+
+            # A single bug can make the whole batch fail, so we retry the
+            # failed bugs one by one.
+            batches = [[bugid] for bugid in failed]
+            return failed
+
+        return applied, put_batches()
 
     def terminate(self) -> None:
         """Called when everything is done"""
@@ -709,9 +835,14 @@ class BzCleaner(object):
             self.cache.add(bugs)
 
     def get_email_data(self, date: str) -> EmailData:
-        bugs = self.get_bugs(date=date)
+        # The rules overriding `get_bugs` fetch their extra data (Phabricator,
+        # Socorro, bugbug, ...) there.
+        with self.metrics.phase("get_bugs"):
+            bugs = self.get_bugs(date=date)
+        self.metrics.add_bugs(len(bugs))
         bugs = self._populate_prioritized_actions(bugs)
-        bugs = self.autofix(bugs)
+        with self.metrics.phase("autofix"):
+            bugs = self.autofix(bugs)
         self.add_to_cache(bugs)
         if not bugs:
             return cast(EmailData, [])
@@ -725,9 +856,8 @@ class BzCleaner(object):
         assert data, "No data to send"
 
         extra = self.get_extra_for_template()
-        env = Environment(loader=FileSystemLoader("templates"))
-        template = env.get_template(self.template())
-        message = template.render(
+        message = templates.render(
+            self.template(),
             date=date,
             data=data,
             extra=extra,
@@ -737,8 +867,8 @@ class BzCleaner(object):
             no_manager=self.no_manager,
             table_attrs=self.get_config("table_attrs"),
         )
-        common = env.get_template("common.html")
-        body = common.render(
+        body = templates.render(
+            "common.html",
             preamble=preamble,
             message=message,
             query_url=utils.shorten_long_bz_url(self.query_url),
@@ -748,9 +878,8 @@ class BzCleaner(object):
     def _send_alert_about_too_many_changes(self, err: TooManyChangesError) -> None:
         """Send an alert email when there are too many changes to apply"""
 
-        env = Environment(loader=FileSystemLoader("templates"))
-        template = env.get_template("aborted_preamble.html")
-        preamble = template.render(
+        preamble = templates.render(
+            "aborted_preamble.html",
             changes=err.changes.items(),
             changes_size=len(err.changes),
             normal_changes_max=self.normal_changes_max,
@@ -795,29 +924,31 @@ class BzCleaner(object):
         login_info = utils.get_login_info()
         email_data = self.get_email_data(date)
         if email_data:
-            title, body = self.get_email(date, email_data)
+            with self.metrics.phase("render"):
+                title, body = self.get_email(date, email_data)
             receivers = utils.get_receivers(self.name())
             cc_list = self.get_cc_emails(email_data)
 
-            status = "Success"
-            try:
-                mail.send(
-                    login_info["ldap_username"],
-                    receivers,
-                    title,
-                    body,
-                    Cc=cc_list,
-                    html=True,
-                    login=login_info,
-                    dryrun=self.dryrun,
-                )
-            except Exception:
-                logger.exception("Rule {}".format(self.name()))
-                status = "Failure"
+            with self.metrics.phase("send"):
+                status = "Success"
+                try:
+                    mail.send(
+                        login_info["ldap_username"],
+                        receivers,
+                        title,
+                        body,
+                        Cc=cc_list,
+                        html=True,
+                        login=login_info,
+                        dryrun=self.dryrun,
+                    )
+                except Exception:
+                    logger.exception("Rule {}".format(self.name()))
+                    status = "Failure"
 
-            db.Email.add(self.name(), receivers, "global", status)
-            if isinstance(self, Nag):
-                self.send_mails(title, dryrun=self.dryrun)
+                db.Email.add(self.name(), receivers, "global", status)
+                if isinstance(self, Nag):
+                    self.send_mails(title, dryrun=self.dryrun)
         else:
             name = self.name().upper()
             if date:
@@ -864,12 +995,17 @@ class BzCleaner(object):
 
         return parser
 
-    def run(self) -> None:
-        """Run the rule"""
-        logger_extra["bugbot_rule"] = self.name()
+    def run(self, argv: list[str] | None = None) -> None:
+        """Run the rule
+
+        Args:
+            argv: the command line arguments; if `None`, `sys.argv` is used.
+        """
+        log_rule.set(self.name())
         logger.info("Run rule %s", self.get_rule_path())
+        self.metrics = metrics.RuleMetrics(self.name())
 
-        args = self.get_args_parser().parse_args()
+        args = self.get_args_parser().parse_args(argv)
         self.parse_custom_arguments(args)
         date = "" if self.ignore_date() else args.date
         self.dryrun = args.dryrun
@@ -877,7 +1013,7 @@ class BzCleaner(object):
         self.cache.set_dry_run(self.dryrun)
 
         if self.dryrun:
-            logger.setLevel(logging.DEBUG)
+            set_log_level(logging.DEBUG)
 
         try:
             self.send_email(date=date)
@@ -888,3 +1024,5 @@ class BzCleaner(object):
             logger.exception("Rule %s", self.name())
         except Exception:
             logger.exception("Rule {}".format(self.name()))
+        finally:
+            self.metrics.finish()
@@ -4,30 +4,108 @@
 
 import json
 import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Type, TypeVar
 
 from libmozdata import utils as lmdutils
 
 from bugbot import utils
 
 
-class Cache(object):
-    def __init__(self, name, max_days, add_once=True):
-        super(Cache, self).__init__()
+def get_cache_dir():
+    cache_path = utils.get_config("common", "cache")
+    os.makedirs(cache_path, exist_ok=True)
+    return cache_path
+
+
+T = TypeVar("T", bound="SQLiteStore")
+
+
+class SQLiteStore:
+    """A SQLite database under the cache directory, shared by the rules.
+
+    The subclasses give the name of the file (`FILENAME`) and the statements
+    creating the tables (`SCHEMA`). When the database is opened, the rows
+    older than `max_age` seconds are removed from the tables listed in
+    `EXPIRES` (with the column holding the time of each row); `_purge` can be
+    overridden for the other cases.
+
+    `get_instance` gives the instance shared by the rules of the process; the
+    subclasses read their configuration in `from_config`.
+    """
+
+    FILENAME = ""
+    SCHEMA: List[str] = []
+    EXPIRES: Dict[str, str] = {}
+
+    _instance: Optional["SQLiteStore"] = None
+    _instance_lock = threading.Lock()
+    _connections_lock = threading.Lock()
+
+    def __init__(self, path: str, max_age: Optional[float] = None) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            max_age: the number of seconds a row is kept in the tables listed
+                in `EXPIRES`.
+        """
+        self.path = path
+        self.max_age = max_age
+        self._connections: Dict[int, sqlite3.Connection] = {}
+
+    @classmethod
+    def from_config(cls: Type[T], path: str) -> T:
+        """Create the store with the configuration of the bot"""
+        return cls(path)
+
+    @classmethod
+    def get_instance(cls: Type[T]) -> T:
+        with SQLiteStore._instance_lock:
+            # Each subclass has its own instance
+            instance = cls.__dict__.get("_instance")
+            if instance is None:
+                instance = cls.from_config(os.path.join(get_cache_dir(), cls.FILENAME))
+                cls._instance = instance
+            return instance
+
+    def _purge(self, db: sqlite3.Connection) -> None:
+        if self.max_age is None:
+            return
+
+        oldest = time.time() - self.max_age
+        for table, column in self.EXPIRES.items():
+            db.execute(f"DELETE FROM {table} WHERE {column} < ?", (oldest,))
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # A connection must not be used in a forked process
+        pid = os.getpid()
+        with SQLiteStore._connections_lock:
+            if pid not in self._connections:
+                db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                for statement in self.SCHEMA:
+                    db.execute(statement)
+                self._purge(db)
+                db.commit()
+                self._connections[pid] = db
+
+            return self._connections[pid]
+
+
+class JSONCacheBackend(object):
+    """Store the bugs of a rule with the date they were added in a JSON file"""
+
+    def __init__(self, name, max_days):
+        super(JSONCacheBackend, self).__init__()
         self.name = name
         self.max_days = max_days
-        self.add_once = add_once
-        self.added = False
-        self.dryrun = True
         self.data = None
 
-    def set_dry_run(self, dryrun):
-        self.dryrun = dryrun or self.max_days < 1
-
     def get_path(self):
-        cache_path = utils.get_config("common", "cache")
-        if not os.path.exists(cache_path):
-            os.mkdir(cache_path)
-        return "{}/{}.json".format(cache_path, self.name)
+        return "{}/{}.json".format(get_cache_dir(), self.name)
 
     def get_data(self):
         if self.data is None:
@@ -45,9 +123,6 @@ class Cache(object):
         return self.data
 
     def add(self, bugids):
-        if self.dryrun or (self.add_once and self.added):
-            return
-
         data = self.get_data()
         today = lmdutils.get_today()
         for bugid in bugids:
@@ -56,7 +131,128 @@ class Cache(object):
         with open(self.get_path(), "w") as Out:
             json.dump(data, Out)
 
+    def __contains__(self, key):
+        return str(key) in self.get_data()
+
+
+class SQLiteCacheEntries(SQLiteStore):
+    """The entries of the SQLite backend, for all the rules"""
+
+    FILENAME = "cache.sqlite"
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "name TEXT NOT NULL, "
+        "bugid TEXT NOT NULL, "
+        "expires INTEGER NOT NULL, "
+        "PRIMARY KEY (name, bugid))"
+    ]
+
+    def _purge(self, db):
+        db.execute(
+            "DELETE FROM entries WHERE expires <= ?", (SQLiteCacheBackend._today(),)
+        )
+
+
+class SQLiteCacheBackend(object):
+    """Store the bugs of all the rules in a SQLite database.
+
+    The entries are indexed by (rule name, bug id) and have an expiration day,
+    so a lookup is a single indexed query, adding bugs only writes the new
+    rows and the expired entries are removed with one `DELETE`.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name, max_days):
+        super(SQLiteCacheBackend, self).__init__()
+        self.name = name
+        self.max_days = max_days
+        self.store = SQLiteCacheEntries.get_instance()
+        self.path = self.store.path
+        self._import_json()
+
+    @property
+    def db(self):
+        return self.store.db
+
+    def get_path(self):
+        return self.path
+
+    @staticmethod
+    def _today():
+        return lmdutils.get_date_ymd("today").toordinal()
+
+    def _import_json(self):
+        """Import the entries of the cache file used by the JSON backend"""
+        legacy = JSONCacheBackend(self.name, self.max_days)
+        path = legacy.get_path()
+        if not os.path.exists(path):
+            return
+
+        self._insert(
+            (bugid, lmdutils.get_date_ymd(date).toordinal() + self.max_days)
+            for bugid, date in legacy.get_data().items()
+        )
+        os.replace(path, path + ".imported")
+
+    def _insert(self, entries):
+        with self._lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries (name, bugid, expires) VALUES (?, ?, ?)",
+                ((self.name, str(bugid), expires) for bugid, expires in entries),
+            )
+            self.db.commit()
+
+    def add(self, bugids):
+        expires = self._today() + self.max_days
+        self._insert((bugid, expires) for bugid in bugids)
+
+    def __contains__(self, key):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT 1 FROM entries WHERE name = ? AND bugid = ? AND expires > ?",
+                (self.name, str(key), self._today()),
+            ).fetchone()
+        return row is not None
+
+
+BACKENDS = {
+    "json": JSONCacheBackend,
+    "sqlite": SQLiteCacheBackend,
+}
+
+
+class Cache(object):
+    def __init__(self, name, max_days, add_once=True, backend=None):
+        super(Cache, self).__init__()
+        self.name = name
+        self.max_days = max_days
+        self.add_once = add_once
+        self.added = False
+        self.dryrun = True
+        self.backend_name = backend or utils.get_config(
+            "common", "cache_backend", "sqlite"
+        )
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = BACKENDS[self.backend_name](self.name, self.max_days)
+        return self._backend
+
+    def set_dry_run(self, dryrun):
+        self.dryrun = dryrun or self.max_days < 1
+
+    def get_path(self):
+        return self.backend.get_path()
+
+    def add(self, bugids):
+        if self.dryrun or (self.add_once and self.added):
+            return
+
+        self.backend.add(bugids)
         self.added = True
 
     def __contains__(self, key):
-        return not self.dryrun and str(key) in self.get_data()
+        return not self.dryrun and key in self.backend
@@ -3,22 +3,23 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import itertools
-import re
-from collections import defaultdict
+import threading
 from datetime import date, datetime, timedelta
 from functools import cached_property
 from typing import Iterable, Iterator
 
 from dateutil import parser
-from libmozdata import bugzilla, clouseau, connection, socorro
+from libmozdata import bugzilla, clouseau, socorro
 from libmozdata import utils as lmdutils
 from libmozdata.bugzilla import Bugzilla
-from libmozdata.connection import Connection
 
 from bugbot import logger, utils
 from bugbot.bug.analyzer import BugAnalyzer, BugsStore
 from bugbot.components import ComponentName
 from bugbot.crash import socorro_util
+from bugbot.crash.processed_crashes import ProcessedCrashes
+from bugbot.crash.query_planner import SignatureQueryPlan
+from bugbot.crash.signature_index import CrashSignatureIndex
 
 # The max offset from a memory address to be considered "near".
 OFFSET_64_BIT = 0x1000
@@ -159,7 +160,7 @@ class ClouseauDataAnalyzer:
     @cached_property
     def regressed_by_potential_bugs(self) -> list[BugAnalyzer]:
         """The bugs whose patches could have caused the crash."""
-        self.bugs_store.fetch_bugs(
+        bugs = self.bugs_store.fetch_bugs(
             self.regressed_by_potential_bug_ids,
             [
                 "id",
@@ -171,7 +172,7 @@ class ClouseauDataAnalyzer:
             ],
         )
         return [
-            self.bugs_store.get_bug_by_id(bug_id)
+            bugs[bug_id] if bug_id in bugs else self.bugs_store.get_bug_by_id(bug_id)
             for bug_id in self.regressed_by_potential_bug_ids
         ]
 
@@ -514,6 +515,9 @@ class SignatureAnalyzer(SocorroDataAnalyzer, ClouseauDataAnalyzer):
     This includes data from Socorro and Clouseau.
     """
 
+    # The number of candidate reports downloaded at the same time
+    PREFETCHED_REPORTS = 5
+
     def __init__(
         self,
         socorro_signature: dict,
@@ -564,6 +568,27 @@ class SignatureAnalyzer(SocorroDataAnalyzer, ClouseauDataAnalyzer):
             for frame in processed_crash["json_dump"]["crashing_thread"]["frames"]
         )
 
+    def _iter_processed_crashes(self, reports: Iterable[dict]) -> Iterator[dict]:
+        """Get the processed crashes of the reports, in the same order.
+
+        The processed crashes are downloaded a few at a time, so the next
+        candidates are ready when the first ones are not good enough, and no
+        more are downloaded once the caller has found a good one.
+        """
+        processed_crashes = ProcessedCrashes.get_instance()
+        reports = iter(reports)
+        while True:
+            uuids = [
+                report["uuid"]
+                for report in itertools.islice(reports, self.PREFETCHED_REPORTS)
+            ]
+            if not uuids:
+                return
+
+            fetched = processed_crashes.get(uuids)
+            for uuid in uuids:
+                yield fetched[uuid]
+
     def fetch_representative_processed_crash(self) -> dict:
         """Fetch a processed crash to represent the signature.
 
@@ -589,10 +614,9 @@ class SignatureAnalyzer(SocorroDataAnalyzer, ClouseauDataAnalyzer):
         )
 
         first_representative_report = None
-        for i, report in enumerate(candidate_reports):
-            uuid = report["uuid"]
-            processed_crash = socorro.ProcessedCrash.get_processed(uuid)[uuid]
-
+        for i, processed_crash in enumerate(
+            self._iter_processed_crashes(candidate_reports)
+        ):
             if first_representative_report is None:
                 first_representative_report = processed_crash
 
@@ -897,8 +921,6 @@ class SignaturesDataFetcher:
             "release_channel": self._channel,
             # TODO(investigate): should we limit based on the build date as well?
             "date": date_range,
-            # TODO: split signatures into chunks to avoid very long query URLs
-            "signature": ["=" + signature for signature in self._signatures],
             "_aggs.signature": [
                 "address",
                 "build_id",
@@ -919,24 +941,32 @@ class SignaturesDataFetcher:
                 "moz_crash_reason",
             ],
             "_results_number": 0,
-            "_facets_size": 10000,
         }
 
+        plan = SignatureQueryPlan(self._signatures)
+        lock = threading.Lock()
+
         def handler(search_results: dict, data: dict):
-            data["num_total_crashes"] = search_results["total"]
-            data["signatures"] = search_results["facets"]["signature"]
+            # The prefix searches can return some other signatures
+            signatures = [
+                signature
+                for signature in search_results["facets"]["signature"]
+                if signature["term"] in plan.signatures
+            ]
+            with lock:
+                data["num_total_crashes"] += sum(
+                    signature["count"] for signature in signatures
+                )
+                data["signatures"].extend(signatures)
 
         logger.debug(
-            "Fetch from Socorro: requesting info for %d signatures",
+            "Fetch from Socorro: requesting info for %d signatures in %d searches",
             len(self._signatures),
+            len(plan),
         )
 
-        data: dict = {}
-        socorro.SuperSearchUnredacted(
-            params=params,
-            handler=handler,
-            handlerdata=data,
-        ).wait()
+        data: dict = {"num_total_crashes": 0, "signatures": []}
+        plan.run(params, handler, data, search_class=socorro.SuperSearchUnredacted)
 
         logger.debug(
             "Fetch from Socorro: received info for %d signatures",
@@ -952,53 +982,42 @@ class SignaturesDataFetcher:
         if not self._signatures:
             return {}
 
-        params_base: dict = {
-            "include_fields": [
-                "cf_crash_signature",
-            ],
-        }
-
-        if include_fields:
-            params_base["include_fields"].extend(include_fields)
-
-        params_list = []
-        for signatures_chunk in Connection.chunks(list(self._signatures), 30):
-            params = params_base.copy()
-            n = int(utils.get_last_field_num(params))
-            params[f"f{n}"] = "OP"
-            params[f"j{n}"] = "OR"
-            for signature in signatures_chunk:
-                n += 1
-                params[f"f{n}"] = "cf_crash_signature"
-                params[f"o{n}"] = "regexp"
-                params[f"v{n}"] = rf"\[(@ |@){re.escape(signature)}( \]|\])"
-            params[f"f{n+1}"] = "CP"
-            params_list.append(params)
-
-        signatures_bugs: dict = defaultdict(list)
-
-        def handler(res, data):
-            for bug in res["bugs"]:
-                for signature in utils.get_signatures(bug["cf_crash_signature"]):
-                    if signature in self._signatures:
-                        data[signature].append(bug)
+        # The bugs are found with the local index of the crash signatures,
+        # only the other fields are fetched from Bugzilla.
+        signatures_bugs = CrashSignatureIndex.get_instance().get_bugs(self._signatures)
 
         logger.debug(
-            "Fetch from Bugzilla: requesting bugs for %d signatures",
-            len(self._signatures),
+            "Crash signature index: found bugs for %d signatures",
+            len(signatures_bugs),
         )
-        timeout = utils.get_config("common", "bz_query_timeout")
-        Bugzilla(
-            timeout=timeout,
-            queries=[
-                connection.Query(Bugzilla.API_URL, params, handler, signatures_bugs)
-                for params in params_list
-            ],
-        ).wait()
 
-        logger.debug(
-            "Fetch from Bugzilla: received bugs for %d signatures", len(signatures_bugs)
-        )
+        if include_fields and signatures_bugs:
+            bug_ids = {bug["id"] for bugs in signatures_bugs.values() for bug in bugs}
+
+            def handler(bug, data):
+                data[bug["id"]] = bug
+
+            fetched: dict = {}
+            Bugzilla(
+                list(bug_ids),
+                include_fields=["id"] + include_fields,
+                bughandler=handler,
+                bugdata=fetched,
+                timeout=utils.get_config("common", "bz_query_timeout"),
+            ).wait()
+
+            # The bugs which are not visible anymore are dropped
+            signatures_bugs = {
+                signature: [
+                    {**bug, **fetched[bug["id"]]}
+                    for bug in bugs
+                    if bug["id"] in fetched
+                ]
+                for signature, bugs in signatures_bugs.items()
+            }
+            signatures_bugs = {
+                signature: bugs for signature, bugs in signatures_bugs.items() if bugs
+            }
 
         return signatures_bugs
 
@@ -1018,7 +1037,7 @@ class SignaturesDataFetcher:
         self._signatures.intersection_update(clouseau_reports.keys())
 
         signatures, num_total_crashes = self.fetch_socorro_info()
-        bugs_store = BugsStore()
+        bugs_store = BugsStore.get_instance()
 
         return [
             SignatureAnalyzer(
@@ -0,0 +1,157 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import threading
+import time
+from typing import Dict, Iterable
+
+from libmozdata import socorro
+from libmozdata.connection import Query
+
+from bugbot import utils
+from bugbot.cache import SQLiteStore
+from bugbot.crash import socorro_util
+
+# The fields of the processed crashes used to analyze the signatures and to
+# file the bugs; the json dump is reduced to the crashing thread.
+REPORT_FIELDS = [
+    "uuid",
+    "signature",
+    "proto_signature",
+    "crashing_thread",
+    "java_stack_trace",
+    "moz_crash_reason",
+    "reason",
+]
+
+
+def trim_processed_crash(processed_crash: dict) -> dict:
+    """Keep only the parts of a processed crash which are used
+
+    Args:
+        processed_crash: the processed crash from Socorro.
+
+    Returns:
+        A processed crash with the same structure, but without the fields and
+        the threads which are not used.
+    """
+    res = {
+        field: processed_crash[field]
+        for field in REPORT_FIELDS
+        if field in processed_crash
+    }
+
+    if "json_dump" in processed_crash:
+        json_dump = processed_crash["json_dump"]
+        res["json_dump"] = {}
+        if "crashing_thread" in json_dump:
+            res["json_dump"]["crashing_thread"] = json_dump["crashing_thread"]
+        if "threads" in json_dump:
+            # The indices of the threads must not change
+            thread_index = socorro_util.get_crashing_thread(processed_crash) or 0
+            res["json_dump"]["threads"] = [
+                thread if i == thread_index else {"frames": []}
+                for i, thread in enumerate(json_dump["threads"])
+            ]
+
+    return res
+
+
+class ProcessedCrashes(SQLiteStore):
+    """Get the processed crashes from Socorro.
+
+    The processed crashes don't change, so they are saved, trimmed to what is
+    used, in a SQLite database under the cache directory: the next runs (and
+    the dry runs) don't download them again. The missing ones are downloaded
+    at the same time.
+    """
+
+    FILENAME = "processed_crashes.sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS processed_crashes ("
+        "uuid TEXT PRIMARY KEY, "
+        "data TEXT NOT NULL, "
+        "fetched REAL NOT NULL)"
+    ]
+    EXPIRES = {"processed_crashes": "fetched"}
+
+    def __init__(self, path: str, max_age: float = 30 * 24 * 3600) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            max_age: the number of seconds a processed crash is kept.
+        """
+        super().__init__(path, max_age)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "ProcessedCrashes":
+        return cls(
+            path,
+            utils.get_config("common", "processed_crash_max_age", 30 * 24 * 3600),
+        )
+
+    @staticmethod
+    def _fetch(uuids: list[str]) -> Dict[str, dict]:
+        """Download the processed crashes, they are trimmed as soon as each
+        response is decoded"""
+        data: Dict[str, dict] = {uuid: {} for uuid in uuids}
+
+        def handler(processed_crash, data):
+            data.update(trim_processed_crash(processed_crash))
+
+        socorro.ProcessedCrash(
+            queries=[
+                Query(
+                    socorro.ProcessedCrash.URL,
+                    {"crash_id": uuid, "datatype": "processed"},
+                    handler,
+                    data[uuid],
+                )
+                for uuid in uuids
+            ]
+        ).wait()
+
+        return data
+
+    def get(self, uuids: Iterable[str]) -> Dict[str, dict]:
+        """Get the processed crashes
+
+        Args:
+            uuids: the ids of the crashes.
+
+        Returns:
+            The trimmed processed crashes by uuid.
+        """
+        uuids = list(dict.fromkeys(uuids))
+        res = {}
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT uuid, data FROM processed_crashes WHERE uuid IN ({})".format(
+                    ", ".join("?" * len(uuids))
+                ),
+                uuids,
+            )
+            res.update((uuid, json.loads(data)) for uuid, data in rows)
+
+            missing = [uuid for uuid in uuids if uuid not in res]
+            if missing:
+                fetched = self._fetch(missing)
+                now = time.time()
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO processed_crashes (uuid, data, fetched) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (uuid, json.dumps(processed_crash), now)
+                        for uuid, processed_crash in fetched.items()
+                        if processed_crash
+                    ],
+                )
+                self.db.commit()
+                res.update(fetched)
+
+        return res
@@ -0,0 +1,177 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Split the Socorro searches on a list of signatures.
+
+The signatures are given in the query string of the searches, so a long list
+of signatures must be split in several searches to keep the urls short
+enough. The signatures are packed by decreasing length in the fullest chunk
+which can still hold them, so the searches are as few as possible.
+
+A signature which is too long to be searched on its own is searched with a
+prefix of it (`^` operator); the callers must ignore the signatures in the
+results which they didn't ask for.
+"""
+
+from bisect import bisect_left, insort
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from libmozdata import socorro
+
+from bugbot import logger, utils
+
+# The maximal length of the signature parameters in the query string of a search
+MAX_SIGNATURES_LENGTH = 4096
+
+# The number of signatures expected for a prefix of a too long signature
+PREFIX_FACETS_SIZE = 100
+
+
+class SignatureChunk(NamedTuple):
+    """The signatures of one search"""
+
+    values: List[str]
+    facets_size: int
+
+
+def get_param_length(value: str) -> int:
+    """Get the length of a signature parameter in the query string"""
+    # One more character for the separator
+    return len(urlencode({"signature": value})) + 1
+
+
+class SignatureQueryPlan:
+    """Plan the searches for a list of signatures"""
+
+    def __init__(
+        self,
+        signatures: Iterable[str],
+        operator: str = "=",
+        max_length: int = MAX_SIGNATURES_LENGTH,
+    ) -> None:
+        """Constructor
+
+        Args:
+            signatures: the signatures to search.
+            operator: the Socorro operator used to match the signatures.
+            max_length: the maximal length of the signature parameters in a
+                search.
+        """
+        self.signatures = set(signatures)
+        self.oversized: List[str] = []
+
+        values = []
+        for signature in self.signatures:
+            value = operator + signature
+            if get_param_length(value) <= max_length:
+                values.append((value, False))
+                continue
+
+            self.oversized.append(signature)
+            value = self._get_prefix(signature, max_length)
+            values.append((value, True))
+
+        if self.oversized:
+            logger.warning(
+                "%d signatures are too long to be searched, their prefixes are used",
+                len(self.oversized),
+            )
+
+        self.chunks = self._pack(values, max_length)
+
+    @staticmethod
+    def _get_prefix(signature: str, max_length: int) -> str:
+        """Get the longest prefix search which fits in a search"""
+        low, high = 0, len(signature)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if get_param_length("^" + signature[:mid]) <= max_length:
+                low = mid
+            else:
+                high = mid - 1
+        return "^" + signature[:low]
+
+    @staticmethod
+    def _pack(values: List[tuple], max_length: int) -> List[SignatureChunk]:
+        """Pack the values by decreasing length, each one in the chunk with
+        the least room left which can hold it"""
+        chunks: List[List[str]] = []
+        prefixes: List[int] = []
+        # The room left in the chunks, sorted, with the index of the chunk
+        rooms: List[tuple] = []
+
+        for value, is_prefix in sorted(
+            values, key=lambda value: get_param_length(value[0]), reverse=True
+        ):
+            length = get_param_length(value)
+            i = bisect_left(rooms, (length, -1))
+            if i == len(rooms):
+                index = len(chunks)
+                chunks.append([])
+                prefixes.append(0)
+                room = max_length
+            else:
+                room, index = rooms.pop(i)
+
+            chunks[index].append(value)
+            prefixes[index] += is_prefix
+            insort(rooms, (room - length, index))
+
+        return [
+            SignatureChunk(
+                sorted(chunk), len(chunk) + prefix_count * PREFIX_FACETS_SIZE
+            )
+            for chunk, prefix_count in zip(chunks, prefixes)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def facets_size(self) -> int:
+        """The maximal number of signatures returned by a search"""
+        return max((chunk.facets_size for chunk in self.chunks), default=0)
+
+    def run(
+        self,
+        params: dict,
+        handler: Callable[[dict, Any], None],
+        handlerdata: Any = None,
+        search_class: type = socorro.SuperSearch,
+        max_workers: Optional[int] = None,
+        **kwargs,
+    ) -> None:
+        """Run the searches, several at a time
+
+        Args:
+            params: the parameters of the searches, without the signatures.
+            handler: the handler of the results of each search; it may be
+                called from several threads.
+            handlerdata: the data given to the handler.
+            search_class: the class of the searches.
+            max_workers: the maximal number of concurrent searches.
+            **kwargs: the other arguments of the searches.
+        """
+        if max_workers is None:
+            max_workers = utils.get_config("common", "socorro_workers", 4)
+
+        def search(chunk: SignatureChunk) -> None:
+            search_class(
+                params={
+                    **params,
+                    "signature": chunk.values,
+                    "_facets_size": chunk.facets_size,
+                },
+                handler=handler,
+                handlerdata=handlerdata,
+                **kwargs,
+            ).wait()
+
+        logger.debug(
+            "Search %d signatures in %d chunks", len(self.signatures), len(self)
+        )
+        with utils.ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consume the results to raise the errors
+            list(executor.map(search, self.chunks))
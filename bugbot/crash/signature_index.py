@@ -0,0 +1,234 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from libmozdata import connection
+from libmozdata.bugzilla import Bugzilla
+
+from bugbot import logger, utils
+from bugbot.cache import SQLiteStore
+
+# The fields of the bugs kept in the index
+FIELDS = ["id", "cf_crash_signature", "status", "resolution", "last_change_time"]
+
+
+class CrashSignatureIndex(SQLiteStore):
+    """Find the bugs filed for some crash signatures without searching them.
+
+    The crash signatures of all the bugs are kept in a SQLite database under
+    the cache directory, indexed by signature (as parsed by
+    `utils.get_signatures`). The index is built once with all the bugs having
+    a crash signature; then only the bugs changed since the last change seen
+    are fetched to keep it up to date, at most every `refresh_interval`
+    seconds. It is fully rebuilt every `max_age` seconds, for the bugs which
+    have been deleted or hidden in the meantime.
+    """
+
+    FILENAME = "crash_signatures.sqlite"
+    PAGE_SIZE = 10000
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS bugs ("
+        "id INTEGER PRIMARY KEY, "
+        "cf_crash_signature TEXT NOT NULL, "
+        "status TEXT, "
+        "resolution TEXT, "
+        "last_change_time TEXT)",
+        "CREATE TABLE IF NOT EXISTS signatures ("
+        "signature TEXT NOT NULL, "
+        "bug_id INTEGER NOT NULL, "
+        "PRIMARY KEY (signature, bug_id))",
+        "CREATE TABLE IF NOT EXISTS state ("
+        "key TEXT PRIMARY KEY, "
+        "value TEXT NOT NULL)",
+    ]
+
+    def __init__(
+        self,
+        path: str,
+        refresh_interval: float = 300,
+        max_age: float = 7 * 24 * 3600,
+    ) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            refresh_interval: the number of seconds between two updates.
+            max_age: the number of seconds before the index is rebuilt.
+        """
+        super().__init__(path, max_age)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "CrashSignatureIndex":
+        return cls(
+            path,
+            utils.get_config("common", "crash_signature_index_refresh", 300),
+            utils.get_config("common", "crash_signature_index_max_age", 7 * 24 * 3600),
+        )
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self.db.execute(
+            "SELECT value FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def _search(self, params: dict) -> Iterable[List[dict]]:
+        """Search the bugs page by page, ordered by id"""
+        last_id = 0
+        while True:
+            page_params = dict(params)
+            n = int(utils.get_last_field_num(page_params))
+            page_params.update(
+                {
+                    "include_fields": FIELDS,
+                    "order": "bug_id",
+                    "limit": self.PAGE_SIZE,
+                    f"f{n}": "bug_id",
+                    f"o{n}": "greaterthan",
+                    f"v{n}": last_id,
+                }
+            )
+
+            bugs: List[dict] = []
+            Bugzilla(
+                timeout=utils.get_config("common", "bz_query_timeout"),
+                queries=[
+                    connection.Query(
+                        Bugzilla.API_URL,
+                        page_params,
+                        lambda res, data: data.extend(res["bugs"]),
+                        bugs,
+                    )
+                ],
+            ).wait()
+
+            if not bugs:
+                return
+            yield bugs
+            if len(bugs) < self.PAGE_SIZE:
+                return
+            last_id = max(bug["id"] for bug in bugs)
+
+    def _update(self, bugs: List[dict]) -> None:
+        """Replace the signatures of the bugs"""
+        bug_ids = [bug["id"] for bug in bugs]
+        for i in range(0, len(bug_ids), 500):
+            chunk = bug_ids[i : i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            self.db.execute(f"DELETE FROM bugs WHERE id IN ({placeholders})", chunk)
+            self.db.execute(
+                f"DELETE FROM signatures WHERE bug_id IN ({placeholders})", chunk
+            )
+
+        bugs = [bug for bug in bugs if bug.get("cf_crash_signature")]
+        self.db.executemany(
+            "INSERT INTO bugs (id, cf_crash_signature, status, resolution, last_change_time) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    bug["id"],
+                    bug["cf_crash_signature"],
+                    bug.get("status"),
+                    bug.get("resolution"),
+                    bug.get("last_change_time"),
+                )
+                for bug in bugs
+            ],
+        )
+        self.db.executemany(
+            "INSERT OR IGNORE INTO signatures (signature, bug_id) VALUES (?, ?)",
+            [
+                (signature, bug["id"])
+                for bug in bugs
+                for signature in utils.get_signatures(bug["cf_crash_signature"])
+            ],
+        )
+
+    def refresh(self, force: bool = False) -> None:
+        """Update the index with the bugs changed since the last update
+
+        Args:
+            force: whether to update the index even if it was updated less
+                than `refresh_interval` seconds ago.
+        """
+        with self._lock:
+            now = time.time()
+            built = float(self._get_state("built") or 0)
+            refreshed = float(self._get_state("refreshed") or 0)
+            since = self._get_state("last_change_time")
+
+            rebuild = built < now - self.max_age or since is None
+            if rebuild:
+                logger.debug("Build the crash signature index")
+                params = {"f1": "cf_crash_signature", "o1": "isnotempty"}
+                built = now
+            elif force or refreshed < now - self.refresh_interval:
+                logger.debug("Update the crash signature index since %s", since)
+                # The bugs which lost their signatures must be updated too
+                params = {"last_change_time": since}
+            else:
+                return
+
+            try:
+                if rebuild:
+                    self.db.execute("DELETE FROM bugs")
+                    self.db.execute("DELETE FROM signatures")
+
+                for bugs in self._search(params):
+                    self._update(bugs)
+                    since = max(
+                        [since or ""] + [bug["last_change_time"] for bug in bugs]
+                    )
+
+                if since:
+                    self._set_state("last_change_time", since)
+                self._set_state("built", str(built))
+                self._set_state("refreshed", str(now))
+            except Exception:
+                self.db.rollback()
+                raise
+
+            self.db.commit()
+
+    def get_bugs(self, signatures: Iterable[str]) -> Dict[str, List[dict]]:
+        """Get the bugs filed for some signatures
+
+        Args:
+            signatures: the crash signatures.
+
+        Returns:
+            The bugs (with the fields `id`, `cf_crash_signature`, `status`,
+            `resolution` and `last_change_time`) by signature, for the
+            signatures having some bugs.
+        """
+        self.refresh()
+
+        signatures = list(dict.fromkeys(signatures))
+        res: Dict[str, List[dict]] = defaultdict(list)
+        with self._lock:
+            for i in range(0, len(signatures), 500):
+                chunk = signatures[i : i + 500]
+                rows = self.db.execute(
+                    "SELECT signatures.signature, bugs.id, bugs.cf_crash_signature, "
+                    "bugs.status, bugs.resolution, bugs.last_change_time "
+                    "FROM signatures JOIN bugs ON bugs.id = signatures.bug_id "
+                    "WHERE signatures.signature IN ({}) "
+                    "ORDER BY bugs.id".format(", ".join("?" * len(chunk))),
+                    chunk,
+                )
+                for signature, *values in rows:
+                    res[signature].append(dict(zip(FIELDS, values)))
+
+        return res
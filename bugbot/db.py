@@ -6,15 +6,16 @@ import calendar
 import csv
 import json
 import os
+import threading
+from contextlib import contextmanager
 from typing import Any
 
 import dateutil.parser
 from filelock import FileLock
 from libmozdata import utils as lmdutils
-from sqlalchemy import Column, ForeignKey, Integer, String, create_engine
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm import joinedload, relationship, scoped_session, sessionmaker
 
 from bugbot import logger, utils
 from bugbot.history import History
@@ -25,13 +26,64 @@ db_url = utils.get_config("common", "database")
 engine = create_engine(db_url)
 DBSession = sessionmaker(bind=engine)
 Base.metadata.bind = engine
-session = DBSession()
+# Each thread gets its own session when the rules are run concurrently
+session = scoped_session(DBSession)
+_thread_lock = threading.RLock()
+# A single instance so the lock is reentrant in a thread
+_file_lock = FileLock(lock_path)
+
+# The maximum number of values in a `IN (...)` clause (SQLite is limited to 999
+# variables per statement)
+IN_CHUNK_SIZE = 500
+
+# The ids of the tools, users and extras by value: they are never modified
+# once created, so they can be kept for the whole process.
+_ids: dict[tuple[str, str], int] = {}
+
+
+@contextmanager
+def lock():
+    """Serialize the access to the database between threads and processes"""
+    with _thread_lock, _file_lock:
+        yield
+
+
+def _get_id(model, column, value, create=True):
+    """Get the id of the row of `model` where `column` is `value`, creating the
+    row if needed (or returning `None` if `create` is `False`)"""
+    key = (model.__tablename__, value)
+    if key in _ids:
+        return _ids[key]
+
+    with lock():
+        row = session.query(model.id).filter(column == value).first()
+        if row is None:
+            if not create:
+                return None
+            obj = model(value)
+            session.add(obj)
+            session.commit()
+            _id = obj.id
+        else:
+            _id = row.id
+        _ids[key] = _id
+
+    return _id
 
 
-def init():
-    history = History().get()
+def init(incremental=True):
+    """Fill the database with the changes made by the bot in Bugzilla
+
+    Args:
+        incremental: if True, only the changes made since the previous sync
+            are fetched; else the whole history is.
+    """
+    since = HistorySync.get_date() if incremental else None
+    until = lmdutils.get_timestamp("now")
+    history = History().get(since=since, until=until)
     logger.info("Put history in db: start...")
     BugChange.import_from_dict(history)
+    HistorySync.set_date(until)
     logger.info("Put history in db: end.")
 
 
@@ -55,6 +107,19 @@ def get_ts(date, default=0):
     return default
 
 
+def _insert_rows(model, rows):
+    """Insert the rows in the table of `model` with a single statement and a
+    single commit"""
+    rows = list(rows)
+    if not rows:
+        return
+
+    check(model.__tablename__)
+    with lock():
+        session.execute(model.__table__.insert(), rows)
+        session.commit()
+
+
 class Tool(Base):
     __tablename__ = "autonag_tools"
 
@@ -67,15 +132,12 @@ class Tool(Base):
         self.name = name
 
     @staticmethod
-    def get_or_create(name):
-        try:
-            return session.query(Tool).filter(Tool.name == name).one()
-        except NoResultFound:
-            e = Tool(name)
-            session.add(e)
-            session.commit()
+    def get_id(name, create=True):
+        return _get_id(Tool, Tool.name, name, create=create)
 
-            return e
+    @staticmethod
+    def get_or_create(name):
+        return session.query(Tool).get(Tool.get_id(name))
 
     def __repr__(self):
         return self.name
@@ -86,6 +148,9 @@ class Tool(Base):
 
 class BugChange(Base):
     __tablename__ = "autonag_bugchanges"
+    __table_args__ = (
+        Index("ix_autonag_bugchanges_tool_id_date_bugid", "tool_id", "date", "bugid"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     tool_id = Column(Integer, ForeignKey("autonag_tools.id", ondelete="CASCADE"))
@@ -94,71 +159,106 @@ class BugChange(Base):
     bugid = Column(Integer)
 
     def __init__(self, tool, date, bugid, extra):
-        self.tool = Tool.get_or_create(tool)
+        self.tool_id = Tool.get_id(tool)
         self.date = get_ts(date)
         self.bugid = int(bugid)
-        self.extra = Extra.get_or_create(extra)
+        self.extra_id = Extra.get_id(extra)
+
+    @staticmethod
+    def get_row(tool, date, bugid, extra):
+        """Get the values to insert for a bug change"""
+        return {
+            "tool_id": Tool.get_id(tool),
+            "extra_id": Extra.get_id(extra),
+            "date": get_ts(date),
+            "bugid": int(bugid),
+        }
 
     def get_date(self):
         return lmdutils.get_date_from_timestamp(self.date)
 
     @staticmethod
-    def add(tool, bugid, ts=lmdutils.get_timestamp("now"), extra=""):
-        check(BugChange.__tablename__)
-        with FileLock(lock_path):
-            session.add(BugChange(tool, ts, bugid, extra))
-            session.commit()
+    def add(tool, bugid, ts=None, extra=""):
+        BugChange.add_many(tool, [(bugid, extra)], ts=ts)
+
+    @staticmethod
+    def add_many(tool, changes, ts=None):
+        """Add several bug changes made by a tool in one transaction
+
+        Args:
+            tool: the name of the tool.
+            changes: the (bugid, extra) pairs.
+            ts: the timestamp of the changes (now by default).
+        """
+        ts = get_ts(ts, default="now")
+        _insert_rows(
+            BugChange,
+            (BugChange.get_row(tool, ts, bugid, extra) for bugid, extra in changes),
+        )
 
     @staticmethod
     def get(name=None, start_date=None, end_date=None):
-        with FileLock(lock_path):
-            start_date = get_ts(start_date, default=0)
-            end_date = get_ts(end_date, default="now")
+        """Get the bug changes made in a period of time, ordered by date
+
+        The query is run under the lock, with the tools and the extras of the
+        changes, so the returned changes can be used without it.
+        """
+        start_date = get_ts(start_date, default=0)
+        end_date = get_ts(end_date, default="now")
+        with lock():
+            rs = session.query(BugChange).options(
+                joinedload(BugChange.tool), joinedload(BugChange.extra)
+            )
             if name:
-                rs = (
-                    session.query(BugChange)
-                    .join(BugChange.tool)
-                    .filter(
-                        Tool.name == name,
-                        BugChange.date >= start_date,
-                        BugChange.date < end_date,
-                    )
-                )
-            else:
-                rs = session.query(BugChange).filter(
-                    BugChange.date >= start_date, BugChange.date < end_date
-                )
+                rs = rs.join(BugChange.tool).filter(Tool.name == name)
 
-            return rs
+            return (
+                rs.filter(BugChange.date >= start_date, BugChange.date < end_date)
+                .order_by(BugChange.date, BugChange.bugid)
+                .all()
+            )
 
     @staticmethod
     def has_already_nagged(bugids, name=None, start_date=None, end_date=None):
-        with FileLock(lock_path):
-            data = {int(bugid): False for bugid in bugids}
-            bugids = list(data.keys())
-            start_date = get_ts(start_date, default=0)
-            end_date = get_ts(end_date, default="now")
+        nagged = BugChange.get_nagged(bugids, name, start_date, end_date)
+        return {int(bugid): int(bugid) in nagged for bugid in bugids}
+
+    @staticmethod
+    def get_nagged(bugids, name=None, start_date=None, end_date=None):
+        """Get the bugs which have been changed in a period of time
+
+        Args:
+            bugids: the bugs to check.
+            name: the name of the tool which made the changes (any tool if
+                `None`).
+            start_date: the beginning of the period (included).
+            end_date: the end of the period (excluded, now by default).
+
+        Returns:
+            The set of the ids of the bugs which have been changed.
+        """
+        bugids = sorted({int(bugid) for bugid in bugids})
+        start_date = get_ts(start_date, default=0)
+        end_date = get_ts(end_date, default="now")
+        nagged = set()
+
+        with lock():
+            query = session.query(BugChange.bugid).filter(
+                BugChange.date >= start_date, BugChange.date < end_date
+            )
             if name:
-                res = (
-                    session.query(BugChange.bugid)
-                    .join(BugChange.tool)
-                    .filter(
-                        Tool.name == name,
-                        BugChange.bugid.in_(bugids),
-                        BugChange.date >= start_date,
-                        BugChange.date < end_date,
-                    )
-                )
-            else:
-                res = session.query(BugChange.bugid).filter(
-                    BugChange.bugid.in_(bugids),
-                    BugChange.date >= start_date,
-                    BugChange.date < end_date,
+                tool_id = Tool.get_id(name, create=False)
+                if tool_id is None:
+                    return nagged
+                query = query.filter(BugChange.tool_id == tool_id)
+
+            for i in range(0, len(bugids), IN_CHUNK_SIZE):
+                chunk = bugids[i : i + IN_CHUNK_SIZE]
+                nagged.update(
+                    bugid for (bugid,) in query.filter(BugChange.bugid.in_(chunk))
                 )
 
-            for r in res:
-                data[r.bugid] = True
-            return data
+        return nagged
 
     @staticmethod
     def dump(path=""):
@@ -191,12 +291,35 @@ class BugChange(Base):
 
     @staticmethod
     def import_from_dict(data):
+        """Import bug changes
+
+        The changes already in the database with the same tool, bug and date
+        are skipped, so a period can be imported again without duplicates,
+        and the changes added by the rules are kept with their extras.
+
+        Args:
+            data: the bug changes.
+        """
+        rows = {}
         for bug in data:
-            tool, date, bugid, extra = (
-                bug[field] for field in ["tool", "date", "bugid", "extra"]
+            row = BugChange.get_row(
+                *(bug[field] for field in ["tool", "date", "bugid", "extra"])
             )
-            session.add(BugChange(tool, date, bugid, extra))
-        session.commit()
+            rows.setdefault((row["tool_id"], row["bugid"], row["date"]), row)
+        if not rows:
+            return
+
+        check(BugChange.__tablename__)
+        dates = [date for _, _, date in rows]
+        with lock():
+            existing = session.query(
+                BugChange.tool_id, BugChange.bugid, BugChange.date
+            ).filter(BugChange.date >= min(dates), BugChange.date <= max(dates))
+            for key in existing:
+                rows.pop(tuple(key), None)
+            if rows:
+                session.execute(BugChange.__table__.insert(), list(rows.values()))
+            session.commit()
 
     def __repr__(self):
         extra = self.extra.extra if self.extra else ""
@@ -219,15 +342,12 @@ class User(Base):
         self.email = email
 
     @staticmethod
-    def get_or_create(email):
-        try:
-            return session.query(User).filter(User.email == email).one()
-        except NoResultFound:
-            e = User(email)
-            session.add(e)
-            session.commit()
+    def get_id(email):
+        return _get_id(User, User.email, email)
 
-            return e
+    @staticmethod
+    def get_or_create(email):
+        return session.query(User).get(User.get_id(email))
 
     @staticmethod
     def dump():
@@ -253,19 +373,12 @@ class Extra(Base):
         self.extra = extra
 
     @staticmethod
-    def get_or_create(extra):
-        try:
-            return (
-                session.query(Extra).filter(Extra.extra == extra).one()
-                if extra
-                else None
-            )
-        except NoResultFound:
-            e = Extra(extra)
-            session.add(e)
-            session.commit()
+    def get_id(extra):
+        return _get_id(Extra, Extra.extra, extra) if extra else None
 
-            return e
+    @staticmethod
+    def get_or_create(extra):
+        return session.query(Extra).get(Extra.get_id(extra)) if extra else None
 
     @staticmethod
     def dump():
@@ -279,8 +392,37 @@ class Extra(Base):
         return self.__repr__()
 
 
+class HistorySync(Base):
+    """The date of the last change imported from the Bugzilla history"""
+
+    __tablename__ = "autonag_history_sync"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(Integer, nullable=False)
+
+    def __init__(self, date):
+        self.date = get_ts(date)
+
+    @staticmethod
+    def get_date():
+        """Get the timestamp of the last sync, or None if there is none"""
+        check(HistorySync.__tablename__)
+        with lock():
+            row = session.query(HistorySync.date).order_by(HistorySync.id).first()
+        return None if row is None else row.date
+
+    @staticmethod
+    def set_date(date):
+        check(HistorySync.__tablename__)
+        with lock():
+            session.query(HistorySync).delete()
+            session.add(HistorySync(date))
+            session.commit()
+
+
 class Email(Base):
     __tablename__ = "autonag_emails"
+    __table_args__ = (Index("ix_autonag_emails_tool_id_date", "tool_id", "date"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     tool_id = Column(Integer, ForeignKey("autonag_tools.id", ondelete="CASCADE"))
@@ -290,12 +432,23 @@ class Email(Base):
     result = Column(Integer)
 
     def __init__(self, tool, date, user, extra, result):
-        self.tool = tool if isinstance(tool, Tool) else Tool.get_or_create(tool)
+        self.tool_id = tool.id if isinstance(tool, Tool) else Tool.get_id(tool)
         self.date = get_ts(date)
-        self.user = User.get_or_create(user)
-        self.extra = Extra.get_or_create(extra)
+        self.user_id = User.get_id(user)
+        self.extra_id = Extra.get_id(extra)
         self.result = 0 if result.lower() == "failure" else 1
 
+    @staticmethod
+    def get_row(tool, date, user, extra, result):
+        """Get the values to insert for an email"""
+        return {
+            "tool_id": Tool.get_id(tool),
+            "user_id": User.get_id(user),
+            "extra_id": Extra.get_id(extra),
+            "date": get_ts(date),
+            "result": 0 if result.lower() == "failure" else 1,
+        }
+
     def get_date(self):
         return lmdutils.get_date_from_timestamp(self.date)
 
@@ -335,50 +488,78 @@ class Email(Base):
 
     @staticmethod
     def import_from_dict(data):
-        for email in data:
-            tool, date, user, extra, result = (
-                email[field] for field in ["tool", "date", "user", "extra", "result"]
-            )
-            session.add(Email(tool, date, user, extra, result))
-        session.commit()
+        _insert_rows(
+            Email,
+            (
+                Email.get_row(
+                    *(
+                        email[field]
+                        for field in ["tool", "date", "user", "extra", "result"]
+                    )
+                )
+                for email in data
+            ),
+        )
 
     @staticmethod
-    def add(tool, mails, extra, result, ts=lmdutils.get_timestamp("now")):
-        check(Email.__tablename__)
-        with FileLock(lock_path):
-            tool = Tool.get_or_create(tool)
-            for mail in mails:
-                session.add(Email(tool, ts, mail, extra, result))
-            session.commit()
+    def add(tool, mails, extra, result, ts=None):
+        Email.add_many([(tool, mails, extra, result)], ts=ts)
+
+    @staticmethod
+    def add_many(emails, ts=None):
+        """Add the emails sent in one transaction
+
+        Args:
+            emails: the (tool, receivers, extra, result) tuples.
+            ts: the timestamp of the emails (now by default).
+        """
+        ts = get_ts(ts, default="now")
+        _insert_rows(
+            Email,
+            (
+                Email.get_row(tool, ts, mail, extra, result)
+                for tool, mails, extra, result in emails
+                for mail in mails
+            ),
+        )
 
     @staticmethod
     def get(name=None, start_date=None, end_date=None):
+        """Get the emails sent in a period of time, ordered by date
+
+        The query is run under the lock, with the tools, the users and the
+        extras of the emails, so the returned emails can be used without it.
+        """
         start_date = get_ts(start_date, 0)
         end_date = get_ts(end_date, "now")
-        with FileLock(lock_path):
+        with lock():
+            rs = session.query(Email).options(
+                joinedload(Email.tool), joinedload(Email.user), joinedload(Email.extra)
+            )
             if name:
-                rs = (
-                    session.query(Email)
-                    .join(Email.tool)
-                    .filter(
-                        Tool.name == name,
-                        Email.date >= start_date,
-                        Email.date < end_date,
-                    )
-                )
-            else:
-                rs = session.query(Email).filter(
-                    Email.date >= start_date, Email.date < end_date
-                )
+                rs = rs.join(Email.tool).filter(Tool.name == name)
 
-            return rs
+            return (
+                rs.filter(Email.date >= start_date, Email.date < end_date)
+                .order_by(Email.date, Email.id)
+                .all()
+            )
 
     @staticmethod
     def has_already_nagged(name=None, start_date=None, end_date=None):
-        return (
-            Email.get(name=name, start_date=start_date, end_date=end_date).first()
-            is not None
-        )
+        start_date = get_ts(start_date, 0)
+        end_date = get_ts(end_date, "now")
+        with lock():
+            query = session.query(Email.id).filter(
+                Email.date >= start_date, Email.date < end_date
+            )
+            if name:
+                tool_id = Tool.get_id(name, create=False)
+                if tool_id is None:
+                    return False
+                query = query.filter(Email.tool_id == tool_id)
+
+            return query.first() is not None
 
     def __repr__(self):
         extra = self.extra.extra if self.extra else ""
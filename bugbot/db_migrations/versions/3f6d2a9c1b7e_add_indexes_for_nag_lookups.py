@@ -0,0 +1,34 @@
+"""Add indexes for the nag lookups
+
+Revision ID: 3f6d2a9c1b7e
+Revises: ac0a01dcb3a9
+Create Date: 2026-10-17 09:12:45.318204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f6d2a9c1b7e"
+down_revision = "ac0a01dcb3a9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_autonag_bugchanges_tool_id_date_bugid",
+        "autonag_bugchanges",
+        ["tool_id", "date", "bugid"],
+    )
+    op.create_index(
+        "ix_autonag_emails_tool_id_date",
+        "autonag_emails",
+        ["tool_id", "date"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_autonag_emails_tool_id_date", table_name="autonag_emails")
+    op.drop_index(
+        "ix_autonag_bugchanges_tool_id_date_bugid", table_name="autonag_bugchanges"
+    )
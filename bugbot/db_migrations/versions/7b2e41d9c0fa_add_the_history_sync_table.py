@@ -0,0 +1,28 @@
+"""Add the history sync table
+
+Revision ID: 7b2e41d9c0fa
+Revises: 3f6d2a9c1b7e
+Create Date: 2026-10-17 10:02:11.473920
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7b2e41d9c0fa"
+down_revision = "3f6d2a9c1b7e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "autonag_history_sync",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("date", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("autonag_history_sync")
@@ -2,20 +2,143 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pprint
 
+from libmozdata import utils as lmdutils
 from libmozdata.bugzilla import Bugzilla
 
-from bugbot import logger
+from bugbot import logger, utils
+
+# The tools which made a comment, in order of priority: (kind, text, tool)
+# where kind is "prefix" when the comment starts with the text or "substring"
+# when it contains it.
+COMMENT_SIGNATURES = [
+    (
+        "prefix",
+        "The leave-open keyword is there and there is no activity for",
+        "leave_open_no_activity",
+    ),
+    ("prefix", "Closing because no crashes reported for", "no_crashes"),
+    ("prefix", "Moving to p3 because no activity for at least", "old_p2_bug"),
+    ("prefix", "Moving to p2 because no activity for at least", "old_p1_bug"),
+    (
+        "prefix",
+        "There's a r+ patch which didn't land and no activity in this bug",
+        "not_landed",
+    ),
+    (
+        "prefix",
+        "There are some r+ patches which didn't land and no activity in this bug for",
+        "not_landed",
+    ),
+    (
+        "prefix",
+        "The meta keyword is there, the bug doesn't depend on other bugs and there is no activity for",
+        "meta_no_deps_no_activity",
+    ),
+    (
+        "substring",
+        "[mozregression](https://wiki.mozilla.org/Auto-tools/Projects/Mozregression)",
+        "has_str_no_range",
+    ),
+    (
+        "substring",
+        "as the bug is tracked by a release manager for the current",
+        "mismatch_priority_tracking",
+    ),
+    ("prefix", "The severity flag is not set for this bug.\n:", "no_severity"),
+    (
+        "prefix",
+        "The priority flag is not set for this bug and there is no activity for",
+        "ni_triage_owner",
+    ),
+]
+
+
+class CommentClassifier(object):
+    """Find the tool which made a comment from the signatures.
+
+    The prefixes are indexed by their first characters (as many as in the
+    shortest one), so a comment is compared only to the prefixes starting
+    like it, and the substrings are only looked for when they have a higher
+    priority than the matching prefix.
+    """
+
+    def __init__(self, signatures):
+        super(CommentClassifier, self).__init__()
+        self.signatures = []
+        for signature in signatures:
+            self.add(*signature)
+
+    def add(self, kind, text, tool):
+        """Add a signature, with a lower priority than the previous ones"""
+        if kind not in ("prefix", "substring"):
+            raise ValueError(f"Invalid kind of signature: {kind}")
+        self.signatures.append((kind, text, tool))
+        self.compile()
+
+    def compile(self):
+        prefixes = [
+            (priority, text, tool)
+            for priority, (kind, text, tool) in enumerate(self.signatures)
+            if kind == "prefix"
+        ]
+        self.depth = min((len(text) for _, text, _ in prefixes), default=0)
+        self.prefixes = {}
+        for priority, text, tool in prefixes:
+            self.prefixes.setdefault(text[: self.depth], []).append(
+                (priority, text, tool)
+            )
+        self.substrings = [
+            (priority, text, tool)
+            for priority, (kind, text, tool) in enumerate(self.signatures)
+            if kind == "substring"
+        ]
+
+    def classify(self, comment):
+        """Get the tool which made the comment, or None"""
+        found = len(self.signatures), None
+        for priority, text, tool in self.prefixes.get(comment[: self.depth], ()):
+            if comment.startswith(text):
+                found = priority, tool
+                break
+
+        for priority, text, tool in self.substrings:
+            if priority > found[0]:
+                break
+            if text in comment:
+                return tool
+
+        return found[1]
+
+
+COMMENT_CLASSIFIER = CommentClassifier(COMMENT_SIGNATURES)
 
 
 class History(object):
     BOT = "release-mgmt-account-bot@mozilla.tld"
+    # The number of bugs classified by a process at once
+    CHUNK_SIZE = 1000
 
     def __init__(self):
         super(History, self).__init__()
 
-    def get_bugs(self):
+    @staticmethod
+    def in_period(when, since=None, until=None):
+        """Check if a date is in [since, until[ (timestamps)"""
+        if since is None and until is None:
+            return True
+        ts = lmdutils.get_timestamp(when)
+        return (since is None or since <= ts) and (until is None or ts < until)
+
+    def get_bugs(self, since=None):
+        """Get the bugs changed by the bot
+
+        Args:
+            since: if not None, only the bugs changed since this timestamp.
+        """
         logger.info("History: get bugs: start...")
 
         def bug_handler(bug, data):
@@ -57,6 +180,11 @@ class History(object):
                     "o1": operator,
                     "v1": History.BOT,
                 }
+                if since is not None:
+                    params["chfieldfrom"] = lmdutils.get_date_str(
+                        lmdutils.get_date_from_timestamp(since)
+                    )
+                    params["chfieldto"] = "Now"
                 queries.append(
                     Bugzilla(params, bughandler=bug_handler, bugdata=bugids, timeout=20)
                 )
@@ -68,20 +196,23 @@ class History(object):
 
         return bugids
 
-    def get_bug_info(self, bugids):
+    def get_bug_info(self, bugids, since=None, until=None):
+        """Get the changes and the comments made by the bot in [since, until["""
         logger.info("History: get bugs info: start...")
 
         def history_handler(bug, data):
             bugid = str(bug["id"])
             for h in bug["history"]:
-                if h["who"] == History.BOT:
+                if h["who"] == History.BOT and self.in_period(h["when"], since, until):
                     del h["who"]
                     data[bugid].append(h)
 
         def comment_handler(bug, bugid, data):
             bugid = str(bugid)
             for comment in bug["comments"]:
-                if comment["author"] == History.BOT:
+                if comment["author"] == History.BOT and self.in_period(
+                    comment["creation_time"], since, until
+                ):
                     text = comment["text"]
                     data[bugid].append(
                         {"comment": text, "date": comment["creation_time"]}
@@ -144,55 +275,50 @@ class History(object):
                     return c[len(ni) : -1]
         return ""
 
-    def guess_tool(self, data):
+    def guess_tool(self, data, processes=None):
+        """Guess the tools which made the changes and the comments
+
+        Args:
+            data: the changes and comments by date by bug, from `cleanup`.
+            processes: the number of processes classifying the bugs; by
+                default the `history_processes` from the configuration.
+        """
+        if processes is None:
+            processes = utils.get_config(
+                "common", "history_processes", os.cpu_count() or 1
+            )
+
+        items = list(data.items())
+        if processes <= 1 or len(items) < 2 * History.CHUNK_SIZE:
+            res, no_tool = self._guess_tool(items)
+        else:
+            chunks = [
+                items[i : i + History.CHUNK_SIZE]
+                for i in range(0, len(items), History.CHUNK_SIZE)
+            ]
+            res, no_tool = [], []
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                for chunk_res, chunk_no_tool in pool.map(self._guess_tool, chunks):
+                    res += chunk_res
+                    no_tool += chunk_no_tool
+
+        if no_tool:
+            pprint(no_tool)
+
+        return res
+
+    def _guess_tool(self, items):
         res = []
         no_tool = []
 
-        for bugid, info in data.items():
+        for bugid, info in items:
             for date, i in info.items():
                 if "comment" in i:
                     c = i["comment"]
                     if c.startswith("Crash volume for signature"):
                         continue
 
-                    tool = None
-                    if c.startswith(
-                        "The leave-open keyword is there and there is no activity for"
-                    ):
-                        tool = "leave_open_no_activity"
-                    elif c.startswith("Closing because no crashes reported for"):
-                        tool = "no_crashes"
-                    elif c.startswith("Moving to p3 because no activity for at least"):
-                        tool = "old_p2_bug"
-                    elif c.startswith("Moving to p2 because no activity for at least"):
-                        tool = "old_p1_bug"
-                    elif c.startswith(
-                        "There's a r+ patch which didn't land and no activity in this bug"
-                    ) or c.startswith(
-                        "There are some r+ patches which didn't land and no activity in this bug for"
-                    ):
-                        tool = "not_landed"
-                    elif c.startswith(
-                        "The meta keyword is there, the bug doesn't depend on other bugs and there is no activity for"
-                    ):
-                        tool = "meta_no_deps_no_activity"
-                    elif (
-                        "[mozregression](https://wiki.mozilla.org/Auto-tools/Projects/Mozregression)"
-                        in c
-                    ):
-                        tool = "has_str_no_range"
-                    elif (
-                        "as the bug is tracked by a release manager for the current"
-                        in c
-                    ):
-                        tool = "mismatch_priority_tracking"
-                    elif c.startswith("The severity flag is not set for this bug.\n:"):
-                        tool = "no_severity"
-                    elif c.startswith(
-                        "The priority flag is not set for this bug and there is no activity for"
-                    ):
-                        tool = "ni_triage_owner"
-
+                    tool = COMMENT_CLASSIFIER.classify(c)
                     if tool is None:
                         no_tool.append((bugid, info))
                     else:
@@ -388,14 +514,19 @@ class History(object):
                     if len(res) == N:
                         no_tool.append((bugid, info))
 
-        if no_tool:
-            pprint(no_tool)
+        return res, no_tool
 
-        return res
+    def get(self, since=None, until=None):
+        """Get the changes made by the bot
 
-    def get(self):
-        bugids = self.get_bugs()
-        bugs = self.get_bug_info(bugids)
+        Args:
+            since: if not None, the timestamp of the beginning of the period
+                (included); only the bugs changed since then are fetched.
+            until: if not None, the timestamp of the end of the period
+                (excluded).
+        """
+        bugids = self.get_bugs(since=since)
+        bugs = self.get_bug_info(bugids, since=since, until=until)
         bugs = self.cleanup(bugs)
         history = self.guess_tool(bugs)
 
@@ -0,0 +1,203 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""An on-disk cache for the responses of the slow-changing endpoints.
+
+Several rules run in the same cron window request the same data (e.g., the
+products and components from `/rest/product`, the release schedule from
+whattrainisitnow.com, ...). The responses of the GET requests to the
+endpoints listed in the `http_cache` section of the configuration are stored
+in a SQLite database under the cache directory, so they are shared between
+the rules and the processes:
+ - a response younger than the TTL of its endpoint is returned as is;
+ - an older one is revalidated with `If-None-Match`/`If-Modified-Since`
+   when the server gave an `ETag` or a `Last-Modified` header.
+
+All the HTTP requests (libmozdata, requests, ...) go through `requests`, so
+the cache is plugged in the transport adapter.
+"""
+
+import atexit
+import functools
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from bugbot import logger, utils
+from bugbot.cache import SQLiteStore
+
+_lock = threading.Lock()
+_endpoints: list[tuple[re.Pattern, float]] = []
+_stats: Counter = Counter()
+
+
+class ResponseStore(SQLiteStore):
+    """The responses, by url"""
+
+    FILENAME = "http.sqlite"
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "url TEXT PRIMARY KEY, "
+        "status INTEGER NOT NULL, "
+        "headers TEXT NOT NULL, "
+        "content BLOB NOT NULL, "
+        "stored_at REAL NOT NULL)"
+    ]
+
+
+def _get_connection() -> sqlite3.Connection:
+    return ResponseStore.get_instance().db
+
+
+def get_ttl(url: str) -> float | None:
+    """Get the number of seconds a response for the url can be used without
+    being revalidated, or None if the url must not be cached"""
+    for pattern, ttl in _endpoints:
+        if pattern.search(url):
+            return ttl
+    return None
+
+
+def get_stats() -> dict[str, int]:
+    """Get the number of hits, revalidations and misses"""
+    with _lock:
+        return dict(_stats)
+
+
+def log_stats() -> None:
+    stats = get_stats()
+    if stats:
+        logger.info(
+            "HTTP cache: %d hits, %d revalidated, %d misses",
+            stats.get("hit", 0),
+            stats.get("revalidated", 0),
+            stats.get("miss", 0),
+        )
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] += 1
+
+
+def _load(url: str) -> tuple[int, dict, bytes, float] | None:
+    with _lock:
+        row = (
+            _get_connection()
+            .execute(
+                "SELECT status, headers, content, stored_at FROM responses WHERE url = ?",
+                (url,),
+            )
+            .fetchone()
+        )
+    if row is None:
+        return None
+
+    status, headers, content, stored_at = row
+    return status, json.loads(headers), content, stored_at
+
+
+def _store(url: str, response: Response) -> None:
+    with _lock:
+        db = _get_connection()
+        db.execute(
+            "INSERT OR REPLACE INTO responses (url, status, headers, content, stored_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                url,
+                response.status_code,
+                json.dumps(dict(response.headers)),
+                response.content,
+                time.time(),
+            ),
+        )
+        db.commit()
+
+
+def _touch(url: str) -> None:
+    with _lock:
+        db = _get_connection()
+        db.execute(
+            "UPDATE responses SET stored_at = ? WHERE url = ?", (time.time(), url)
+        )
+        db.commit()
+
+
+def _build_response(adapter, request, status, headers, content) -> Response:
+    response = Response()
+    response.status_code = status
+    response.reason = "OK"
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = content
+    response._content_consumed = True
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+
+    return response
+
+
+def _cached_send(send):
+    @functools.wraps(send)
+    def wrapper(self, request, *args, **kwargs):
+        ttl = get_ttl(request.url) if request.method == "GET" else None
+        if ttl is None or request.body:
+            return wrapper.uncached(self, request, *args, **kwargs)
+
+        cached = _load(request.url)
+        if cached is not None:
+            status, headers, content, stored_at = cached
+            if time.time() - stored_at < ttl:
+                _count("hit")
+                return _build_response(self, request, status, headers, content)
+
+            headers = CaseInsensitiveDict(headers)
+            if "ETag" in headers:
+                request.headers["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                request.headers["If-Modified-Since"] = headers["Last-Modified"]
+
+        response = wrapper.uncached(self, request, *args, **kwargs)
+        if cached is not None and response.status_code == 304:
+            _count("revalidated")
+            _touch(request.url)
+            return _build_response(self, request, status, dict(headers), content)
+
+        _count("miss")
+        if response.status_code == 200:
+            _store(request.url, response)
+
+        return response
+
+    wrapper._http_cache = True
+    # The requests which are not answered from the cache go through
+    # `uncached`, so the limits on the hosts can be put under the cache
+    wrapper.uncached = send
+    return wrapper
+
+
+def install(endpoints: dict[str, float] | None = None) -> None:
+    """Cache the responses of the endpoints.
+
+    Args:
+        endpoints: the regular expressions matching the urls to cache, with
+            the number of seconds a response can be used without being
+            revalidated. By default, the ones from the configuration.
+    """
+    global _endpoints
+    if endpoints is None:
+        endpoints = utils.get_config("http_cache", "endpoints", {})
+
+    _endpoints = [(re.compile(pattern), ttl) for pattern, ttl in endpoints.items()]
+    if not getattr(HTTPAdapter.send, "_http_cache", False):
+        HTTPAdapter.send = _cached_send(HTTPAdapter.send)
+        atexit.register(log_stats)
@@ -9,9 +9,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from os.path import basename
 
-from jinja2 import Environment, FileSystemLoader
-
-from . import logger, utils
+from . import logger, templates, utils
 
 SMTP = "smtp.mozilla.org"
 PORT = 465
@@ -40,11 +38,8 @@ def clean_cc(cc, to):
 
 def send_from_template(template_file, To, title, Cc=[], dryrun=False, **kwargs):
     login_info = utils.get_login_info()
-    env = Environment(loader=FileSystemLoader("templates"))
-    template = env.get_template(template_file)
-    message = template.render(**kwargs)
-    common = env.get_template("common.html")
-    body = common.render(message=message, has_table=False)
+    message = templates.render(template_file, **kwargs)
+    body = templates.render("common.html", message=message, has_table=False)
     send(
         login_info["ldap_username"],
         To,
@@ -57,10 +52,14 @@ def send_from_template(template_file, To, title, Cc=[], dryrun=False, **kwargs):
     )
 
 
-def send(
-    From, To, Subject, Body, Cc=[], Bcc=[], html=False, files=[], login={}, dryrun=False
-):
-    """Send an email"""
+def make_message(
+    From, To, Subject, Body, Cc=[], Bcc=[], html=False, files=[]
+) -> tuple[str, list[str], str]:
+    """Make an email
+
+    Returns:
+        The sender, the receivers and the message.
+    """
 
     if utils.get_config("common", "test", False):
         # just to send a dryrun email
@@ -101,44 +100,139 @@ def send(
             part["Content-Disposition"] = 'attachment; filename="%s"' % file
             message.attach(part)
 
-    sendMail(From, To + Cc + Bcc, message.as_string(), login=login, dryrun=dryrun)
+    return From, To + Cc + Bcc, message.as_string()
+
+
+def send(
+    From, To, Subject, Body, Cc=[], Bcc=[], html=False, files=[], login={}, dryrun=False
+):
+    """Send an email"""
+    From, receivers, msg = make_message(From, To, Subject, Body, Cc, Bcc, html, files)
+    sendMail(From, receivers, msg, login=login, dryrun=dryrun)
+
+
+def log_dryrun(To, msg):
+    out = "\n****************************\n"
+    out += "* DRYRUN: not sending mail *\n"
+    out += "****************************\n"
+    out += "Receivers: {}\n".format(To)
+    out += "Message:\n"
+    out += msg
+    logger.info(out)
+
+
+class Transport(object):
+    """A connection to the SMTP server, opened and authenticated when the
+    first email is sent and reused for the next ones"""
+
+    def __init__(self, login={}):
+        super(Transport, self).__init__()
+        if login is None:
+            login = {}
+
+        # TODO: default_login has been added to fix issues with old auto_nag
+        # so need to remove that stuff once old auto_nag will have been removed.
+        default_login = utils.get_login_info()
+        self.login = login
+        self.server = login.get("smtp_server", default_login.get("smtp_server", SMTP))
+        self.port = login.get("smtp_port", default_login.get("smtp_port", PORT))
+        self.ssl = login.get("smtp_ssl", default_login.get("smtp_ssl", True))
+        self.mailserver = None
+
+    def connect(self):
+        if self.ssl:
+            mailserver = smtplib.SMTP_SSL(
+                self.server, self.port, context=ssl.create_default_context()
+            )
+        else:
+            mailserver = smtplib.SMTP(self.server, self.port)
+
+        mailserver.set_debuglevel(1)
+        username = self.login.get("ldap_username")
+        password = self.login.get("ldap_password")
+        if username and password:
+            mailserver.login(username, password)
+
+        self.mailserver = mailserver
+
+    def sendmail(self, From, To, msg):
+        """Send an email, with a new connection if the server closed the
+        current one"""
+        if self.mailserver is None:
+            self.connect()
+        try:
+            self.mailserver.sendmail(From, To, msg)
+        except smtplib.SMTPServerDisconnected:
+            self.connect()
+            self.mailserver.sendmail(From, To, msg)
+
+    def close(self):
+        if self.mailserver is not None:
+            try:
+                self.mailserver.quit()
+            except smtplib.SMTPServerDisconnected:
+                pass
+            self.mailserver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 def sendMail(From, To, msg, login={}, dryrun=False):
     """Send an email"""
     if dryrun:
-        out = "\n****************************\n"
-        out += "* DRYRUN: not sending mail *\n"
-        out += "****************************\n"
-        out += "Receivers: {}\n".format(To)
-        out += "Message:\n"
-        out += msg
-        logger.info(out)
+        log_dryrun(To, msg)
         return
 
-    if login is None:
-        login = {}
-
-    # TODO: default_login has been added to fix issues with old auto_nag
-    # so need to remove that stuff once old auto_nag will have been removed.
-    default_login = utils.get_login_info()
-    smtp_server = login.get("smtp_server", default_login.get("smtp_server", SMTP))
-    smtp_port = login.get("smtp_port", default_login.get("smtp_port", PORT))
-    smtp_ssl = login.get("smtp_ssl", default_login.get("smtp_ssl", True))
-
-    if smtp_ssl:
-        mailserver = smtplib.SMTP_SSL(
-            smtp_server, smtp_port, context=ssl.create_default_context()
-        )
-    else:
-        mailserver = smtplib.SMTP(smtp_server, smtp_port)
-
-    mailserver.set_debuglevel(1)
-    if login:
-        username = login.get("ldap_username")
-        password = login.get("ldap_password")
-        if username and password:
-            mailserver.login(username, password)
+    with Transport(login) as transport:
+        transport.sendmail(From, To, msg)
 
-    mailserver.sendmail(From, To, msg)
-    mailserver.quit()
+
+def send_many(messages, login={}, dryrun=False, max_workers=None) -> list[str]:
+    """Send emails, several at a time
+
+    Each worker sends its share of the emails on its own connection.
+
+    Args:
+        messages: the (sender, receivers, message) tuples, as returned by
+            `make_message`.
+        login: the login info.
+        dryrun: if True, the emails are only logged.
+        max_workers: the maximum number of connections opened at the same
+            time; by default the `smtp_workers` from the configuration.
+
+    Returns:
+        The status ("Success" or "Failure") of each email.
+    """
+    messages = list(messages)
+    status = ["Success"] * len(messages)
+    if not messages:
+        return status
+
+    if dryrun:
+        for _, To, msg in messages:
+            log_dryrun(To, msg)
+        return status
+
+    if max_workers is None:
+        max_workers = utils.get_config("common", "smtp_workers", 2)
+    max_workers = max(1, min(max_workers, len(messages)))
+
+    def send_share(worker):
+        with Transport(login) as transport:
+            for i in range(worker, len(messages), max_workers):
+                try:
+                    transport.sendmail(*messages[i])
+                except Exception:
+                    logger.exception("Cannot send an email to %s", messages[i][1])
+                    status[i] = "Failure"
+                    # The connection may be in a bad state
+                    transport.close()
+
+    with utils.ContextThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(send_share, range(max_workers)))
+
+    return status
@@ -0,0 +1,162 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Measure where the rules spend their time.
+
+A rule records the duration, the number of HTTP requests and the number of
+bytes sent and received for each of its phases (the Bugzilla search, the
+comments, the autofix, the rendering of the email, ...) and the number of
+bugs it processed. When the rule is done, the record is logged and kept, so
+the runner can write a summary of the run (see `write_report`).
+
+The HTTP requests are counted in the transport adapter of `requests` for the
+whole process: when several rules run at the same time in threads, the
+counts of a phase include the requests of the other rules.
+"""
+
+import contextlib
+import csv
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Iterator
+
+from requests.adapters import HTTPAdapter
+
+from bugbot import logger
+
+PHASES = ("bz_params", "search", "comments", "get_bugs", "autofix", "render", "send")
+COUNTERS = ("duration", "requests", "bytes_sent", "bytes_received")
+
+_lock = threading.Lock()
+_totals = {"requests": 0, "bytes_sent": 0, "bytes_received": 0}
+_records: list[dict[str, Any]] = []
+
+
+def _get_totals() -> dict[str, int]:
+    with _lock:
+        return dict(_totals)
+
+
+def _get_size(body) -> int:
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+
+def _counted_send(send):
+    @functools.wraps(send)
+    def wrapper(self, request, *args, **kwargs):
+        response = send(self, request, *args, **kwargs)
+        if kwargs.get("stream"):
+            received = int(response.headers.get("Content-Length", 0))
+        else:
+            received = len(response.content)
+
+        with _lock:
+            _totals["requests"] += 1
+            _totals["bytes_sent"] += _get_size(request.body)
+            _totals["bytes_received"] += received
+
+        return response
+
+    wrapper._metrics = True
+    return wrapper
+
+
+def install() -> None:
+    """Count the HTTP requests made by the process"""
+    if not getattr(HTTPAdapter.send, "_metrics", False):
+        HTTPAdapter.send = _counted_send(HTTPAdapter.send)
+
+
+class RuleMetrics(object):
+    """The measures of a rule run"""
+
+    def __init__(self, name: str):
+        super(RuleMetrics, self).__init__()
+        self.name = name
+        self.phases: dict[str, dict[str, float]] = defaultdict(
+            lambda: dict.fromkeys(COUNTERS, 0)
+        )
+        self.bugs = 0
+        self.start = time.perf_counter()
+        self.start_totals = _get_totals()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure a phase of the rule; a phase can be entered several times
+        and the measures are added"""
+        start = time.perf_counter()
+        totals = _get_totals()
+        try:
+            yield
+        finally:
+            measures = self.phases[name]
+            measures["duration"] += time.perf_counter() - start
+            for key, value in _get_totals().items():
+                measures[key] += value - totals[key]
+
+    def add_bugs(self, count: int) -> None:
+        self.bugs += count
+
+    def get_record(self) -> dict[str, Any]:
+        """Get the measures as a JSON-serializable dictionary"""
+        totals = _get_totals()
+        record: dict[str, Any] = {
+            "rule": self.name,
+            "duration": round(time.perf_counter() - self.start, 3),
+            "bugs": self.bugs,
+        }
+        for key in COUNTERS[1:]:
+            record[key] = totals[key] - self.start_totals[key]
+        record["phases"] = {
+            name: {key: round(value, 3) for key, value in measures.items()}
+            for name, measures in self.phases.items()
+        }
+        return record
+
+    def finish(self) -> dict[str, Any]:
+        """Log the measures of the rule and keep them for the run report"""
+        record = self.get_record()
+        logger.info("Metrics for rule %s: %s", self.name, json.dumps(record))
+        with _lock:
+            _records.append(record)
+
+        return record
+
+
+def pop_records() -> list[dict[str, Any]]:
+    """Get and forget the records of the rules finished in this process"""
+    with _lock:
+        records = list(_records)
+        _records.clear()
+
+    return records
+
+
+def write_report(records: list[dict[str, Any]], path: str) -> None:
+    """Write the records of a run in `path.json` and `path.csv`.
+
+    The CSV file has one row per rule with the totals, then one column per
+    phase and measure (e.g., `search_duration`).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".json", "w") as Out:
+        json.dump(records, Out, indent=2)
+
+    totals = ["rule", "duration", "bugs"] + list(COUNTERS[1:])
+    columns = totals + [f"{phase}_{key}" for phase in PHASES for key in COUNTERS]
+    with open(path + ".csv", "w", newline="") as Out:
+        writer = csv.DictWriter(Out, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            row = {key: record[key] for key in totals}
+            for phase, measures in record["phases"].items():
+                for key, value in measures.items():
+                    row[f"{phase}_{key}"] = value
+            writer.writerow(row)
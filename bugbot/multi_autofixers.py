@@ -96,14 +96,14 @@ class MultiAutoFixers:
 
         return parser
 
-    def run(self):
+    def run(self, argv=None):
         """Run the rule"""
-        args = self.get_args_parser().parse_args()
+        args = self.get_args_parser().parse_args(argv)
         self.is_dryrun = args.dryrun
 
         for rule in self.rules:
             rule.apply_autofix = False
-            rule.run()
+            rule.run(argv)
 
         new_changes = self._merge_changes_from_rules()
         no_bugmail = all(rule.no_bugmail for rule in self.rules)
@@ -3,12 +3,10 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
-import time
 
-from jinja2 import Environment, FileSystemLoader
 from libmozdata import utils as lmdutils
 
-from bugbot import mail, utils
+from bugbot import mail, templates, utils
 from bugbot.bzcleaner import BzCleaner
 from bugbot.nag_me import Nag
 
@@ -49,18 +47,17 @@ class MultiNaggers(object):
 
         return parser
 
-    def run(self):
-        args = self.get_args_parser().parse_args()
+    def run(self, argv=None):
+        args = self.get_args_parser().parse_args(argv)
         self.is_dryrun = args.dryrun
         self.date = lmdutils.get_date_ymd(args.date)
         for nagger in self.naggers:
             nagger.send_nag_mail = False
-            nagger.run()
+            nagger.run(argv)
         self.gather()
 
     def gather(self):
-        env = Environment(loader=FileSystemLoader("templates"))
-        common = env.get_template("common.html")
+        common = templates.get_template("common.html")
         login_info = utils.get_login_info()
         From = Nag.get_from()
         Default_Cc = set(utils.get_config("bugbot", "cc", []))
@@ -81,18 +78,20 @@ class MultiNaggers(object):
                     all_mails[manager]["management_chain"] |= m["management_chain"]
                     all_mails[manager]["body"] += "\n" + m["body"]
 
+        messages = []
         for manager, m in all_mails.items():
             Cc = Default_Cc | m["management_chain"]
             Cc.add(manager)
             body = common.render(message=m["body"], has_table=True)
-            mail.send(
-                From,
-                list(sorted(m["to"])),
-                self.title(),
-                body,
-                Cc=list(sorted(Cc)),
-                html=True,
-                login=login_info,
-                dryrun=self.is_dryrun,
+            messages.append(
+                mail.make_message(
+                    From,
+                    list(sorted(m["to"])),
+                    self.title(),
+                    body,
+                    Cc=list(sorted(Cc)),
+                    html=True,
+                )
             )
-            time.sleep(1)
+
+        mail.send_many(messages, login=login_info, dryrun=self.is_dryrun)
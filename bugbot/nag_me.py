@@ -4,11 +4,10 @@
 
 import copy
 
-from jinja2 import Environment, FileSystemLoader
-
-from bugbot import db, logger, mail, utils
+from bugbot import db, mail, templates, utils
 from bugbot.escalation import Escalation
 from bugbot.people import People
+from bugbot.url_shortener import UrlShortener
 
 
 class Nag(object):
@@ -159,36 +158,31 @@ class Nag(object):
         if not self.send_nag_mail:
             return
 
-        env = Environment(loader=FileSystemLoader("templates"))
-        common = env.get_template("common.html")
+        common = templates.get_template("common.html")
         login_info = utils.get_login_info()
         From = Nag.get_from()
         Default_Cc = self.get_cc()
         mails = self.prepare_mails()
 
+        messages = []
+        all_receivers = []
         for m in mails:
             Cc = Default_Cc | m["management_chain"]
             if m["manager"]:
                 Cc.add(m["manager"])
             body = common.render(message=m["body"], query_url=None)
-            receivers = set(m["to"]) | set(Cc)
-            status = "Success"
-            try:
-                mail.send(
-                    From,
-                    sorted(m["to"]),
-                    title,
-                    body,
-                    Cc=sorted(Cc),
-                    html=True,
-                    login=login_info,
-                    dryrun=dryrun,
+            all_receivers.append(set(m["to"]) | set(Cc))
+            messages.append(
+                mail.make_message(
+                    From, sorted(m["to"]), title, body, Cc=sorted(Cc), html=True
                 )
-            except Exception:
-                logger.exception("Rule {}".format(self.name()))
-                status = "Failure"
+            )
 
-            db.Email.add(self.name(), receivers, "individual", status)
+        statuses = mail.send_many(messages, login=login_info, dryrun=dryrun)
+        db.Email.add_many(
+            (self.name(), receivers, "individual", status)
+            for receivers, status in zip(all_receivers, statuses)
+        )
 
     def prepare_mails(self):
         if not self.data:
@@ -203,8 +197,8 @@ class Nag(object):
         fail_on_missing_mgmt_chain = self.escalation.is_hierarchical_escalation_only()
 
         extra = self.get_extra_for_nag_template()
-        env = Environment(loader=FileSystemLoader("templates"))
-        template = env.get_template(template)
+        template = templates.get_template(template)
+        shortener = UrlShortener.get_instance()
         mails = []
         for manager, info in self.data.items():
             # The same bug can be several times in the list
@@ -241,7 +235,7 @@ class Nag(object):
                 enumerate=enumerate,
                 data=self.organize_nag(data),
                 nag=True,
-                query_url_nag=utils.shorten_long_bz_url(query_url),
+                query_url_nag=shortener.placeholder(query_url),
                 table_attrs=self.get_config("table_attrs"),
                 nag_preamble=self.nag_preamble(),
             )
@@ -254,6 +248,10 @@ class Nag(object):
             }
             mails.append(m)
 
+        # All the urls are shortened at the same time
+        for m in mails:
+            m["body"] = shortener.fill(m["body"])
+
         return mails
 
     def reorganize_to_bag(self, data):
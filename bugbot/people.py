@@ -2,13 +2,19 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
+import heapq
 import json
+import os
 import re
+from collections import defaultdict
 from math import sqrt
-from typing import Set, TypedDict
+from typing import Iterable, Optional, Set, TypedDict
 
 import numpy as np
 
+from bugbot.cache import get_cache_dir
+
 WORDS = re.compile(r"(\w+)")
 MAIL = re.compile(r"^([^@]+@[^ ]+)")
 IMs = [
@@ -28,6 +34,9 @@ IMs = [
 IM_NICK = re.compile(r"([\w\.@]+)")
 
 DEFAULT_PATH = "./configs/people.json"
+# The version of the format of the saved indexes: an index saved with another
+# version is rebuilt
+INDEX_VERSION = 1
 
 
 _ManagerInfo = TypedDict("_ManagerInfo", {"cn": str, "dn": str})
@@ -50,6 +59,250 @@ Person = TypedDict(
 )
 
 
+class ManagementIndex:
+    """The management hierarchy as arrays, to answer the questions about the
+    managers of someone without walking the hierarchy one person at a time.
+
+    The nodes are the mails of the managers. For each node, we have its
+    manager (`-1` for the top of the hierarchy), its depth, its nearest
+    director and VP (itself included, `-1` if none) and its interval in a
+    depth-first traversal: a node is under another one if and only if its
+    interval is included in the one of the other node.
+    """
+
+    ARRAYS = ("parent", "depth", "director", "vp", "tin", "tout", "cyclic")
+
+    def __init__(self, mails: list[str], **arrays: list[int]):
+        self.mails = mails
+        self.ids = {mail: i for i, mail in enumerate(mails)}
+        for name in ManagementIndex.ARRAYS:
+            setattr(self, name, np.array(arrays[name], dtype=np.int32))
+
+    @staticmethod
+    def build(people: "People") -> "ManagementIndex":
+        """Build the index of the hierarchy of the people, except the VPs
+        (see `set_vps`)."""
+        mails = sorted(people.get_managers())
+        ids = {mail: i for i, mail in enumerate(mails)}
+        n = len(mails)
+        parent = [-1] * n
+        for mail, i in ids.items():
+            manager = people.get_manager_mail(mail)
+            if manager is not None:
+                parent[i] = ids[manager]
+
+        # A circular chain is cut, and the people under it are flagged
+        cyclic = [0] * n
+        state = [0] * n  # 0: unseen, 1: in the current chain, 2: done
+        for i in range(n):
+            chain = []
+            j = i
+            while j != -1 and state[j] == 0:
+                state[j] = 1
+                chain.append(j)
+                j = parent[j]
+            if j != -1 and state[j] == 1:
+                parent[j] = -1
+                cyclic[j] = 1
+            for j in chain:
+                state[j] = 2
+
+        children: list[list[int]] = [[] for _ in range(n)]
+        for i, p in enumerate(parent):
+            if p != -1:
+                children[p].append(i)
+
+        directors = people.get_directors()
+        depth = [0] * n
+        director = [-1] * n
+        tin = [0] * n
+        tout = [0] * n
+        clock = 0
+        for root in (i for i in range(n) if parent[i] == -1):
+            stack = [(root, False)]
+            while stack:
+                i, done = stack.pop()
+                if done:
+                    tout[i] = clock
+                    clock += 1
+                    continue
+
+                p = parent[i]
+                if p != -1:
+                    depth[i] = depth[p] + 1
+                    director[i] = director[p]
+                    cyclic[i] |= cyclic[p]
+                if mails[i] in directors:
+                    director[i] = i
+                tin[i] = clock
+                clock += 1
+                stack.append((i, True))
+                stack.extend((child, False) for child in children[i])
+
+        index = ManagementIndex(
+            mails,
+            parent=parent,
+            depth=depth,
+            director=director,
+            vp=[-1] * n,
+            tin=tin,
+            tout=tout,
+            cyclic=cyclic,
+        )
+        return index
+
+    def set_vps(self, vps: Set[str]) -> None:
+        """Set the nearest VP of each node"""
+        # The managers come before the people under them in this order
+        for i in np.argsort(self.tin):
+            p = self.parent[i]
+            self.vp[i] = i if self.mails[i] in vps else (self.vp[p] if p != -1 else -1)
+
+    def get_id(self, mail: Optional[str]) -> int:
+        return self.ids.get(mail, -1) if mail else -1
+
+    def get_mail(self, i: int) -> Optional[str]:
+        return self.mails[i] if i != -1 else None
+
+    def is_under(self, i: int, j: int) -> bool:
+        """Check if the node i is j or is under j"""
+        return self.tin[j] <= self.tin[i] and self.tout[i] <= self.tout[j]
+
+    def to_dict(self) -> dict:
+        data: dict = {"mails": self.mails}
+        for name in ManagementIndex.ARRAYS:
+            data[name] = getattr(self, name).tolist()
+        return data
+
+    @staticmethod
+    def from_dict(data: dict) -> "ManagementIndex":
+        return ManagementIndex(
+            data["mails"], **{name: data[name] for name in ManagementIndex.ARRAYS}
+        )
+
+
+class NameIndex:
+    """An inverted index of the names of the people.
+
+    For the cosine similarity between the bigrams of a name and the ones of
+    the names of the people, we only look at the people sharing at least a
+    bigram with the name, instead of multiplying a dense matrix with a row
+    per person and a column per bigram. The words of the names are indexed
+    the same way, to find the names containing all the words of a name.
+    """
+
+    COSINE_THRESHOLDS = (0.99, 0.9, 0.8, 0.7)
+
+    def __init__(
+        self,
+        rows: list[int],
+        postings: dict[str, list[tuple[int, float]]],
+        keys: list[int],
+        words: dict[str, list[int]],
+    ):
+        """Constructor
+
+        Args:
+            rows: the index in the people data of the person for each row.
+            postings: the rows with their normalized weight for each bigram.
+            keys: the index in the people data of the person for each set of
+                name parts.
+            words: the keys for each word.
+        """
+        self.rows = rows
+        self.postings = postings
+        self.keys = keys
+        self.words = {word: set(ids) for word, ids in words.items()}
+
+    @staticmethod
+    def build(people: "People") -> "NameIndex":
+        # One row per name: the last person with a given name wins
+        rows_by_name = {}
+        for i, person in enumerate(people.data):
+            rows_by_name[person["cn"]] = i
+
+        rows = []
+        postings = defaultdict(list)
+        for row, (name, i) in enumerate(rows_by_name.items()):
+            rows.append(i)
+            stats = people._get_bigrams_stats(name)
+            L = sqrt(sum(v * v for v in stats.values()))
+            for bigram, n in stats.items():
+                postings[bigram].append((row, float(n) / L))
+
+        keys_by_parts = {}
+        for i, person in enumerate(people.data):
+            parts = tuple(sorted(people._get_name_parts(person["cn"])))
+            keys_by_parts[parts] = i
+
+        keys = []
+        words = defaultdict(list)
+        for key, (parts, i) in enumerate(keys_by_parts.items()):
+            keys.append(i)
+            for word in parts:
+                words[word].append(key)
+
+        return NameIndex(rows, postings, keys, words)
+
+    def get_scores(self, stats: dict[str, int]) -> dict[int, float]:
+        """Get the cosine similarity between the bigrams stats of a name and
+        the rows sharing at least one bigram with it"""
+        stats = {k: v for k, v in stats.items() if k in self.postings}
+        L = sqrt(sum(v * v for v in stats.values()))
+        scores: dict[int, float] = defaultdict(float)
+        for bigram, n in stats.items():
+            weight = float(n) / L
+            for row, w in self.postings[bigram]:
+                scores[row] += weight * w
+        return scores
+
+    def get_top_matches(self, stats: dict[str, int], k: int) -> list[tuple[int, float]]:
+        """Get the k best matches as (index in the people data, score)"""
+        scores = self.get_scores(stats)
+        best = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+        return [(self.rows[row], score) for row, score in best]
+
+    def search(self, stats: dict[str, int], name_parts: set[str]) -> Optional[int]:
+        """Get the index in the people data of the only person matching a
+        name, or None"""
+        scores = self.get_scores(stats)
+        for cos in NameIndex.COSINE_THRESHOLDS:
+            matches = [row for row, score in scores.items() if score > cos]
+            if len(matches) == 1:
+                return self.rows[matches[0]]
+
+        # The names containing all the parts of the name
+        if name_parts:
+            candidates = set.intersection(
+                *(self.words.get(part, set()) for part in name_parts)
+            )
+        else:
+            candidates = set(range(len(self.keys)))
+        if len(candidates) == 1:
+            return self.keys[candidates.pop()]
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "postings": self.postings,
+            "keys": self.keys,
+            "words": {word: sorted(ids) for word, ids in self.words.items()},
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "NameIndex":
+        return NameIndex(
+            data["rows"],
+            {
+                bigram: [(row, w) for row, w in postings]
+                for bigram, postings in data["postings"].items()
+            },
+            data["keys"],
+            data["words"],
+        )
+
+
 class People:
     _instance = None
 
@@ -59,9 +312,14 @@ class People:
         Args:
             people_file: path to the people file or loaded people data.
         """
+        self.path: Optional[str] = None
+        self.hash: Optional[str] = None
         if isinstance(people_file, str):
-            with open(people_file, "r", encoding="utf-8") as file:
-                self.data = json.load(file)
+            with open(people_file, "rb") as file:
+                content = file.read()
+            self.data = json.loads(content)
+            self.path = people_file
+            self.hash = hashlib.sha256(content).hexdigest()
         else:
             self.data = people_file
 
@@ -74,9 +332,10 @@ class People:
         self.nicks: dict[str, Person] = {}
         self.directors: set[str] = set()
         self.vps: set[str] = set()
-        self.names: dict[tuple, Person] = {}
         self._amend()
-        self.matrix = None
+        self.name_index: Optional[NameIndex] = None
+        self.bzmails_by_name: dict[str, Optional[str]] = {}
+        self.management_index: Optional[ManagementIndex] = None
 
     @staticmethod
     def get_instance():
@@ -96,15 +355,6 @@ class People:
             people[mail] = person
         return people
 
-    def _get_names(self):
-        if not self.names:
-            for person in self.data:
-                cn = person["cn"]
-                parts = self._get_name_parts(cn)
-                parts = tuple(sorted(parts))
-                self.names[parts] = person
-        return self.names
-
     def _get_bigrams(self, text):
         text = "".join(s.lower() for s in WORDS.findall(text))
         return [text[i : (i + 2)] for i in range(len(text) - 1)]
@@ -116,55 +366,38 @@ class People:
 
         return stats
 
-    def _get_matrix_names(self):
-        if self.matrix is None:
-            res = {}
-            bigrams = set()
-            cns = {}
-            for person in self.data:
-                cn = person["cn"]
-                cns[cn] = person
-                res[cn] = stats = self._get_bigrams_stats(cn)
-                L = sqrt(sum(v * v for v in stats.values()))
-                for k, v in stats.items():
-                    stats[k] = float(v) / L
-                    bigrams.add(k)
-
-            bigrams = sorted(bigrams)
-            self.bigrams = {x: i for i, x in enumerate(bigrams)}
-            self.matrix = np.zeros((len(res), len(self.bigrams)))
-            self.matrix_map = [None] * len(res.items())
-            for i, (name, stats) in enumerate(res.items()):
-                for b, n in stats.items():
-                    self.matrix[i][self.bigrams[b]] = n
-                self.matrix_map[i] = cns[name]
+    def _get_name_index(self) -> NameIndex:
+        if self.name_index is None:
+            data = self._load_index("names")
+            if data is not None:
+                self.name_index = NameIndex.from_dict(data)
+            else:
+                self.name_index = NameIndex.build(self)
+                self._save_index("names", self.name_index.to_dict())
+        return self.name_index
 
     def search_by_name(self, name):
         # Try to find name in using cosine similarity
-        self._get_matrix_names()
-        stats = self._get_bigrams_stats(name)
-        for k in set(stats.keys()) - set(self.bigrams.keys()):
-            del stats[k]
-        L = sqrt(sum(v * v for v in stats.values()))
-        x = np.zeros((len(self.bigrams), 1))
-        for k, v in stats.items():
-            x[self.bigrams[k]][0] = float(v) / L
-        res = np.matmul(self.matrix, x)
-        for cos in [0.99, 0.9, 0.8, 0.7]:
-            index = np.argwhere(res > cos)
-            if index.shape[0] == 1:
-                return self.matrix_map[index[0][0]]
-
-        found = None
-        name_parts = self._get_name_parts(name)
-        for parts, info in self._get_names().items():
-            if name_parts <= set(parts):
-                if found is None:
-                    found = info
-                else:
-                    found = None
-                    break
-        return found
+        i = self._get_name_index().search(
+            self._get_bigrams_stats(name), self._get_name_parts(name)
+        )
+        return self.data[i] if i is not None else None
+
+    def search_by_names(self, names: Iterable[str]) -> dict[str, Optional[Person]]:
+        """Search several names at once"""
+        return {name: self.search_by_name(name) for name in set(names)}
+
+    def get_top_matches_by_name(
+        self, name: str, k: int = 5
+    ) -> list[tuple[Person, float]]:
+        """Get the k people with the most similar names, with the cosine
+        similarity of the names"""
+        return [
+            (self.data[i], score)
+            for i, score in self._get_name_index().get_top_matches(
+                self._get_bigrams_stats(name), k
+            )
+        ]
 
     def _get_people_by_bzmail(self):
         if not self.people_by_bzmail:
@@ -243,14 +476,66 @@ class People:
         return self.vps
 
     def get_distance(self, mail):
-        rank = -1
-        while mail:
-            rank += 1
-            prev = mail
-            mail = self.get_manager_mail(mail)
-            if mail == prev:
-                break
-        return rank
+        """Get the number of managers above the person with this mail"""
+        manager = self.get_manager_mail(mail)
+        if manager is None:
+            return 0
+        index = self._get_management_index()
+        return int(index.depth[index.get_id(manager)]) + 1
+
+    def _get_index_path(self, name: str) -> Optional[str]:
+        if self.path is None:
+            return None
+        people_name = os.path.splitext(os.path.basename(self.path))[0]
+        return os.path.join(get_cache_dir(), "{}.{}.json".format(people_name, name))
+
+    def _get_index_key(self) -> str:
+        return "{}:{}".format(INDEX_VERSION, self.hash)
+
+    def _load_index(self, name: str) -> Optional[dict]:
+        """Load an index saved in the cache directory, if it has been built
+        from the same data with the same format"""
+        path = self._get_index_path(name)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as In:
+                index = json.load(In)
+        except (OSError, ValueError):
+            return None
+        if index.get("key") != self._get_index_key():
+            return None
+        return index["data"]
+
+    def _save_index(self, name: str, data: dict) -> None:
+        path = self._get_index_path(name)
+        if path is None:
+            return
+        try:
+            with open(path, "w") as Out:
+                json.dump({"key": self._get_index_key(), "data": data}, Out)
+        except OSError:
+            # The index is just rebuilt next time
+            pass
+
+    def _get_management_index(self) -> ManagementIndex:
+        if self.management_index is None:
+            data = self._load_index("management")
+            if data is not None:
+                self.management_index = ManagementIndex.from_dict(data["index"])
+                self.vps = set(data["vps"])
+            else:
+                self.management_index = ManagementIndex.build(self)
+                # The VPs are found with the distances from the index
+                self.management_index.set_vps(self.get_vps())
+                self._save_index(
+                    "management",
+                    {
+                        "index": self.management_index.to_dict(),
+                        "vps": sorted(self.vps),
+                    },
+                )
+        return self.management_index
 
     def get_rm_or_directors(self):
         """Get a set of release managers and directors who've a bugzilla email"""
@@ -321,12 +606,19 @@ class People:
 
     def get_nth_manager_mail(self, mail, rank):
         """Get the nth manager of the person with this mail"""
-        for _ in range(rank):
-            prev = mail
-            mail = self.get_manager_mail(mail)
-            if not mail or mail == prev:
-                return prev
-        return mail
+        if rank <= 0:
+            return mail
+        manager = self.get_manager_mail(mail)
+        if not manager:
+            return mail
+
+        index = self._get_management_index()
+        i = index.get_id(manager)
+        for _ in range(rank - 1):
+            if i == -1 or index.parent[i] == -1:
+                break
+            i = index.parent[i]
+        return index.get_mail(i) or manager
 
     def get_management_chain_mails(
         self, person: str, superior: str, raise_on_missing: bool = True
@@ -354,48 +646,33 @@ class People:
         if person == superior:
             return result
 
-        manager = self.get_manager_mail(person)
-        while manager != superior:
-            result.add(manager)
-            manager = self.get_manager_mail(manager)
-
-            if not manager:
-                if not raise_on_missing:
-                    return set()
-                raise Exception(f"Cannot identify {superior} as a superior of {person}")
-
-            if manager in result:
+        index = self._get_management_index()
+        i = index.get_id(self.get_manager_mail(person))
+        j = index.get_id(superior)
+        if i == -1 or j == -1 or not index.is_under(i, j):
+            if i != -1 and index.cyclic[i]:
                 raise Exception("Circular management chain")
+            if not raise_on_missing:
+                return set()
+            raise Exception(f"Cannot identify {superior} as a superior of {person}")
+
+        while i != j:
+            result.add(index.mails[i])
+            i = index.parent[i]
 
         return result
 
     def get_director_mail(self, mail):
         """Get the director of the person with this mail"""
-        directors = self.get_directors()
-        while True:
-            prev = mail
-            mail = self.get_manager_mail(mail)
-            if not mail:
-                break
-            if mail in directors:
-                return mail
-            if mail == prev:
-                break
-        return None
+        index = self._get_management_index()
+        i = index.get_id(self.get_manager_mail(mail))
+        return index.get_mail(index.director[i]) if i != -1 else None
 
     def get_vp_mail(self, mail):
         """Get the VP of the person with this mail"""
-        vps = self.get_vps()
-        while True:
-            prev = mail
-            mail = self.get_manager_mail(mail)
-            if not mail:
-                break
-            if mail in vps:
-                return mail
-            if mail == prev:
-                break
-        return None
+        index = self._get_management_index()
+        i = index.get_id(self.get_manager_mail(mail))
+        return index.get_mail(index.vp[i]) if i != -1 else None
 
     def get_mail_prefix(self, mail):
         return mail.split("@", 1)[0].lower()
@@ -462,16 +739,15 @@ class People:
 
     def is_under(self, mail, manager):
         """Check if someone is under manager in the hierarchy"""
-        m = mail
-        while True:
-            m = self.get_manager_mail(m)
-            if m is None:
-                return False
-            if m == manager:
-                return True
+        index = self._get_management_index()
+        i = index.get_id(self.get_manager_mail(mail))
+        j = index.get_id(manager)
+        return i != -1 and j != -1 and index.is_under(i, j)
 
     def get_bzmail_from_name(self, name):
         """Search bz mail for a given name"""
+        if name in self.bzmails_by_name:
+            return self.bzmails_by_name[name]
 
         if "@" in name:
             info = self.get_info(name)
@@ -480,11 +756,17 @@ class People:
             if not info:
                 info = self.search_by_name(name)
 
+        mail = None
         if info:
             mail = info["bugzillaEmail"]
-            return mail if mail else info["mail"]
+            mail = mail if mail else info["mail"]
 
-        return None
+        self.bzmails_by_name[name] = mail
+        return mail
+
+    def get_bzmails_from_names(self, names: Iterable[str]) -> dict[str, Optional[str]]:
+        """Search the bz mails for several names at once"""
+        return {name: self.get_bzmail_from_name(name) for name in set(names)}
 
     def get_mozmail_from_name(self, name):
         """Search moz mail for a given name"""
@@ -0,0 +1,144 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from libmozdata.connection import Connection
+
+from bugbot import utils
+from bugbot.cache import SQLiteStore
+
+
+class PhabricatorUsers(SQLiteStore):
+    """Keep what is known about the Phabricator users between the runs.
+
+    Two things are saved, by PHID, in a SQLite database under the cache
+    directory: the ID of the linked Bugzilla account and the time of the last
+    story in the feed of the user. They are valid for `ttl` seconds; the
+    missing ones are fetched several at a time with the functions given by the
+    caller, so the retries and the API instance stay on its side.
+    """
+
+    FILENAME = "phabricator_users.sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS accounts ("
+        "phid TEXT PRIMARY KEY, "
+        "bz_id INTEGER, "
+        "fetched REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS feeds ("
+        "phid TEXT PRIMARY KEY, "
+        "epoch REAL, "
+        "fetched REAL NOT NULL)",
+    ]
+    EXPIRES = {"accounts": "fetched", "feeds": "fetched"}
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, max_workers: int = 8):
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            ttl: the number of seconds during which the data is valid.
+            max_workers: the maximum number of concurrent requests.
+        """
+        super().__init__(path, ttl)
+        self.max_workers = max_workers
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "PhabricatorUsers":
+        return cls(
+            path,
+            utils.get_config("common", "phabricator_users_ttl", 24 * 3600),
+            utils.get_config("common", "phabricator_workers", 8),
+        )
+
+    def _load(self, table: str, column: str, phids: List[str]) -> dict:
+        res = {}
+        oldest = time.time() - self.max_age
+        for chunk in Connection.chunks(phids, 500):
+            rows = self.db.execute(
+                "SELECT phid, {} FROM {} WHERE fetched >= ? AND phid IN ({})".format(
+                    column, table, ", ".join("?" * len(chunk))
+                ),
+                [oldest] + chunk,
+            )
+            res.update(rows)
+        return res
+
+    def _save(self, table: str, column: str, values: dict) -> None:
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO {} (phid, {}, fetched) VALUES (?, ?, ?)".format(
+                table, column
+            ),
+            [(phid, value, now) for phid, value in values.items()],
+        )
+        self.db.commit()
+
+    def get_bz_ids(
+        self,
+        phids: Iterable[str],
+        fetch: Callable[[List[str]], List[dict]],
+        chunk_size: int = 100,
+    ) -> Dict[str, Optional[int]]:
+        """Get the IDs of the Bugzilla accounts linked to the users
+
+        Args:
+            phids: the PHIDs of the users.
+            fetch: the function to get the accounts (with the fields `id` and
+                `phid`) of a chunk of users.
+            chunk_size: the maximum number of users in a request.
+
+        Returns:
+            The Bugzilla IDs by PHID, None for the users without an account.
+        """
+        phids = list(dict.fromkeys(phids))
+        with self._lock:
+            res = self._load("accounts", "bz_id", phids)
+            missing = [phid for phid in phids if phid not in res]
+            if not missing:
+                return res
+
+            fetched: Dict[str, Optional[int]] = dict.fromkeys(missing)
+            with utils.ContextThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for accounts in pool.map(fetch, Connection.chunks(missing, chunk_size)):
+                    fetched.update(
+                        (account["phid"], int(account["id"])) for account in accounts
+                    )
+
+            self._save("accounts", "bz_id", fetched)
+            res.update(fetched)
+
+        return res
+
+    def get_last_activities(
+        self, phids: Iterable[str], fetch: Callable[[str], Optional[float]]
+    ) -> Dict[str, Optional[float]]:
+        """Get the time of the last activity of the users on Phabricator
+
+        Args:
+            phids: the PHIDs of the users.
+            fetch: the function to get the epoch of the last story in the feed
+                of a user.
+
+        Returns:
+            The epochs by PHID, None for the users without any story.
+        """
+        phids = list(dict.fromkeys(phids))
+        with self._lock:
+            res = self._load("feeds", "epoch", phids)
+            missing = [phid for phid in phids if phid not in res]
+            if not missing:
+                return res
+
+            with utils.ContextThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                fetched = dict(zip(missing, pool.map(fetch, missing)))
+
+            self._save("feeds", "epoch", fetched)
+            res.update(fetched)
+
+        return res
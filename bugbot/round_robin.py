@@ -7,9 +7,9 @@ from typing import Dict, Set
 import gspread
 from dateutil.relativedelta import relativedelta
 from libmozdata import utils as lmdutils
-from libmozdata.bugzilla import BugzillaUser
 
 from bugbot import logger, utils
+from bugbot.bugzilla_users import BugzillaUsers
 from bugbot.components import Components
 from bugbot.people import People
 from bugbot.round_robin_calendar import (
@@ -23,8 +23,13 @@ from bugbot.round_robin_calendar import (
 class RoundRobin(object):
     _instances: dict = {}
 
-    def __init__(self, rotation_definitions=None, people=None, teams=None):
+    def __init__(
+        self, rotation_definitions=None, people=None, teams=None, bugzilla_users=None
+    ):
         self.people = People.get_instance() if people is None else people
+        self.bugzilla_users = (
+            BugzillaUsers.get_instance() if bugzilla_users is None else bugzilla_users
+        )
         self.components_by_triager: Dict[str, list] = {}
         self.rotation_definitions = (
             RotationDefinitions()
@@ -32,7 +37,7 @@ class RoundRobin(object):
             else rotation_definitions
         )
         self.feed(None if teams is None else set(teams))
-        self.nicks = {}
+        self.prefetched_calendars = set()
         self.erroneous_bzmail = {}
         utils.init_random()
 
@@ -59,19 +64,30 @@ class RoundRobin(object):
         self.data = {}
         cache = {}
 
-        team_calendars = self.rotation_definitions.fetch_by_teams()
+        team_calendars = {
+            team_name: components
+            for team_name, components in self.rotation_definitions.fetch_by_teams().items()
+            if teams is None or team_name in teams
+        }
+        contents = self.fetch_calendars(
+            calendar_info["url"]
+            for components in team_calendars.values()
+            for calendar_info in components.values()
+        )
         for team_name, components in team_calendars.items():
-            if teams is not None and team_name not in teams:
-                continue
             try:
                 for component_name, calendar_info in components.items():
                     url = calendar_info["url"]
                     if url not in cache:
+                        data = contents[url]
+                        if isinstance(data, Exception):
+                            raise data
                         calendar = cache[url] = Calendar.get(
                             url,
                             calendar_info["fallback"],
                             team_name,
                             people=self.people,
+                            data=data,
                         )
                     else:
                         calendar = cache[url]
@@ -90,6 +106,26 @@ class RoundRobin(object):
                     if component_name in self.data:
                         del self.data[component_name]
 
+    @staticmethod
+    def fetch_calendars(urls) -> dict:
+        """Fetch the content of the calendars at the same time.
+
+        Returns:
+            The content of each calendar by url, or the exception raised when
+            fetching it.
+        """
+
+        def fetch(url):
+            try:
+                return Calendar.fetch(url)
+            except Exception as err:
+                return err
+
+        urls = list(dict.fromkeys(urls))
+        max_workers = utils.get_config("round-robin", "max_workers", 8)
+        with utils.ContextThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(urls, pool.map(fetch, urls)))
+
     def get_components(self):
         return list(self.data.keys())
 
@@ -126,21 +162,29 @@ class RoundRobin(object):
         else:
             self.erroneous_bzmail[fb].add(bzmail)
 
-    def get_nick(self, bzmail, prod_comp, cal):
-        if bzmail not in self.nicks:
+    def prefetch_nicks(self, date, prod_comps):
+        """Declare the triagers of the calendars of some components for the
+        date, so their nicks are fetched together with the first one
+        requested"""
+        bzmails = set()
+        for pc in prod_comps:
+            cal = self.data.get(pc)
+            if cal is None or (date, cal) in self.prefetched_calendars:
+                continue
+            self.prefetched_calendars.add((date, cal))
 
-            def handler(user):
-                self.nicks[bzmail] = user["nick"]
+            bzmails.add(cal.get_fallback_bzmail())
+            bzmails.update(p for _, p in cal.get_persons(date) if p is not None)
 
-            BugzillaUser(
-                user_names=[bzmail], user_handler=handler, include_fields=["nick"]
-            ).wait()
+        self.bugzilla_users.prefetch(bzmails)
 
-        if bzmail not in self.nicks:
+    def get_nick(self, bzmail, prod_comp, cal):
+        nick = self.bugzilla_users.get_nick(bzmail)
+        # A user missing because of a failed request is not erroneous
+        if nick is None and self.bugzilla_users.is_unknown(bzmail):
             self.add_erroneous_bzmail(bzmail, prod_comp, cal)
-            return None
 
-        return self.nicks[bzmail]
+        return nick
 
     def get(self, bug, date, only_one=True, has_nick=True):
         pc = bug["product"] + "::" + bug["component"]
@@ -159,6 +203,9 @@ class RoundRobin(object):
                 return mail, nick if only_one else [(mail, nick)]
             return mail if only_one else [mail]
 
+        if has_nick:
+            self.prefetch_nicks(date, [pc])
+
         cal = self.data[pc]
         persons = cal.get_persons(date)
         fb = cal.get_fallback_bzmail()
@@ -2,10 +2,11 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import datetime
 import json
 import os
 import re
-from bisect import bisect_left
+from bisect import bisect_left, bisect_right
 from json.decoder import JSONDecodeError
 
 import recurring_ical_events
@@ -14,6 +15,7 @@ from dateutil.parser import ParserError
 from dateutil.relativedelta import relativedelta
 from icalendar import Calendar as iCalendar
 from libmozdata import utils as lmdutils
+from recurring_ical_events.util import time_span_contains_event
 
 from bugbot import utils
 from bugbot.people import People
@@ -61,15 +63,21 @@ class Calendar:
         return []
 
     def set_team(self, team, triagers):
+        team = list(team)
+        bzmails = self.people.get_bzmails_from_names(
+            p for p in team if p not in triagers or "bzmail" not in triagers[p]
+        )
         for p in team:
             if p in triagers and "bzmail" in triagers[p]:
                 bzmail = triagers[p]["bzmail"]
             else:
-                bzmail = self.people.get_bzmail_from_name(p)
+                bzmail = bzmails[p]
             self.team.append((p, bzmail))
 
     @staticmethod
-    def get(url, fallback, team_name, people=None):
+    def fetch(url):
+        """Get the content of a calendar from its url, its path or the
+        content itself"""
         data = None
         if url.startswith("private://"):
             name = url.split("//", 1)[1]
@@ -87,6 +95,23 @@ class Calendar:
         if data is None:
             raise InvalidCalendar("Cannot read calendar: {}".format(url))
 
+        return data
+
+    @staticmethod
+    def get(url, fallback, team_name, people=None, data=None):
+        """Get a calendar
+
+        Args:
+            url: the url or the path of the calendar, or its content.
+            fallback: the name of the fallback triager.
+            team_name: the name of the team.
+            people: the people of the organization.
+            data: the content of the calendar when it has already been
+                fetched.
+        """
+        if data is None:
+            data = Calendar.fetch(url)
+
         try:
             cal = json.loads(data)
             return JSONCalendar(cal, fallback, team_name, people=people)
@@ -167,6 +192,9 @@ class ICSCalendar(Calendar):
     def __init__(self, cal, fallback, team_name, people=None):
         super().__init__(fallback, team_name, people=people)
         self.cal = iCalendar.from_ical(cal)
+        # The duty intervals by year: the recurring events can be infinite, so
+        # they are expanded one year at a time, when a date in it is requested
+        self.intervals = {}
 
     def get_person(self, p):
         g = ICSCalendar.SUM_PAT.match(p)
@@ -175,15 +203,73 @@ class ICSCalendar(Calendar):
             p = p.strip()
         return p
 
+    @staticmethod
+    def _get_end(event):
+        start = event["DTSTART"].dt
+        if "DTEND" in event:
+            return event["DTEND"].dt
+        if "DURATION" in event:
+            return start + event["DURATION"].dt
+        return start
+
+    @staticmethod
+    def _get_day(time):
+        return time.date() if isinstance(time, datetime.datetime) else time
+
+    def get_intervals(self, year):
+        """Get the duty intervals overlapping a year, sorted by start day.
+
+        Returns:
+            The start days, the longest duration in days and the intervals
+            (start, end, person).
+        """
+        if year not in self.intervals:
+            # One more day on both sides for the events in other time zones
+            events = recurring_ical_events.of(self.cal).between(
+                datetime.date(year - 1, 12, 31), datetime.date(year + 1, 1, 2)
+            )
+            intervals = sorted(
+                (
+                    (
+                        self._get_day(event["DTSTART"].dt),
+                        event["DTSTART"].dt,
+                        self._get_end(event),
+                        self.get_person(event["SUMMARY"]),
+                    )
+                    for event in events
+                ),
+                key=lambda interval: interval[0],
+            )
+            days = [day for day, *_ in intervals]
+            longest = max(
+                ((self._get_day(end) - day).days for day, _, end, _ in intervals),
+                default=0,
+            )
+            self.intervals[year] = (
+                days,
+                longest,
+                [interval[1:] for interval in intervals],
+            )
+
+        return self.intervals[year]
+
     def get_persons(self, date):
         date = lmdutils.get_date_ymd(date)
         if date in self.cache:
             return self.cache[date]
 
-        events = recurring_ical_events.of(self.cal).between(date, date)
-        persons = [self.get_person(event["SUMMARY"]) for event in events]
-        self.cache[date] = res = [
-            (person, self.people.get_bzmail_from_name(person)) for person in persons
+        day = date.date()
+        days, longest, intervals = self.get_intervals(day.year)
+        # The days are local to the time zone of the events, so we take one
+        # more day on both sides and let the exact comparison decide
+        first = bisect_left(days, day - datetime.timedelta(days=longest + 1))
+        last = bisect_right(days, day + datetime.timedelta(days=1))
+        persons = [
+            person
+            for start, end, person in intervals[first:last]
+            if time_span_contains_event(date, date, start, end)
         ]
+        bzmails = self.people.get_bzmails_from_names(persons)
+        self.cache[date] = res = [(person, bzmails[person]) for person in persons]
 
         return res
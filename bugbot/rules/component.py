@@ -51,7 +51,14 @@ class Component(BzCleaner):
         bot = get_config("common", "bot_bz_mail")[0]
 
         return {
-            "include_fields": ["id", "groups", "summary", "product", "component"],
+            "include_fields": [
+                "id",
+                "groups",
+                "summary",
+                "product",
+                "component",
+                "last_change_time",
+            ],
             # Ignore bugs for which we ever modified the product or the component.
             "n1": 1,
             "f1": "product",
@@ -104,7 +111,7 @@ class Component(BzCleaner):
         bug_ids = list(raw_bugs.keys())
 
         # Classify those bugs
-        bugs = get_bug_ids_classification("component", bug_ids)
+        bugs = get_bug_ids_classification("component", raw_bugs)
 
         # For Firefox::General bugs, use the componentspecific model to decide
         # whether to move them out of General.
@@ -117,7 +124,8 @@ class Component(BzCleaner):
         componentspecific_results = {}
         if ff_general_bug_ids:
             componentspecific_results = get_bug_ids_classification(
-                "componentspecific", ff_general_bug_ids
+                "componentspecific",
+                {bug_id: raw_bugs[bug_id] for bug_id in ff_general_bug_ids},
             )
 
         fenix_general_bug_ids = []
@@ -139,7 +147,8 @@ class Component(BzCleaner):
 
         if fenix_general_bug_ids:
             fenix_general_classification = get_bug_ids_classification(
-                "fenixcomponent", fenix_general_bug_ids
+                "fenixcomponent",
+                {bug_id: raw_bugs[bug_id] for bug_id in fenix_general_bug_ids},
             )
 
             for bug_id, data in fenix_general_classification.items():
@@ -2,7 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from bugbot.bugbug_utils import get_bug_ids_classification
+from bugbot.bugbug_utils import classify_bugs
 from bugbot.bzcleaner import BzCleaner
 from bugbot.utils import nice_round
 
@@ -57,7 +57,7 @@ class DefectEnhancementTask(BzCleaner):
         reporter_skiplist = ",".join(reporter_skiplist)
 
         return {
-            "include_fields": ["id", "type"],
+            "include_fields": ["id", "type", "last_change_time"],
             # Ignore closed bugs.
             "bug_status": "__open__",
             # Check only recently opened bugs.
@@ -79,17 +79,10 @@ class DefectEnhancementTask(BzCleaner):
         if len(raw_bugs) == 0:
             return {}
 
-        # Extract the bug ids
-        bug_ids = list(raw_bugs.keys())
-
-        # Classify those bugs
-        bugs = get_bug_ids_classification("defectenhancementtask", bug_ids)
-
         results = {}
 
-        for bug_id in sorted(bugs.keys()):
-            bug_data = bugs[bug_id]
-
+        # Classify those bugs, each one is handled as soon as it is ready
+        for bug_id, bug_data in classify_bugs("defectenhancementtask", raw_bugs):
             if not bug_data.get("available", True):
                 # The bug was not available, it was either removed or is a
                 # security bug
@@ -6,11 +6,10 @@ import pprint
 from functools import cached_property
 
 import humanize
-import jinja2
 import requests
 from libmozdata.bugzilla import Bugzilla
 
-from bugbot import logger, utils
+from bugbot import logger, templates, utils
 from bugbot.bug.analyzer import BugAnalyzer
 from bugbot.bzcleaner import BzCleaner
 from bugbot.crash import socorro_util
@@ -26,9 +25,9 @@ class FileCrashBug(BzCleaner):
     def __init__(self):
         super().__init__()
 
-        self.bug_description_template = jinja2.Environment(
-            loader=jinja2.FileSystemLoader("templates")
-        ).get_template("file_crash_bug_description.md.jinja")
+        self.bug_description_template = templates.get_template(
+            "file_crash_bug_description.md.jinja"
+        )
 
     def description(self):
         return "New actionable crashes"
@@ -8,6 +8,7 @@ from libmozdata.socorro import SuperSearch
 
 from bugbot import utils
 from bugbot.bzcleaner import BzCleaner
+from bugbot.crash.query_planner import SignatureQueryPlan
 
 
 class SocorroError(Exception):
@@ -58,30 +59,6 @@ class NoCrashes(BzCleaner):
 
         return params
 
-    @staticmethod
-    def chunkify(signatures):
-        """Make some chunks with signatures,
-        the total length of each chunk must be <= 1536"""
-        total = sum(len(s) for s in signatures)
-        M = 1536
-        n = total // M + 1
-        res = [[M, []] for _ in range(n)]
-        for s in signatures:
-            L = len(s)
-            if L > M:
-                continue
-            added = False
-            for i in res:
-                if L < i[0]:
-                    added = True
-                    i[1].append(s)
-                    i[0] -= L
-                    break
-            if not added:
-                res.append([M - L, [s]])
-        res = [x for _, x in res if len(x)]
-        return res, max(len(x) for x in res)
-
     def bughandler(self, bug, data):
         """bug handler for the Bugzilla query"""
         if "cf_crash_signature" not in bug:
@@ -100,34 +77,21 @@ class NoCrashes(BzCleaner):
                 raise SocorroError()
             del json["hits"]
             for facet in json["facets"].get("signature", {}):
-                data.remove(facet["term"])
+                # The prefix searches can return some other signatures
+                data.discard(facet["term"])
 
         date = lmdutils.get_date_ymd(date) - relativedelta(weeks=self.nweeks)
         search_date = SuperSearch.get_search_date(date)
-        chunks, size = self.chunkify(signatures)
-        base = {
-            "date": search_date,
-            "signature": "",
-            "_result_number": 0,
-            "_facets": "signature",
-            "_facets_size": size,
-        }
-
-        searches = []
-        for chunk in chunks:
-            params = base.copy()
-            params["signature"] = ["=" + x for x in chunk]
-            searches.append(
-                SuperSearch(
-                    params=params,
-                    handler=handler,
-                    handlerdata=signatures,
-                    raise_error=True,
-                )
-            )
-
-        for s in searches:
-            s.wait()
+        SignatureQueryPlan(signatures).run(
+            {
+                "date": search_date,
+                "_result_number": 0,
+                "_facets": "signature",
+            },
+            handler,
+            signatures,
+            raise_error=True,
+        )
 
     def get_bugs_without_crashes(self, data):
         # data['ids'] contains bugid => set(...signatures...)
@@ -15,6 +15,7 @@ from libmozdata.phabricator import (
 )
 
 from bugbot import utils
+from bugbot.bugzilla_users import BugzillaUsers
 from bugbot.bzcleaner import BzCleaner
 
 PHAB_URL_PAT = re.compile(r"https://phabricator\.services\.mozilla\.com/D([0-9]+)")
@@ -310,21 +311,10 @@ class NotLanded(BzCleaner):
         return {phid: data[id] for phid, id in users.items()}
 
     def get_nicks(self, nicknames):
-        def handler(user, data):
-            data[user["name"]] = user["nick"]
-
-        users = set(nicknames.values())
-        data = {}
-        if users:
-            BugzillaUser(
-                user_names=list(users),
-                include_fields=["name", "nick"],
-                user_handler=handler,
-                user_data=data,
-            ).wait()
-
+        users = BugzillaUsers.get_instance()
+        users.prefetch(nicknames.values())
         for bugid, name in nicknames.items():
-            nicknames[bugid] = (name, data[name])
+            nicknames[bugid] = (name, users.get_nick(name))
 
         return nicknames
 
@@ -6,9 +6,9 @@ import collections
 
 import numpy
 from libmozdata import utils as lmdutils
-from libmozdata.bugzilla import Bugzilla
 
 from bugbot import logger, utils
+from bugbot.bug.analyzer import BugsStore
 from bugbot.bzcleaner import BzCleaner
 from bugbot.user_activity import UserActivity, UserStatus
 
@@ -95,11 +95,12 @@ class PerfAlertInactiveRegression(BzCleaner):
                     "nick"
                 ]
 
-        Bugzilla(
-            bugids={bug["regressor_id"] for bug in bugs.values()},
-            bughandler=bug_handler,
+        regressor_bugs = BugsStore.get_instance().get_bugs(
+            {bug["regressor_id"] for bug in bugs.values()},
             include_fields=["id", "assigned_to", "groups"],
-        ).get_data().wait()
+        )
+        for regressor_bug in regressor_bugs.values():
+            bug_handler(regressor_bug)
 
     def filter_bugs(self, bugs):
         # TODO: Attempt to needinfo the triage owner instead of ignoring the bugs
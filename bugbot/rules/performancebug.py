@@ -2,7 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from bugbot.bugbug_utils import get_bug_ids_classification
+from bugbot.bugbug_utils import classify_bugs
 from bugbot.bzcleaner import BzCleaner
 from bugbot.utils import nice_round
 
@@ -29,6 +29,7 @@ class PerformanceBug(BzCleaner):
         start_date, _ = self.get_dates(date)
 
         params = {
+            "include_fields": ["id", "last_change_time"],
             "f1": "creation_ts",
             "o1": "greaterthan",
             "v1": start_date,
@@ -48,13 +49,10 @@ class PerformanceBug(BzCleaner):
         if len(raw_bugs) == 0:
             return {}
 
-        bug_ids = list(raw_bugs.keys())
-
-        bugs = get_bug_ids_classification("performancebug", bug_ids)
-
         results = {}
 
-        for bug_id, bug_data in bugs.items():
+        # Classify those bugs, each one is handled as soon as it is ready
+        for bug_id, bug_data in classify_bugs("performancebug", raw_bugs):
             if not bug_data.get("available", True):
                 # The bug was not available, it was either removed or is a
                 # security bug
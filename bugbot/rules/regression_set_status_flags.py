@@ -4,8 +4,6 @@
 
 from itertools import chain
 
-from libmozdata.bugzilla import Bugzilla
-
 from bugbot import logger, utils
 from bugbot.bug.analyzer import BugNotInStoreError, BugsStore
 from bugbot.bzcleaner import BzCleaner
@@ -72,15 +70,7 @@ class RegressionSetStatusFlags(BzCleaner):
         data[str(bugid)] = bug
 
     def get_flags_from_regressing_bugs(self, bugids):
-        def bug_handler(bug, data):
-            data[bug["id"]] = bug
-
-        data = {}
-        Bugzilla(
-            bugids=list(bugids), bughandler=bug_handler, bugdata=data
-        ).get_data().wait()
-
-        return data
+        return BugsStore.get_instance().get_bugs(bugids)
 
     @staticmethod
     def _is_latest_status_flag_wontfix(bug: dict) -> bool:
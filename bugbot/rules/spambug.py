@@ -3,7 +3,7 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from bugbot import people
-from bugbot.bugbug_utils import get_bug_ids_classification
+from bugbot.bugbug_utils import classify_bugs
 from bugbot.bzcleaner import BzCleaner
 from bugbot.utils import nice_round
 
@@ -47,7 +47,13 @@ class SpamBug(BzCleaner):
         start_date, _ = self.get_dates(date)
 
         return {
-            "include_fields": ["id", "groups", "summary", "creator"],
+            "include_fields": [
+                "id",
+                "groups",
+                "summary",
+                "creator",
+                "last_change_time",
+            ],
             "bug_status": "UNCONFIRMED",
             "f1": "reporter",
             "v1": "%group.editbugs%",
@@ -68,15 +74,8 @@ class SpamBug(BzCleaner):
         if len(raw_bugs) == 0:
             return {}
 
-        # Extract the bug ids
-        bug_ids = list(raw_bugs.keys())
-
-        # Classify those bugs
-        bugs = get_bug_ids_classification("spambug", bug_ids)
-
-        for bug_id in sorted(bugs.keys()):
-            bug_data = bugs[bug_id]
-
+        # Classify those bugs, each one is handled as soon as it is ready
+        for bug_id, bug_data in classify_bugs("spambug", raw_bugs):
             if not bug_data.get("available", True):
                 # The bug was not available, it was either removed or is a
                 # security bug
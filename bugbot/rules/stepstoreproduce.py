@@ -2,7 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from bugbot.bugbug_utils import get_bug_ids_classification
+from bugbot.bugbug_utils import classify_bugs
 from bugbot.bzcleaner import BzCleaner
 from bugbot.utils import nice_round
 
@@ -21,7 +21,7 @@ class StepsToReproduce(BzCleaner):
         start_date, end_date = self.get_dates(date)
 
         params = {
-            "include_fields": ["id", "groups", "summary"],
+            "include_fields": ["id", "groups", "summary", "last_change_time"],
             "bug_type": "defect",
             "f1": "longdesc",
             "o1": "changedafter",
@@ -55,17 +55,10 @@ class StepsToReproduce(BzCleaner):
         if len(raw_bugs) == 0:
             return {}
 
-        # Extract the bug ids
-        bug_ids = list(raw_bugs.keys())
-
-        # Classify those bugs
-        bugs = get_bug_ids_classification("stepstoreproduce", bug_ids)
-
         results = {}
 
-        for bug_id in sorted(bugs.keys()):
-            bug_data = bugs[bug_id]
-
+        # Classify those bugs, each one is handled as soon as it is ready
+        for bug_id, bug_data in classify_bugs("stepstoreproduce", raw_bugs):
             if not bug_data.get("available", True):
                 # The bug was not available, it was either removed or is a
                 # security bug
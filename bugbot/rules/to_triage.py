@@ -73,6 +73,8 @@ class ToTriage(BzCleaner, Nag):
 
     def get_bz_params(self, date):
         self.date = lmdutils.get_date_ymd(date)
+        # The nicks of the triagers of all the components are fetched together
+        self.round_robin.prefetch_nicks(self.date, self.components)
         prods, comps = utils.get_products_components(self.components)
         fields = ["triage_owner", "type"]
         params = {
@@ -139,6 +139,8 @@ class NoSeverityNeedInfo(BzCleaner, Nag):
         }
 
         self.date = lmdutils.get_date_ymd(date)
+        # The nicks of the triagers of all the components are fetched together
+        self.round_robin.prefetch_nicks(self.date, self.round_robin.get_components())
 
         return params
 
@@ -87,6 +87,8 @@ class P1NoAssignee(BzCleaner, Nag):
             (utils.get_next_release_date() - self.nag_date).days
         )
         self.date = lmdutils.get_date_ymd(date)
+        # The nicks of the triagers of all the components are fetched together
+        self.round_robin.prefetch_nicks(self.date, self.round_robin.get_components())
         fields = ["triage_owner", "flags"]
         params = {
             "bug_type": "defect",
@@ -0,0 +1,497 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Run a batch of rules in a single Python process.
+
+The cron scripts start a new interpreter for every rule, so each rule pays
+again for the imports, the configuration loading and the warm-up of the
+shared data (`People.get_instance()`, `utils.get_triage_owners()`, ...).
+The runner imports the rules and runs them in the same process, so all of
+those are loaded only once for the whole batch.
+
+The other modules run by the cron scripts (e.g., `bugbot.iam` or
+`bugbot.log`) are run as steps: they are executed like `python -m` would do,
+and when the rules run concurrently, a step waits for all the commands before
+it and all the commands after it wait for the step.
+
+Most of the time of a rule is spent waiting for the servers, so the rules
+can also be run concurrently on a pool of threads or processes. The number of
+simultaneous requests to a host is then bounded by the `host_limits` from the
+`runner` section of the configuration, and a rule can declare with the
+`run_after` entry of its configuration the rules it must wait for.
+
+Usage:
+    python -m bugbot.runner hourly --production
+    python -m bugbot.runner --rules no_assignee leave_open
+    python -m bugbot.runner weekdays --jobs 8 --executor thread
+"""
+
+import argparse
+import ast
+import contextvars
+import functools
+import importlib
+import multiprocessing
+import os
+import re
+import runpy
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from types import ModuleType
+from typing import Any, Iterator, NamedTuple
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+from bugbot import db, logger, metrics, templates, utils
+
+SCRIPT_PATH = "./scripts/cron_run_{}.sh"
+SCHEDULES = ("hourly", "daily", "weekdays")
+RULES_PACKAGE = "bugbot.rules"
+COMMAND_PAT = re.compile(r"^python -m (bugbot\.[\w\.]+)(.*)$")
+SOURCE_PAT = re.compile(r"^(?:source|\.) (\./scripts/cron_common_\w+\.sh)$")
+EXECUTORS = ("process", "thread")
+
+_host_semaphores: dict[str, Any] = {}
+
+
+class RuleInvocation(NamedTuple):
+    """A module (a rule or a step) and the command line arguments to run it
+    with"""
+
+    module: str
+    args: list[str]
+
+
+class RuleResult(NamedTuple):
+    """The outcome of running a rule module"""
+
+    module: str
+    success: bool
+    duration: float
+    metrics: tuple[dict, ...] = ()
+
+
+class InvalidEntryPointError(Exception):
+    """Raised when the `__main__` block of a rule module cannot be understood"""
+
+
+def get_schedule(schedule: str) -> list[RuleInvocation]:
+    """Get the commands run by a cron script.
+
+    The cron scripts are the reference for what is run and with which
+    arguments, so we read the uncommented `python -m bugbot.X` lines from
+    them, including the ones from the common scripts they source.
+
+    Args:
+        schedule: the name of the schedule (e.g., `hourly`).
+
+    Returns:
+        The list of invocations in the order of the script.
+    """
+    path = SCRIPT_PATH.format(schedule)
+    if not os.path.exists(path):
+        raise ValueError(f"No script for the schedule '{schedule}': {path}")
+
+    with open(path, "r") as In:
+        return parse_schedule(In.read())
+
+
+def parse_schedule(script: str, strict: bool = True) -> list[RuleInvocation]:
+    """Parse the content of a cron script to get the invocations.
+
+    Args:
+        script: the content of the script.
+        strict: if `True`, a command which cannot be run by the runner raises
+            an error. The common scripts are not strict: their other commands
+            (checkout, virtual environment, ...) prepare the environment the
+            runner is started in.
+
+    Returns:
+        The list of invocations in the order of the script.
+    """
+    invocations = []
+    for line in script.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        m = COMMAND_PAT.match(line)
+        if m:
+            invocations.append(RuleInvocation(m.group(1), shlex.split(m.group(2))))
+            continue
+
+        m = SOURCE_PAT.match(line)
+        if m:
+            with open(m.group(1), "r") as In:
+                invocations.extend(parse_schedule(In.read(), strict=False))
+            continue
+
+        if strict:
+            raise ValueError(f"The runner cannot run the command: {line}")
+
+    return invocations
+
+
+def is_rule(module: str) -> bool:
+    """Check whether a module is a rule or a step"""
+    return module.startswith(RULES_PACKAGE + ".")
+
+
+def get_module_name(rule: str) -> str:
+    """Get the full module name of a rule (e.g., `no_assignee` or
+    `workflow.p1`)"""
+    if rule.startswith(RULES_PACKAGE + "."):
+        return rule
+    return f"{RULES_PACKAGE}.{rule}"
+
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+
+    test = node.test
+    return (
+        isinstance(test.left, ast.Name)
+        and test.left.id == "__name__"
+        and len(test.comparators) == 1
+        and isinstance(test.comparators[0], ast.Constant)
+        and test.comparators[0].value == "__main__"
+    )
+
+
+def get_entry_points(module: ModuleType) -> Iterator[Any]:
+    """Instantiate the rules run by the `__main__` block of a module.
+
+    The rule modules end with statements like `Rule().run()` or
+    `Rule("beta").run()`. We evaluate the receivers of the `run()` calls in
+    the namespace of the imported module, which gives the same instances as
+    `python -m` without executing the module a second time.
+
+    Args:
+        module: an imported rule module.
+
+    Returns:
+        The objects (BzCleaner, MultiNaggers, ...) to run.
+    """
+    path = module.__file__
+    assert path is not None
+    with open(path, "r") as In:
+        tree = ast.parse(In.read(), filename=path)
+
+    guards = [node for node in tree.body if _is_main_guard(node)]
+    if not guards:
+        raise InvalidEntryPointError(f"{module.__name__} has no __main__ block")
+
+    for stmt in guards[0].body:
+        if not (
+            isinstance(stmt, ast.Expr)
+            and isinstance(stmt.value, ast.Call)
+            and isinstance(stmt.value.func, ast.Attribute)
+            and stmt.value.func.attr == "run"
+            and not stmt.value.args
+            and not stmt.value.keywords
+        ):
+            raise InvalidEntryPointError(
+                f"{module.__name__}: unsupported statement in the __main__ block: {ast.unparse(stmt)}"
+            )
+
+        receiver = ast.Expression(stmt.value.func.value)
+        code = compile(receiver, path, "eval")
+        yield eval(code, vars(module))
+
+
+def _limited_send(send):
+    @functools.wraps(send)
+    def wrapper(self, request, *args, **kwargs):
+        semaphore = _host_semaphores.get(urlparse(request.url).hostname)
+        if semaphore is None:
+            return send(self, request, *args, **kwargs)
+        with semaphore:
+            return send(self, request, *args, **kwargs)
+
+    wrapper._limit_hosts = True
+    return wrapper
+
+
+def limit_hosts(semaphores: dict[str, Any]) -> None:
+    """Bound the number of simultaneous requests to some hosts.
+
+    All the HTTP requests (libmozdata, Phabricator, Socorro, ...) go through
+    `requests`, so the limits are applied in the transport adapter.
+
+    Args:
+        semaphores: the semaphores to acquire for each host name.
+    """
+    global _host_semaphores
+    send = HTTPAdapter.send
+    if getattr(send, "_http_cache", False):
+        # The responses from the HTTP cache don't wait for the hosts
+        if not getattr(send.uncached, "_limit_hosts", False):
+            send.uncached = _limited_send(send.uncached)
+    elif not getattr(send, "_limit_hosts", False):
+        HTTPAdapter.send = _limited_send(send)
+    _host_semaphores = semaphores
+
+
+def _init_worker(semaphores: dict[str, Any]) -> None:
+    """Initialize a worker process"""
+    limit_hosts(semaphores)
+    # The connections inherited from the parent process must not be shared
+    db.engine.dispose()
+
+
+def get_rule_name(module: str) -> str:
+    """Get the name of the rule as used in the configuration"""
+    return module.rsplit(".", 1)[-1]
+
+
+def run_step(invocation: RuleInvocation) -> None:
+    """Run the `__main__` block of a module which is not a rule"""
+    argv = sys.argv
+    sys.argv = [invocation.module] + invocation.args
+    try:
+        runpy.run_module(invocation.module, run_name="__main__")
+    finally:
+        sys.argv = argv
+
+
+def run_rule(invocation: RuleInvocation) -> RuleResult:
+    """Run a rule module (or a step) in the current process.
+
+    The failures are isolated: an exception (including `SystemExit` from the
+    arguments parser) is logged and the next rule can run. The rule runs in a
+    copy of the current context, so the rule name and the log level it sets
+    for its logs are dropped when it is done.
+    """
+    return contextvars.copy_context().run(_run_rule, invocation)
+
+
+def _run_rule(invocation: RuleInvocation) -> RuleResult:
+    start = time.monotonic()
+    success = True
+    logger.info("Run module %s", invocation.module)
+    try:
+        if is_rule(invocation.module):
+            module = importlib.import_module(invocation.module)
+            for rule in get_entry_points(module):
+                rule.run(invocation.args)
+        else:
+            run_step(invocation)
+    except (Exception, SystemExit):
+        logger.exception("Module %s", invocation.module)
+        success = False
+
+    return RuleResult(
+        invocation.module,
+        success,
+        time.monotonic() - start,
+        tuple(metrics.pop_records()),
+    )
+
+
+def get_executor(kind: str, max_workers: int) -> Executor:
+    """Create the pool used to run the rules concurrently.
+
+    Args:
+        kind: `process` or `thread`. The processes are forked so they inherit
+            the imports and the data already loaded.
+        max_workers: the maximum number of rules running at the same time.
+    """
+    host_limits = utils.get_config("runner", "host_limits", {})
+    if kind == "thread":
+        limit_hosts(
+            {host: threading.BoundedSemaphore(n) for host, n in host_limits.items()}
+        )
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    context = multiprocessing.get_context("fork")
+    semaphores = {host: context.BoundedSemaphore(n) for host, n in host_limits.items()}
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(semaphores,),
+    )
+
+
+def _run_concurrently(
+    invocations: list[RuleInvocation], executor: Executor
+) -> list[RuleResult]:
+    """Run the rules on the executor once the rules they depend on are done"""
+    # The invocations which must be run before a given invocation: a step
+    # waits for everything before it and everything after a step waits for it
+    dependencies = []
+    for i, invocation in enumerate(invocations):
+        if not is_rule(invocation.module):
+            dependencies.append(set(range(i)))
+            continue
+
+        run_after = set(
+            utils.get_config(get_rule_name(invocation.module), "run_after", [])
+        )
+        dependencies.append(
+            {
+                j
+                for j in range(i)
+                if not is_rule(invocations[j].module)
+                or get_rule_name(invocations[j].module) in run_after
+            }
+        )
+
+    results: dict[int, RuleResult] = {}
+    running: dict[Future, int] = {}
+    pending = list(range(len(invocations)))
+    while pending or running:
+        for i in list(pending):
+            if dependencies[i] <= results.keys():
+                pending.remove(i)
+                running[executor.submit(run_rule, invocations[i])] = i
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            i = running.pop(future)
+            try:
+                results[i] = future.result()
+            except Exception:
+                # The worker itself died (e.g., killed by the OOM killer)
+                logger.exception("Module %s", invocations[i].module)
+                results[i] = RuleResult(invocations[i].module, False, 0.0)
+
+    return [results[i] for i in range(len(invocations))]
+
+
+def run(
+    invocations: list[RuleInvocation],
+    max_workers: int = 1,
+    executor: str = "process",
+    report: str | None = None,
+) -> list[RuleResult]:
+    """Run the rules in the current process or on a pool of workers.
+
+    Args:
+        invocations: the rules to run.
+        max_workers: the maximum number of rules running at the same time; if
+            it is 1, the rules are run one after the other in this process.
+        executor: the kind of pool (`process` or `thread`).
+        report: if not `None`, the path (without extension) of the JSON and
+            CSV files where the metrics of the rules are written.
+
+    Returns:
+        The results of the rules, in the order of the invocations.
+    """
+    start = time.monotonic()
+    # The workers inherit the compiled templates
+    templates.precompile()
+    if max_workers <= 1:
+        results = [run_rule(invocation) for invocation in invocations]
+    else:
+        with get_executor(executor, max_workers) as pool:
+            results = _run_concurrently(invocations, pool)
+
+    failures = [result.module for result in results if not result.success]
+    logger.info(
+        "%d rules run in %.1fs, %d failed%s",
+        len(results),
+        time.monotonic() - start,
+        len(failures),
+        ": " + ", ".join(failures) if failures else "",
+    )
+
+    if report:
+        records = [record for result in results for record in result.metrics]
+        metrics.write_report(records, report)
+        logger.info("Report of the run written in %s.{json,csv}", report)
+
+    return results
+
+
+def get_invocations(args: argparse.Namespace) -> list[RuleInvocation]:
+    """Build the list of rules to run from the command line arguments"""
+    if args.schedule:
+        invocations = get_schedule(args.schedule)
+    else:
+        invocations = [RuleInvocation(get_module_name(rule), []) for rule in args.rules]
+
+    # The runner decides whether the changes are applied or not, the steps
+    # without a production mode are run as they are
+    mode = [] if args.dryrun else ["--production"]
+    return [
+        RuleInvocation(
+            invocation.module,
+            [arg for arg in invocation.args if arg != "--production"] + mode,
+        )
+        if is_rule(invocation.module) or "--production" in invocation.args
+        else invocation
+        for invocation in invocations
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run several rules in a single process"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "schedule",
+        nargs="?",
+        choices=SCHEDULES,
+        help="Run the rules from the cron script of this schedule",
+    )
+    group.add_argument(
+        "-r",
+        "--rules",
+        dest="rules",
+        nargs="+",
+        help="Run these rules (e.g., no_assignee workflow.p1)",
+    )
+    parser.add_argument(
+        "--production",
+        dest="dryrun",
+        action="store_false",
+        help="If the flag is not passed, the rules are run in dry-run mode",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=utils.get_config("runner", "max_workers", 1),
+        help="The maximum number of rules running at the same time",
+    )
+    parser.add_argument(
+        "--executor",
+        dest="executor",
+        choices=EXECUTORS,
+        default=utils.get_config("runner", "executor", "process"),
+        help="Run the rules concurrently in processes or threads",
+    )
+    parser.add_argument(
+        "--report-dir",
+        dest="report_dir",
+        default=utils.get_config("runner", "report_dir"),
+        help="The directory where the metrics of the run are written",
+    )
+    args = parser.parse_args()
+
+    report = None
+    if args.report_dir:
+        name = args.schedule or "rules"
+        report = os.path.join(
+            args.report_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        )
+
+    results = run(get_invocations(args), args.jobs, args.executor, report)
+    if not all(result.success for result in results):
+        raise SystemExit(1)
@@ -6,8 +6,7 @@ import json
 from collections import defaultdict
 from typing import Dict, Optional
 
-from libmozdata.bugzilla import BugzillaUser
-
+from bugbot.bugzilla_users import BugzillaUsers
 from bugbot.components import ComponentName, fetch_component_teams
 from bugbot.people import People
 
@@ -78,18 +77,14 @@ class TeamManagers:
             # them.
             bz_emails_map[bz_mail].append(manager)
 
-        def handler(user, data):
-            for manager in data[user["email"]]:
+        users = BugzillaUsers.get_instance().get_users(bz_emails_map.keys())
+        for bz_mail, user in users.items():
+            if user is None:
+                continue
+            for manager in bz_emails_map[bz_mail]:
                 manager["nick"] = user["nick"]
                 manager["bz_email"] = user["email"]
 
-        BugzillaUser(
-            list(bz_emails_map.keys()),
-            include_fields=["email", "nick"],
-            user_handler=handler,
-            user_data=bz_emails_map,
-        ).wait()
-
     def get_component_manager(
         self, product: str, component: str, fallback: bool = True
     ) -> Optional[Dict[str, dict]]:
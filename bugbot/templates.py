@@ -0,0 +1,65 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""The Jinja templates of the emails and of the comments.
+
+All the templates are loaded from the same environment for the whole process,
+so a template is compiled only once, whatever the number of rules, managers or
+bugs it is rendered for. The compiled code is also saved under the cache
+directory, so the next processes only have to load it.
+"""
+
+import os
+from typing import Any
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+from bugbot.cache import get_cache_dir
+
+TEMPLATES_DIR = "templates"
+
+_env: Environment | None = None
+
+
+def get_env() -> Environment:
+    """Get the environment shared by all the rules"""
+    global _env
+    if _env is None:
+        bytecode_dir = os.path.join(get_cache_dir(), "jinja")
+        os.makedirs(bytecode_dir, exist_ok=True)
+        _env = Environment(
+            loader=FileSystemLoader(TEMPLATES_DIR),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+            # The templates don't change while the rules run
+            auto_reload=False,
+            cache_size=-1,
+        )
+    return _env
+
+
+def get_template(name: str) -> Template:
+    return get_env().get_template(name)
+
+
+def render(name: str, **kwargs: Any) -> str:
+    """Render a template
+
+    Args:
+        name: the name of the template file in the templates directory.
+        **kwargs: the variables used in the template.
+    """
+    return get_template(name).render(**kwargs)
+
+
+def precompile() -> int:
+    """Compile all the templates, so they are ready before the rules run
+    (and before the workers of the runner are forked).
+
+    Returns:
+        The number of templates.
+    """
+    names = get_env().list_templates()
+    for name in names:
+        get_template(name)
+    return len(names)
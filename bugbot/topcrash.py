@@ -2,15 +2,21 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import threading
+import time
+import zlib
 from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Dict, Iterable, List, Optional, Set, Union
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
 
 import libmozdata.socorro as socorro
 from libmozdata import utils as lmdutils
 from libmozdata import versions as lmdversions
 
-from bugbot.rules.no_crashes import NoCrashes
+from bugbot import utils
+from bugbot.cache import SQLiteStore
+from bugbot.crash.query_planner import SignatureQueryPlan
 
 
 class SocorroError(Exception):
@@ -196,6 +202,127 @@ CRASH_SIGNATURE_BLOCK_PATTERNS = [
 ]
 
 
+class TopcrashSnapshot(SQLiteStore):
+    """The results of the Socorro queries made to compute the top crashes.
+
+    The rules dealing with crashes use the same queries, so the results are
+    saved in a SQLite database under the cache directory and shared by all
+    the rules of a batch, including the ones run in other processes:
+     - the SuperSearch responses, indexed by their parameters except the
+       number of facets; a response with more facets can answer a query asking
+       for fewer, since the facets are sorted by volume;
+     - the crash volume of each signature, indexed by date range and
+       signature.
+
+    The date ranges end at a past day, so the results don't change and are
+    only removed when they are older than `max_age` seconds.
+    """
+
+    FILENAME = "topcrash.sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS searches ("
+        "key TEXT PRIMARY KEY, "
+        "facets_size INTEGER NOT NULL, "
+        "response BLOB NOT NULL, "
+        "created REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS volumes ("
+        "date_range TEXT NOT NULL, "
+        "signature TEXT NOT NULL, "
+        "volume INTEGER NOT NULL, "
+        "created REAL NOT NULL, "
+        "PRIMARY KEY (date_range, signature))",
+    ]
+    EXPIRES = {"searches": "created", "volumes": "created"}
+
+    def __init__(self, path: str, max_age: float = 2 * 24 * 3600) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            max_age: the number of seconds after which the results are removed.
+        """
+        super().__init__(path, max_age)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "TopcrashSnapshot":
+        return cls(
+            path,
+            utils.get_config("common", "topcrash_snapshot_max_age", 2 * 24 * 3600),
+        )
+
+    @staticmethod
+    def _get_key(params: dict) -> str:
+        return json.dumps(
+            {k: v for k, v in params.items() if k != "_facets_size"}, sort_keys=True
+        )
+
+    def get_search(self, params: dict) -> Optional[dict]:
+        """Get the response of a SuperSearch query, if it is known with at
+        least the requested number of facets"""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT response FROM searches WHERE key = ? AND facets_size >= ?",
+                (self._get_key(params), params["_facets_size"]),
+            ).fetchone()
+
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def set_search(self, params: dict, response: dict) -> None:
+        """Save the response of a SuperSearch query, unless a response with
+        more facets is already known"""
+        key = self._get_key(params)
+        data = zlib.compress(json.dumps(response, separators=(",", ":")).encode())
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO searches (key, facets_size, response, created) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET facets_size = excluded.facets_size, "
+                "response = excluded.response, created = excluded.created "
+                "WHERE excluded.facets_size > searches.facets_size",
+                (key, params["_facets_size"], data, time.time()),
+            )
+            self.db.commit()
+
+    def get_volumes(self, date_range: List[str], signatures: Iterable[str]) -> dict:
+        """Get the known crash volumes of the signatures"""
+        date_range_key = json.dumps(date_range)
+        signatures = list(signatures)
+        volumes = {}
+        with self._lock:
+            # Stay below the limit of the number of variables in a query
+            for i in range(0, len(signatures), 500):
+                chunk = signatures[i : i + 500]
+                volumes.update(
+                    self.db.execute(
+                        "SELECT signature, volume FROM volumes "
+                        "WHERE date_range = ? AND signature IN ({})".format(
+                            ", ".join("?" * len(chunk))
+                        ),
+                        [date_range_key, *chunk],
+                    ).fetchall()
+                )
+        return volumes
+
+    def set_volumes(self, date_range: List[str], volumes: dict) -> None:
+        """Save the crash volumes of signatures"""
+        date_range_key = json.dumps(date_range)
+        now = time.time()
+        with self._lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO volumes (date_range, signature, volume, created) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (date_range_key, signature, volume, now)
+                    for signature, volume in volumes.items()
+                ),
+            )
+            self.db.commit()
+
+
 class Topcrash:
     def __init__(
         self,
@@ -205,6 +332,7 @@ class Topcrash:
         default_min_installations: int = 3,
         signature_block_patterns: list = CRASH_SIGNATURE_BLOCK_PATTERNS,
         criteria: Iterable[dict] = TOP_CRASH_IDENTIFICATION_CRITERIA,
+        snapshot: Optional[TopcrashSnapshot] = None,
     ) -> None:
         """Constructor
 
@@ -217,11 +345,14 @@ class Topcrash:
                 consider a signature in the top crashes.
             signature_block_list: a list of crash signature to be ignored.
             criteria: the list of criteria to be used to query the top crashes.
+            snapshot: the saved results of the Socorro queries. If not
+                provided, the one shared by all the rules is used.
         """
         self.min_crashes = min_crashes
         self.default_min_installations = default_min_installations
         self.signature_block_patterns = signature_block_patterns
         self.criteria = criteria
+        self.snapshot = snapshot or TopcrashSnapshot.get_instance()
 
         end_date = lmdutils.get_date_ymd(date)
         self.start_date = lmdutils.get_date_ymd(end_date - timedelta(duration))
@@ -230,6 +361,30 @@ class Topcrash:
         self._blocked_signatures: Optional[Set[str]] = None
         self.__version_constrains: Optional[Dict[str, str]] = None
 
+    def _search(
+        self, params: dict, handler: Callable[[dict, object], None], handlerdata
+    ) -> Optional[socorro.SuperSearch]:
+        """Run a SuperSearch query, or handle its response from the snapshot.
+
+        Returns:
+            The query to wait for, or None if the response was in the snapshot.
+        """
+        response = self.snapshot.get_search(params)
+        if response is not None:
+            handler(response, handlerdata)
+            return None
+
+        def snapshot_handler(search_resp: dict, data):
+            handler(search_resp, data)
+            if not search_resp.get("errors"):
+                self.snapshot.set_search(params, search_resp)
+
+        return socorro.SuperSearch(
+            params=params,
+            handler=snapshot_handler,
+            handlerdata=handlerdata,
+        )
+
     def _fetch_signatures_from_patterns(self, patterns) -> Set[str]:
         MAX_SIGNATURES_IN_REQUEST = 1000
 
@@ -250,11 +405,9 @@ class Topcrash:
                 if signature["count"] >= self.min_crashes
             )
 
-        socorro.SuperSearch(
-            params=params,
-            handler=handler,
-            handlerdata=signatures,
-        ).wait()
+        search = self._search(params, handler, signatures)
+        if search is not None:
+            search.wait()
 
         assert (
             len(signatures) < MAX_SIGNATURES_IN_REQUEST
@@ -276,36 +429,40 @@ class Topcrash:
             if search_resp["errors"]:
                 raise SocorroError(search_resp["errors"])
 
+            # The prefix searches can return some other signatures
             data.update(
                 {
                     signature["term"]: signature["count"]
                     for signature in search_resp["facets"]["signature"]
+                    if signature["term"] in data
                 }
             )
 
         signature_volume: dict = {signature: 0 for signature in signatures}
         assert len(signature_volume) > 0, "no signatures provided"
 
-        chunks, size = NoCrashes.chunkify(
-            ["=" + signature for signature in signature_volume]
+        known_volume = self.snapshot.get_volumes(self.date_range, signature_volume)
+        missing_volume = {
+            signature: 0
+            for signature in signature_volume
+            if signature not in known_volume
+        }
+        signature_volume.update(known_volume)
+        if not missing_volume:
+            return signature_volume
+
+        SignatureQueryPlan(missing_volume).run(
+            {
+                "date": self.date_range,
+                "_facets": "signature",
+                "_results_number": 0,
+            },
+            handler,
+            missing_volume,
         )
-        searches = [
-            socorro.SuperSearch(
-                params={
-                    "date": self.date_range,
-                    "signature": _signatures,
-                    "_facets": "signature",
-                    "_results_number": 0,
-                    "_facets_size": size,
-                },
-                handler=handler,
-                handlerdata=signature_volume,
-            )
-            for _signatures in chunks
-        ]
 
-        for search in searches:
-            search.wait()
+        self.snapshot.set_volumes(self.date_range, missing_volume)
+        signature_volume.update(missing_volume)
 
         return signature_volume
 
@@ -333,16 +490,17 @@ class Topcrash:
 
         data: dict = defaultdict(dict)
         searches = [
-            socorro.SuperSearch(
-                params=self.__get_params_from_criterion(criterion),
-                handler=self.__signatures_handler(criterion),
-                handlerdata=data[criterion["name"]],
+            self._search(
+                self.__get_params_from_criterion(criterion),
+                self.__signatures_handler(criterion),
+                data[criterion["name"]],
             )
             for criterion in self.criteria
         ]
 
         for search in searches:
-            search.wait()
+            if search is not None:
+                search.wait()
 
         # We merge the results after finishing all queries to avoid race conditions
         result = {}
@@ -0,0 +1,170 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Shorten the long Bugzilla urls.
+
+The urls are limited in length in the emails, so the long query urls are
+shortened with the Bugzilla service. Most of them are the same from one day
+to the next one, so the short urls are saved in a SQLite database under the
+cache directory, indexed by a hash of the canonical url (the query string
+sorted by parameter name).
+
+A rule rendering several emails can put a placeholder for each url with
+`placeholder`, then shorten all of them at the same time with `resolve` and
+replace the placeholders with `fill`.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from libmozdata.bugzilla import BugzillaShorten
+from requests.exceptions import HTTPError
+
+from bugbot import utils
+from bugbot.cache import SQLiteStore
+
+PLACEHOLDER = "bugbot-short-url:{}"
+PLACEHOLDER_PAT = re.compile(r"bugbot-short-url:([0-9a-f]{64})")
+
+
+def canonicalize(url: str) -> str:
+    """Sort the parameters of the query by name; the values of a repeated
+    parameter keep their order"""
+    parts = urlsplit(url)
+    params = sorted(
+        parse_qsl(parts.query, keep_blank_values=True), key=lambda param: param[0]
+    )
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+def get_key(url: str) -> str:
+    return hashlib.sha256(canonicalize(url).encode("utf-8")).hexdigest()
+
+
+def split(url: str) -> str:
+    """Split the url in lines when it cannot be shortened"""
+    # the url can be very long and line length are limited in email protocol:
+    # https://datatracker.ietf.org/doc/html/rfc5322#section-2.1.1
+    length = utils.MAX_URL_LENGTH
+    return "\n".join(url[i : i + length] for i in range(0, len(url), length))
+
+
+class UrlShortener(SQLiteStore):
+    """Shorten the urls with a persistent cache"""
+
+    FILENAME = "short_urls.sqlite"
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS short_urls ("
+        "key TEXT PRIMARY KEY, "
+        "short_url TEXT NOT NULL, "
+        "created REAL NOT NULL)"
+    ]
+    EXPIRES = {"short_urls": "created"}
+
+    def __init__(self, path: str, max_age: float = 30 * 24 * 3600) -> None:
+        """Constructor
+
+        Args:
+            path: the path of the database.
+            max_age: the number of seconds a short url is kept.
+        """
+        super().__init__(path, max_age)
+        self.urls: Dict[str, str] = {}
+        self.short_urls: Dict[str, str] = {}
+        self.pending: Set[str] = set()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, path: str) -> "UrlShortener":
+        return cls(
+            path, utils.get_config("common", "short_url_max_age", 30 * 24 * 3600)
+        )
+
+    def placeholder(self, url: Optional[str]) -> Optional[str]:
+        """Get a placeholder for the short url, or the url itself when it is
+        short enough"""
+        if not url or len(url) <= utils.MAX_URL_LENGTH:
+            return url
+
+        key = get_key(url)
+        with self._lock:
+            if key not in self.short_urls:
+                self.urls[key] = url
+                self.pending.add(key)
+
+        return PLACEHOLDER.format(key)
+
+    @staticmethod
+    def _shorten(url: str) -> Optional[str]:
+        data = {}
+
+        def url_handler(u, data):
+            data["url"] = u
+
+        # The HTTPError is a workaround for
+        # https://github.com/mozilla/bugbot/issues/1402
+        try:
+            BugzillaShorten(
+                canonicalize(url), url_data=data, url_handler=url_handler
+            ).wait()
+        except HTTPError:
+            pass
+
+        return data.get("url")
+
+    def resolve(self) -> None:
+        """Shorten the pending urls, several at a time"""
+        with self._lock:
+            keys = sorted(self.pending)
+            self.pending.clear()
+            if not keys:
+                return
+
+            rows = self.db.execute(
+                "SELECT key, short_url FROM short_urls WHERE key IN ({})".format(
+                    ", ".join("?" * len(keys))
+                ),
+                keys,
+            )
+            self.short_urls.update(rows)
+
+            missing = [key for key in keys if key not in self.short_urls]
+            if not missing:
+                return
+
+            max_workers = utils.get_config("common", "short_url_workers", 4)
+            with utils.ContextThreadPoolExecutor(max_workers=max_workers) as pool:
+                short_urls = list(
+                    pool.map(self._shorten, (self.urls[key] for key in missing))
+                )
+
+            now = time.time()
+            rows = []
+            for key, short_url in zip(missing, short_urls):
+                if short_url:
+                    rows.append((key, short_url, now))
+                    self.short_urls[key] = short_url
+                else:
+                    # Not saved, so it is tried again in the next run
+                    self.short_urls[key] = split(self.urls[key])
+
+            self.db.executemany(
+                "INSERT OR REPLACE INTO short_urls (key, short_url, created) VALUES (?, ?, ?)",
+                rows,
+            )
+            self.db.commit()
+
+    def fill(self, text: str) -> str:
+        """Replace the placeholders by the short urls"""
+        self.resolve()
+        with self._lock:
+            return PLACEHOLDER_PAT.sub(lambda m: self.short_urls[m.group(1)], text)
+
+    def shorten(self, url: Optional[str]) -> Optional[str]:
+        return self.fill(self.placeholder(url)) if url else url
@@ -7,18 +7,28 @@ from enum import Enum, auto
 from typing import Iterable, List, Optional
 
 from libmozdata import utils as lmdutils
-from libmozdata.bugzilla import BugzillaUser
 from libmozdata.connection import Connection
 from libmozdata.phabricator import PhabricatorAPI
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from bugbot import utils
+from bugbot.bugzilla_users import BugzillaUsers
 from bugbot.people import People
+from bugbot.phabricator_users import PhabricatorUsers
 
 # The chunk size here should not be more than 100; which is the maximum number of
 # items that Phabricator could return in one response.
 PHAB_CHUNK_SIZE = 100
 
+# The fields of the Bugzilla users needed to get their statuses
+ACTIVITY_FIELDS = [
+    "name",
+    "can_login",
+    "last_activity_time",
+    "last_seen_date",
+    "creation_time",
+]
+
 
 class UserStatus(Enum):
     ACTIVE = auto()
@@ -32,7 +42,12 @@ class UserStatus(Enum):
 
 
 class UserActivity:
-    """Check the user activity on Bugzilla and Phabricator"""
+    """Check the user activity on Bugzilla and Phabricator
+
+    The Bugzilla profiles and the Phabricator data are shared with the other
+    rules and runs through `BugzillaUsers` and `PhabricatorUsers`, so only
+    the users which are not in their caches are requested.
+    """
 
     def __init__(
         self,
@@ -44,6 +59,8 @@ class UserActivity:
         phab: PhabricatorAPI | None = None,
         people: People | None = None,
         reference_date: str = "today",
+        bugzilla_users: BugzillaUsers | None = None,
+        phabricator_users: PhabricatorUsers | None = None,
     ) -> None:
         """
         Constructor
@@ -66,6 +83,10 @@ class UserActivity:
             reference_date: the reference date to use for checking user
                 activity. This is needed for testing because the dates in the
                 mock data are fixed.
+            bugzilla_users: if an instance of BugzillaUsers is not provided,
+                the global instance will be used.
+            phabricator_users: if an instance of PhabricatorUsers is not
+                provided, the global instance will be used.
         """
         self.activity_weeks_count = activity_weeks_count
         self.absent_weeks_count = absent_weeks_count
@@ -73,6 +94,14 @@ class UserActivity:
         self.include_fields = include_fields or []
         self.people = people if people is not None else People.get_instance()
         self.phab = phab
+        self.bugzilla_users = (
+            BugzillaUsers.get_instance() if bugzilla_users is None else bugzilla_users
+        )
+        self.phabricator_users = (
+            PhabricatorUsers.get_instance()
+            if phabricator_users is None
+            else phabricator_users
+        )
         self.availability_limit = (
             lmdutils.get_date_ymd(reference_date) + timedelta(unavailable_max_days)
         ).timestamp()
@@ -102,6 +131,22 @@ class UserActivity:
 
         return self.phab
 
+    def prefetch(self, user_emails: Iterable[str]) -> None:
+        """Declare the users which will be checked, so they are all fetched
+        from Bugzilla with the first check.
+
+        Args:
+            user_emails: the email addresses of the users.
+        """
+        self.bugzilla_users.prefetch(
+            (
+                user_email
+                for user_email in user_emails
+                if not utils.is_no_assignee(user_email)
+            ),
+            ACTIVITY_FIELDS + self.include_fields,
+        )
+
     def check_users(
         self,
         user_emails: Iterable[str],
@@ -153,19 +198,27 @@ class UserActivity:
                 if info["status"] != UserStatus.ACTIVE
             }
 
-        if fetch_employee_info:
-            employee_emails = [
+        employee_emails = (
+            [
                 user_email
                 for user_email, info in user_statuses.items()
                 if info["is_employee"]
             ]
-            if employee_emails:
-                BugzillaUser(
-                    user_names=employee_emails,
-                    user_data=user_statuses,
-                    user_handler=lambda user, data: data[user["name"]].update(user),
-                    include_fields=self.include_fields + ["name"],
-                ).wait()
+            if fetch_employee_info
+            else []
+        )
+
+        # All the users are fetched at once
+        self.prefetch(user_emails)
+        self.bugzilla_users.prefetch(employee_emails, self.include_fields + ["name"])
+
+        if employee_emails:
+            users = self.bugzilla_users.get_users(
+                employee_emails, self.include_fields + ["name"]
+            )
+            for user_email, user in users.items():
+                if user is not None:
+                    user_statuses[user_email].update(user)
 
         if user_emails:
             user_statuses.update(
@@ -216,26 +269,17 @@ class UserActivity:
             the user info with the status.
         """
 
-        def handler(user, data):
+        users: dict = {}
+        for user in self.bugzilla_users.get_users(
+            id_or_name, ACTIVITY_FIELDS + self.include_fields
+        ).values():
+            if user is None:
+                continue
+
             status = self.get_status_from_bz_user(user)
             if keep_active or status != UserStatus.ACTIVE:
-                user["status"] = status
-                data[user["name"]] = user
-
-        users: dict = {}
-        BugzillaUser(
-            user_data=users,
-            user_names=id_or_name,
-            user_handler=handler,
-            include_fields=[
-                "name",
-                "can_login",
-                "last_activity_time",
-                "last_seen_date",
-                "creation_time",
-            ]
-            + self.include_fields,
-        ).wait()
+                # The profile is shared, so the status is set on a copy
+                users[user["name"]] = dict(user, status=status)
 
         return users
 
@@ -271,43 +315,53 @@ class UserActivity:
         """
 
         bzid_to_phid = {
-            int(user["id"]): user["phid"]
-            for _user_phids in Connection.chunks(user_phids, PHAB_CHUNK_SIZE)
-            for user in self._fetch_bz_user_ids(user_phids=_user_phids)
+            bz_id: phid
+            for phid, bz_id in self.phabricator_users.get_bz_ids(
+                user_phids,
+                lambda phids: self._fetch_bz_user_ids(user_phids=phids),
+                PHAB_CHUNK_SIZE,
+            ).items()
+            if bz_id is not None
         }
         if not bzid_to_phid:
             return {}
 
-        if "id" not in self.include_fields:
-            self.include_fields.append("id")
-
         user_bz_ids = list(bzid_to_phid.keys())
         users = self.get_bz_users_with_status(user_bz_ids, keep_active=True)
         users = {bzid_to_phid[user["id"]]: user for user in users.values()}
 
         # To cover cases where a person is temporary off (e.g., long PTO), we
         # will rely on the calendar from phab.
-        for _user_phids in Connection.chunks(user_phids, PHAB_CHUNK_SIZE):
-            for phab_user in self._fetch_phab_users(_user_phids):
-                user = users[phab_user["phid"]]
-                phab_status = self._get_status_from_phab_user(phab_user)
-                if phab_status:
-                    user["status"] = phab_status
-
-                elif user["status"] in (
-                    UserStatus.ABSENT,
-                    UserStatus.INACTIVE,
-                ) and self.is_active_on_phab(phab_user["phid"]):
-                    user["status"] = UserStatus.ACTIVE
-
-                if not keep_active and user["status"] == UserStatus.ACTIVE:
-                    del users[phab_user["phid"]]
-                    continue
-
-                user["phab_username"] = phab_user["fields"]["username"]
-                user["unavailable_until"] = phab_user["attachments"]["availability"][
-                    "until"
-                ]
+        phab_users = [
+            phab_user
+            for _user_phids in Connection.chunks(user_phids, PHAB_CHUNK_SIZE)
+            for phab_user in self._fetch_phab_users(_user_phids)
+            if phab_user["phid"] in users
+        ]
+        to_check = []
+        for phab_user in phab_users:
+            user = users[phab_user["phid"]]
+            phab_status = self._get_status_from_phab_user(phab_user)
+            if phab_status:
+                user["status"] = phab_status
+            elif user["status"] in (UserStatus.ABSENT, UserStatus.INACTIVE):
+                to_check.append(phab_user["phid"])
+
+        # The feeds of the users are checked all together, several at a time
+        for phid, is_active in self.are_active_on_phab(to_check).items():
+            if is_active:
+                users[phid]["status"] = UserStatus.ACTIVE
+
+        for phab_user in phab_users:
+            user = users[phab_user["phid"]]
+            if not keep_active and user["status"] == UserStatus.ACTIVE:
+                del users[phab_user["phid"]]
+                continue
+
+            user["phab_username"] = phab_user["fields"]["username"]
+            user["unavailable_until"] = phab_user["attachments"]["availability"][
+                "until"
+            ]
 
         return users
 
@@ -320,17 +374,28 @@ class UserActivity:
         Returns:
             True if the user is active on Phabricator, False otherwise.
         """
+        return self.are_active_on_phab([user_phid])[user_phid]
 
-        feed = self._get_phab().request(
-            "feed.query",
-            filterPHIDs=[user_phid],
-            limit=1,
-        )
-        for story in feed.values():
-            if story["epoch"] >= self.activity_limit_ts:
-                return True
+    def are_active_on_phab(self, user_phids: List[str]) -> dict:
+        """Check if the users have recent activities on Phabricator.
+
+        Args:
+            user_phids: A list of user PHIDs.
+
+        Returns:
+            A dictionary where the key is the user PHID and the value is True
+            if the user is active on Phabricator, False otherwise.
+        """
+        if not user_phids:
+            return {}
 
-        return False
+        epochs = self.phabricator_users.get_last_activities(
+            user_phids, self._fetch_last_activity
+        )
+        return {
+            phid: epoch is not None and epoch >= self.activity_limit_ts
+            for phid, epoch in epochs.items()
+        }
 
     def get_string_status(self, status: UserStatus):
         """Get a string representation of the user status."""
@@ -368,3 +433,15 @@ class UserActivity:
     )
     def _fetch_bz_user_ids(self, *args, **kwargs):
         return self._get_phab().load_bz_account(*args, **kwargs)
+
+    @retry(
+        wait=wait_exponential(min=4),
+        stop=stop_after_attempt(5),
+    )
+    def _fetch_last_activity(self, user_phid: str) -> Optional[float]:
+        feed = self._get_phab().request(
+            "feed.query",
+            filterPHIDs=[user_phid],
+            limit=1,
+        )
+        return max((story["epoch"] for story in feed.values()), default=None)
@@ -2,12 +2,14 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import contextvars
 import copy
 import datetime
 import json
 import os
 import random
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable, Union
 from urllib.parse import quote_plus, urlencode
 
@@ -17,10 +19,9 @@ import pytz
 import requests
 from dateutil.relativedelta import relativedelta
 from libmozdata import utils as lmdutils
-from libmozdata.bugzilla import Bugzilla, BugzillaShorten
+from libmozdata.bugzilla import Bugzilla
 from libmozdata.fx_trains import FirefoxTrains
 from libmozdata.hgmozilla import Mercurial
-from requests.exceptions import HTTPError
 
 from bugbot.constants import (
     BOT_MAIN_ACCOUNT,
@@ -186,25 +187,9 @@ def english_list(items):
 
 
 def shorten_long_bz_url(url):
-    if not url or len(url) <= MAX_URL_LENGTH:
-        return url
+    from bugbot.url_shortener import UrlShortener
 
-    # the url can be very long and line length are limited in email protocol:
-    # https://datatracker.ietf.org/doc/html/rfc5322#section-2.1.1
-    # So we need to generate a short URL.
-
-    def url_handler(u, data):
-        data["url"] = u
-
-    data = {}
-    try:
-        BugzillaShorten(url, url_data=data, url_handler=url_handler).wait()
-    except HTTPError:  # workaround for https://github.com/mozilla/bugbot/issues/1402
-        return "\n".join(
-            [url[i : i + MAX_URL_LENGTH] for i in range(0, len(url), MAX_URL_LENGTH)]
-        )
-
-    return data["url"]
+    return UrlShortener.get_instance().shorten(url)
 
 
 def get_cycle_span() -> str:
@@ -818,3 +803,11 @@ def get_bug_bugdash_url(component, tab_name: str) -> str:
     encoded_component = quote_plus(f"{component.product}:{component.name}")
 
     return f"https://bugdash.moz.tools/?component={encoded_component}#tab.{tab_name}"
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """A thread pool running each task in a copy of the context of the caller,
+    so the logs of the tasks keep the rule and the log level of the caller"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
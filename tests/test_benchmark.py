@@ -0,0 +1,100 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import tracemalloc
+
+import requests
+
+from bugbot import auto_mock, benchmark, utils
+from bugbot.bug.analyzer import BugsStore
+from bugbot.cache import get_cache_dir
+from bugbot.runner import RuleResult
+
+URL = "https://bugzilla.mozilla.org/rest/version"
+
+
+def _fake_run_rule(invocation):
+    try:
+        requests.get(URL).json()
+    except requests.exceptions.ConnectionError:
+        return RuleResult(invocation.module, False, 0.0)
+    return RuleResult(invocation.module, True, 0.0)
+
+
+def test_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(auto_mock, "MOCKS_DIR", str(tmp_path))
+    monkeypatch.setattr(benchmark, "run_rule", _fake_run_rule)
+
+    tracemalloc.start()
+    try:
+        # No mock file and no network
+        measure = benchmark.replay("no_assignee --date 2024-01-15")
+        assert not measure.success
+
+        path = auto_mock.MockTestCase()._build_path("GET", URL)
+        with open(path, "w") as Out:
+            json.dump({"status": 200, "headers": {}, "body": '{"version": 5}'}, Out)
+
+        measure = benchmark.replay("no_assignee --date 2024-01-15")
+    finally:
+        tracemalloc.stop()
+
+    assert measure.success
+    assert measure.requests == 1
+    assert measure.wall >= 0
+
+
+def test_replay_from_scratch(tmp_path, monkeypatch):
+    monkeypatch.setattr(auto_mock, "MOCKS_DIR", str(tmp_path))
+    cache_dirs = []
+
+    def run_rule(invocation):
+        assert BugsStore._instance is None
+        BugsStore.get_instance()
+        cache_dirs.append(get_cache_dir())
+        return RuleResult(invocation.module, True, 0.0)
+
+    monkeypatch.setattr(benchmark, "run_rule", run_rule)
+    cache = utils.get_config("common", "cache")
+
+    tracemalloc.start()
+    try:
+        benchmark.replay("no_assignee --date 2024-01-15")
+        benchmark.replay("no_assignee --date 2024-01-15")
+    finally:
+        tracemalloc.stop()
+
+    assert cache_dirs[0] != cache_dirs[1]
+    assert not any(os.path.exists(path) for path in cache_dirs)
+    assert utils.get_config("common", "cache") == cache
+    assert BugsStore._instance is None
+
+
+def test_get_invocation():
+    invocation = benchmark.get_invocation("workflow.p1 --production -D 2024-01-15")
+    assert invocation.module == "bugbot.rules.workflow.p1"
+    assert invocation.args == ["-D", "2024-01-15"]
+
+
+def test_compare():
+    baseline = {
+        "a": {"wall": 1.0, "cpu": 1.0, "peak_memory": 1000, "requests": 10},
+        "b": {"wall": 1.0, "cpu": 1.0, "peak_memory": 1000, "requests": 10},
+    }
+    thresholds = {"wall": 0.25, "requests": 0}
+    measures = [
+        benchmark.Measure("a", True, 1.2, 3.0, 5000, 10),
+        benchmark.Measure("b", True, 1.3, 1.0, 1000, 11),
+        benchmark.Measure("c", True, 10.0, 10.0, 1000, 100),
+        benchmark.Measure("d", False, 1.0, 1.0, 1000, 1),
+    ]
+
+    regressions = benchmark.compare(measures, baseline, thresholds)
+    assert [regression.split(":")[0:2] for regression in regressions] == [
+        ["b", " wall 1 -> 1.3 (threshold +25%)"],
+        ["b", " requests 10 -> 11 (threshold +0%)"],
+        ["d", " failed"],
+    ]
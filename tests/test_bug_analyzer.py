@@ -1,6 +1,29 @@
+from bugbot.bug import analyzer
 from bugbot.bug.analyzer import BugsStore, VersionStatus
 
 
+class FakeBugzilla:
+    """Serve bugs from a dictionary and record the requests"""
+
+    BUGS = {
+        1: {"id": 1, "status": "NEW", "assigned_to": "a@mozilla.com", "groups": []},
+        2: {"id": 2, "status": "FIXED", "assigned_to": "b@mozilla.com", "groups": []},
+    }
+    requests: list = []
+
+    def __init__(self, bugids, bughandler, include_fields):
+        FakeBugzilla.requests.append((sorted(bugids), include_fields))
+        for bug_id in bugids:
+            bug = FakeBugzilla.BUGS[bug_id]
+            if include_fields is None:
+                bughandler(dict(bug))
+            else:
+                bughandler({k: v for k, v in bug.items() if k in include_fields})
+
+    def wait(self):
+        pass
+
+
 def test_set_status_flags():
     all_bugs = [
         {
@@ -79,3 +102,74 @@ def test_set_status_flags():
         VersionStatus(channel="esr", version=2, status="unaffected"),
         VersionStatus(channel="esr", version=3, status="affected"),
     ]
+
+
+def test_fetch_only_missing_bugs_and_fields(monkeypatch):
+    monkeypatch.setattr(analyzer, "Bugzilla", FakeBugzilla)
+    monkeypatch.setattr(FakeBugzilla, "requests", [])
+    store = BugsStore()
+
+    bugs = store.get_bugs([1], ["id", "status"])
+    assert bugs == {1: {"id": 1, "status": "NEW"}}
+    assert FakeBugzilla.requests == [([1], ["id", "status"])]
+
+    # Already known: no request
+    store.get_bugs([1], ["status"])
+    assert len(FakeBugzilla.requests) == 1
+
+    # Only the missing field for the known bug, and the whole set for the new one
+    bugs = store.get_bugs([1, 2], ["id", "status", "assigned_to"])
+    assert bugs[1] == {"id": 1, "status": "NEW", "assigned_to": "a@mozilla.com"}
+    assert bugs[2] == {"id": 2, "status": "FIXED", "assigned_to": "b@mozilla.com"}
+    assert sorted(FakeBugzilla.requests[1:]) == [
+        ([1], ["assigned_to", "id"]),
+        ([2], ["assigned_to", "id", "status"]),
+    ]
+
+    # The default fields are never assumed to be known
+    store.get_bugs([1])
+    assert FakeBugzilla.requests[-1] == ([1], None)
+    store.get_bugs([1], ["groups"])
+    assert len(FakeBugzilla.requests) == 4
+
+    # The returned data are copies
+    store.get_bugs([2], ["status"])[2]["status"] = "REOPENED"
+    assert store.get_bug_by_id(2).get_field("status") == "FIXED"
+
+
+def test_invalidate_and_expire(monkeypatch):
+    monkeypatch.setattr(analyzer, "Bugzilla", FakeBugzilla)
+    monkeypatch.setattr(FakeBugzilla, "requests", [])
+
+    store = BugsStore()
+    store.get_bugs([1, 2], ["status"])
+    store.invalidate(["1"])
+    store.get_bugs([1, 2], ["status"])
+    assert FakeBugzilla.requests[-1] == ([1], ["id", "status"])
+
+    store = BugsStore(max_age=0)
+    store.get_bugs([1], ["status"])
+    store.get_bugs([1], ["status"])
+    assert FakeBugzilla.requests[-2:] == [([1], ["id", "status"])] * 2
+
+
+def test_evict_oldest_bugs(monkeypatch):
+    monkeypatch.setattr(analyzer, "Bugzilla", FakeBugzilla)
+    monkeypatch.setattr(FakeBugzilla, "requests", [])
+
+    store = BugsStore(max_bugs=1)
+    # The bugs fetched together are returned even if they don't fit
+    assert store.get_bugs([1, 2], ["status"]).keys() == {1, 2}
+    assert len(store.bugs) == 1
+
+    store.add_bug({"id": 3, "status": "NEW"})
+    assert list(store.bugs) == [3]
+
+    # The expired bugs are removed when a bug is added
+    now = [0.0]
+    monkeypatch.setattr(analyzer.time, "monotonic", lambda: now[0])
+    store = BugsStore(max_age=10)
+    store.add_bug({"id": 1, "status": "NEW"})
+    now[0] = 20
+    store.add_bug({"id": 2, "status": "NEW"})
+    assert list(store.bugs) == [2]
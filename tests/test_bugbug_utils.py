@@ -0,0 +1,96 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot import bugbug_utils
+from bugbot.bugbug_utils import PredictionCache, classify_bugs
+
+
+class FakeService:
+    """Classify a bug after it was requested `delay` times"""
+
+    def __init__(self, delay=1):
+        self.delay = delay
+        self.requests = []
+        self.counts = {}
+
+    def __call__(self, url, bug_ids):
+        self.requests.append(list(bug_ids))
+        res = {}
+        for bug_id in bug_ids:
+            self.counts[bug_id] = self.counts.get(bug_id, 0) + 1
+            if self.counts[bug_id] > self.delay:
+                res[str(bug_id)] = {"prob": [0.0, 1.0]}
+            else:
+                res[str(bug_id)] = {"ready": False}
+        return {"bugs": res}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(bugbug_utils.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(bugbug_utils.time, "sleep", sleep)
+    return sleeps
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = PredictionCache(str(tmp_path / "predictions.sqlite"))
+    monkeypatch.setattr(PredictionCache, "_instance", cache)
+    return cache
+
+
+def test_classify_bugs(clock, cache, monkeypatch):
+    service = FakeService(delay=2)
+    monkeypatch.setattr(bugbug_utils, "classification_http_request", service)
+
+    res = dict(classify_bugs("regression", [1, 2, 3], batch_size=2, min_sleep=1))
+    assert res == {str(bug_id): {"prob": [0.0, 1.0]} for bug_id in (1, 2, 3)}
+
+    # All the batches are submitted before waiting
+    assert service.requests[:2] == [[1, 2], [3]]
+    assert len(service.requests) == 6
+    assert clock == [1, 2]
+
+
+def test_classify_bugs_timeout(clock, cache, monkeypatch):
+    service = FakeService(delay=100)
+    monkeypatch.setattr(bugbug_utils, "classification_http_request", service)
+
+    with pytest.raises(Exception, match="Couldn't get 2 bug classifications"):
+        list(classify_bugs("regression", [1, 2], timeout=30, max_sleep=10))
+
+    assert clock == [1, 2, 4, 8, 10]
+
+
+def test_classify_bugs_cached(clock, cache, monkeypatch):
+    service = FakeService(delay=0)
+    monkeypatch.setattr(bugbug_utils, "classification_http_request", service)
+
+    bugs = {
+        "1": {"id": "1", "last_change_time": "2024-01-01T00:00:00Z"},
+        "2": {"id": "2", "last_change_time": "2024-01-01T00:00:00Z"},
+    }
+    assert len(dict(classify_bugs("regression", bugs))) == 2
+    assert service.requests == [[1, 2]]
+
+    # Only the bug which changed is classified again
+    bugs["2"]["last_change_time"] = "2024-01-02T00:00:00Z"
+    assert dict(classify_bugs("regression", bugs)) == {
+        "1": {"prob": [0.0, 1.0]},
+        "2": {"prob": [0.0, 1.0]},
+    }
+    assert service.requests == [[1, 2], [2]]
+
+    # The predictions are saved by model
+    dict(classify_bugs("spambug", bugs))
+    assert service.requests == [[1, 2], [2], [1, 2]]
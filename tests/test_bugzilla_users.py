@@ -0,0 +1,134 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot import bugzilla_users
+from bugbot.bugzilla_users import BugzillaUsers
+
+PROFILES = {
+    "a@mozilla.com": {"id": 1, "nick": "a", "can_login": True},
+    "b@mozilla.com": {"id": 2, "nick": "b", "can_login": False},
+}
+
+
+class FakeBugzillaUser:
+    calls: list = []
+    failing = False
+
+    def __init__(self, user_names, include_fields, user_handler, **kwargs):
+        FakeBugzillaUser.calls.append(sorted(user_names, key=str))
+        if FakeBugzillaUser.failing:
+            return
+
+        keys = {str(name).lower() for name in user_names}
+        for name, profile in PROFILES.items():
+            if name in keys or str(profile["id"]) in keys:
+                keys -= {name, str(profile["id"])}
+                user = dict(profile, name=name, email=name)
+                user = {
+                    field: value
+                    for field, value in user.items()
+                    if field in include_fields
+                }
+                user_handler(user, kwargs["user_data"])
+
+        for key in keys:
+            fault = {"id": int(key)} if key.isdigit() else {"name": key}
+            kwargs["fault_user_handler"](fault, kwargs["user_data"])
+
+    def wait(self):
+        pass
+
+
+@pytest.fixture
+def users(tmp_path, monkeypatch):
+    monkeypatch.setattr(bugzilla_users, "BugzillaUser", FakeBugzillaUser)
+    monkeypatch.setattr(FakeBugzillaUser, "calls", [])
+    monkeypatch.setattr(FakeBugzillaUser, "failing", False)
+    return BugzillaUsers(str(tmp_path / "users.sqlite"), ttl=60, negative_ttl=10)
+
+
+def test_prefetch(users):
+    users.prefetch(["a@mozilla.com", "b@mozilla.com", "c@mozilla.com"])
+    assert users.get_nick("a@mozilla.com") == "a"
+    assert users.get_nick("B@mozilla.com") == "b"
+    assert users.get_user("c@mozilla.com") is None
+    assert users.get_nick("b@mozilla.com") == "b"
+
+    assert FakeBugzillaUser.calls == [
+        ["a@mozilla.com", "b@mozilla.com", "c@mozilla.com"],
+        ["B@mozilla.com"],
+    ]
+
+
+def test_saved_between_runs(users, monkeypatch):
+    users.get_users(["a@mozilla.com", "c@mozilla.com"])
+
+    other = BugzillaUsers(users.path, ttl=60, negative_ttl=10)
+    assert other.get_users(["a@mozilla.com", "c@mozilla.com"]) == {
+        "a@mozilla.com": {
+            "id": 1,
+            "nick": "a",
+            "name": "a@mozilla.com",
+            "email": "a@mozilla.com",
+        },
+        "c@mozilla.com": None,
+    }
+    assert len(FakeBugzillaUser.calls) == 1
+
+    # The profiles are fetched again once they are too old
+    now = bugzilla_users.time.time()
+    monkeypatch.setattr(bugzilla_users.time, "time", lambda: now + 61)
+    other = BugzillaUsers(users.path, ttl=60)
+    assert other.get_nick("a@mozilla.com") == "a"
+    assert len(FakeBugzillaUser.calls) == 2
+
+
+def test_ids_and_fields(users):
+    assert users.get_user(2)["nick"] == "b"
+    assert users.get_nick("b@mozilla.com") == "b"
+    assert len(FakeBugzillaUser.calls) == 1
+
+    # The missing fields are fetched and merged with the saved ones
+    assert users.get_users(["b@mozilla.com"], ["name", "can_login"]) == {
+        "b@mozilla.com": {
+            "id": 2,
+            "nick": "b",
+            "name": "b@mozilla.com",
+            "email": "b@mozilla.com",
+            "can_login": False,
+        }
+    }
+    assert FakeBugzillaUser.calls == [[2], ["b@mozilla.com"]]
+
+    other = BugzillaUsers(users.path, ttl=60)
+    assert other.get_users(["2"], ["can_login", "nick"])["2"]["can_login"] is False
+    assert len(FakeBugzillaUser.calls) == 2
+
+
+def test_unknown_users(users, monkeypatch):
+    assert users.get_users(["a@mozilla.com", "c@mozilla.com"])["c@mozilla.com"] is None
+    assert users.is_unknown("c@mozilla.com")
+
+    # The unknown users are requested again sooner than the known ones
+    now = bugzilla_users.time.time()
+    monkeypatch.setattr(bugzilla_users.time, "time", lambda: now + 11)
+    other = BugzillaUsers(users.path, ttl=60, negative_ttl=10)
+    other.get_users(["a@mozilla.com", "c@mozilla.com"])
+    assert FakeBugzillaUser.calls == [
+        ["a@mozilla.com", "c@mozilla.com"],
+        ["c@mozilla.com"],
+    ]
+
+
+def test_failed_request(users):
+    FakeBugzillaUser.failing = True
+    assert users.get_user("a@mozilla.com") is None
+    assert not users.is_unknown("a@mozilla.com")
+
+    # Nothing is saved, so the user is requested again
+    FakeBugzillaUser.failing = False
+    assert users.get_nick("a@mozilla.com") == "a"
+    assert len(FakeBugzillaUser.calls) == 2
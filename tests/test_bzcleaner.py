@@ -1,7 +1,11 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
-from bugbot import utils
+from libmozdata.bugzilla import Bugzilla
+
+from bugbot import bzcleaner, db, utils
+from bugbot.bug import analyzer
+from bugbot.bug.analyzer import BugsStore
 from bugbot.bzcleaner import BzCleaner
 from bugbot.rules.inactive_ni_pending import InactiveNeedinfoPending
 
@@ -73,3 +77,141 @@ def test_inactive_needinfo_get_bz_params():
 
 def test_inactive_needinfo_ignore_date():
     assert not InactiveNeedinfoPending().ignore_date()
+
+
+class FakeBugzilla:
+    """Record the PUT requests and make the bug 666 fail"""
+
+    puts: list = []
+
+    def __init__(self, bugids):
+        self.bugids = bugids
+
+    def put(self, data):
+        FakeBugzilla.puts.append((sorted(self.bugids), data))
+        return [bugid for bugid in self.bugids if bugid == "666"]
+
+
+def test_apply_changes_on_bugzilla(monkeypatch):
+    added = []
+    monkeypatch.setattr(FakeBugzilla, "puts", [])
+    monkeypatch.setattr(bzcleaner, "Bugzilla", FakeBugzilla)
+    monkeypatch.setattr(
+        db.BugChange, "add_many", lambda tool, changes: added.extend(changes)
+    )
+    monkeypatch.setattr(
+        utils,
+        "get_config",
+        lambda name, entry, default=None: (
+            2 if entry == "bugzilla_max_retries" else default
+        ),
+    )
+    monkeypatch.setattr(bzcleaner, "wait_random_exponential", lambda **kwargs: None)
+
+    change = {"status": "RESOLVED", "resolution": "FIXED"}
+    BzCleaner.apply_changes_on_bugzilla(
+        "rule",
+        {
+            "1": dict(change),
+            "2": dict(change),
+            "666": dict(change),
+            "3": {"priority": "P1"},
+        },
+        is_dryrun=False,
+        db_extra={"3": "foo"},
+    )
+
+    puts = sorted(FakeBugzilla.puts)
+    assert puts == [
+        (["1", "2", "666"], change),
+        (["3"], {"priority": "P1"}),
+        (["666"], change),
+    ]
+    assert sorted(added) == [("1", ""), ("2", ""), ("3", "foo")]
+
+
+class FakeCountBugzilla:
+    API_URL = "https://bugzilla.mozilla.org/rest/bug"
+
+    def __init__(self, queries, timeout=None):
+        for query in queries:
+            assert query.params["count_only"] == 1
+            query.handler({"bug_count": 250}, query.handlerdata)
+
+    def wait(self):
+        pass
+
+
+def test_paginate(monkeypatch):
+    monkeypatch.setattr(bzcleaner, "Bugzilla", FakeCountBugzilla)
+    chunk_size = Bugzilla.BUGZILLA_CHUNK_SIZE
+
+    pages = BzCleaner()._paginate({"f1": "bug_id"}, 100)
+    assert [(page["limit"], page["offset"]) for page in pages] == [
+        (100, 0),
+        (100, 100),
+        (100, 200),
+    ]
+    assert all(page["order"] == "bug_id" for page in pages)
+    # The global chunk size of libmozdata is not changed
+    assert Bugzilla.BUGZILLA_CHUNK_SIZE == chunk_size
+
+    # The searches which are already paginated are not changed
+    assert BzCleaner()._paginate({"limit": 10}, 100) == [{"limit": 10}]
+
+
+class FakeSearchBugzilla:
+    BUGS = [
+        {"id": 1, "status": "NEW", "summary": "foo", "groups": []},
+        {"id": 2, "status": "FIXED", "summary": "bar", "groups": []},
+    ]
+
+    def __init__(self, queries, bughandler, bugdata, timeout=None):
+        self.bughandler = bughandler
+        self.bugdata = bugdata
+
+    def get_data(self):
+        for bug in FakeSearchBugzilla.BUGS:
+            self.bughandler(dict(bug), self.bugdata)
+        return self
+
+    def wait(self):
+        pass
+
+
+def test_search_bugs_feeds_the_store(monkeypatch):
+    store = BugsStore()
+    monkeypatch.setattr(BugsStore, "_instance", store)
+    monkeypatch.setattr(bzcleaner, "Bugzilla", FakeSearchBugzilla)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the bugs must not be fetched again")
+
+    monkeypatch.setattr(analyzer, "Bugzilla", fail)
+
+    rule = BzCleaner()
+    monkeypatch.setattr(
+        rule,
+        "get_config",
+        lambda entry, default=None: True if entry == "share_bugs" else default,
+    )
+    bugs = {}
+    rule._search_bugs({"include_fields": ["id", "status", "summary", "groups"]}, bugs)
+
+    assert set(bugs) == {"1", "2"}
+    bugs = store.get_bugs([1, 2], ["status"])
+    assert {bug_id: bug["status"] for bug_id, bug in bugs.items()} == {
+        1: "NEW",
+        2: "FIXED",
+    }
+
+
+def test_share_bugs_with_the_store_readers():
+    # The rules reading bugs through the shared store feed it with their bugs
+    for rule in [
+        "needinfo_regression_author",
+        "regression_set_status_flags",
+        "perfalert_inactive_regression",
+        "file_crash_bug",
+    ]:
+        assert utils.get_config(rule, "share_bugs", False)
@@ -3,15 +3,18 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import json
+import os
+import time
 
 from dateutil.relativedelta import relativedelta
 from libmozdata import utils as lmdutils
 
-from bugbot.cache import Cache
+from bugbot import cache as cache_module
+from bugbot.cache import Cache, SQLiteCacheBackend, SQLiteCacheEntries, SQLiteStore
 
 
-def test_cache():
-    cache = Cache("test_cache", 7)
+def test_cache_json():
+    cache = Cache("test_cache", 7, backend="json")
     cache.set_dry_run(False)
 
     bugids = [123, 456, 789]
@@ -35,9 +38,91 @@ def test_cache():
     with open(cache.get_path(), "w") as Out:
         json.dump(data, Out)
 
-    cache = Cache("test_cache", 7)
+    cache = Cache("test_cache", 7, backend="json")
     cache.set_dry_run(False)
 
     assert 123 not in cache
     assert 456 not in cache
     assert 789 in cache
+
+
+def test_cache_sqlite(monkeypatch):
+    today = SQLiteCacheBackend._today()
+    cache = Cache("test_cache_sqlite", 7, backend="sqlite")
+    cache.set_dry_run(False)
+
+    bugids = [123, 456, 789]
+    cache.add(bugids)
+
+    for bugid in bugids:
+        assert bugid in cache
+        assert str(bugid) in cache
+
+    assert 101112 not in cache
+    assert "101112" not in cache
+
+    # Only the first call to add() writes to the cache
+    cache.add([101112])
+    assert 101112 not in cache
+
+    other = Cache("other_test_cache_sqlite", 7, backend="sqlite")
+    other.set_dry_run(False)
+    assert 123 not in other
+
+    assert os.path.basename(cache.get_path()) == SQLiteCacheEntries.FILENAME
+
+    monkeypatch.setattr(SQLiteCacheBackend, "_today", staticmethod(lambda: today + 3))
+    cache = Cache("test_cache_sqlite", 7, backend="sqlite")
+    cache.set_dry_run(False)
+    cache.add([789])
+
+    monkeypatch.setattr(SQLiteCacheBackend, "_today", staticmethod(lambda: today + 8))
+    assert 123 not in cache
+    assert 456 not in cache
+    assert 789 in cache
+
+
+def test_cache_sqlite_imports_json():
+    cache = Cache("test_cache_import", 7, backend="json")
+    cache.set_dry_run(False)
+    cache.add([123, 456])
+    path = cache.get_path()
+
+    cache = Cache("test_cache_import", 7, backend="sqlite")
+    cache.set_dry_run(False)
+    assert 123 in cache
+    assert 456 in cache
+    assert 789 not in cache
+    assert not os.path.exists(path)
+
+
+class Store(SQLiteStore):
+    FILENAME = "store.sqlite"
+    SCHEMA = ["CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, created REAL)"]
+    EXPIRES = {"rows": "created"}
+
+
+class OtherStore(Store):
+    FILENAME = "other_store.sqlite"
+
+
+def test_sqlite_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "get_cache_dir", lambda: str(tmp_path))
+    monkeypatch.setattr(Store, "_instance", None)
+    monkeypatch.setattr(OtherStore, "_instance", None)
+
+    store = Store.get_instance()
+    assert Store.get_instance() is store
+    assert store.path == str(tmp_path / Store.FILENAME)
+    assert isinstance(OtherStore.get_instance(), OtherStore)
+
+    now = time.time()
+    store.db.executemany(
+        "INSERT INTO rows (key, created) VALUES (?, ?)",
+        [("old", now - 20), ("new", now)],
+    )
+    store.db.commit()
+
+    # The expired rows are removed when the database is opened
+    other = Store(store.path, max_age=10)
+    assert [key for (key,) in other.db.execute("SELECT key FROM rows")] == ["new"]
@@ -4,6 +4,9 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import recurring_ical_events
+from libmozdata import utils as lmdutils
+
 from bugbot.people import People
 from bugbot.round_robin_calendar import ICSCalendar
 
@@ -49,3 +52,30 @@ def test_recurring_event():
 
     assert calendar.get_persons("2022-12-01") == [("Gregory Mierzwinski", None)]
     assert calendar.get_persons("2023-02-28") == [("Gregory Mierzwinski", None)]
+
+
+def test_expanded_once_per_year(monkeypatch):
+    """Test that the events are expanded once per year."""
+    calendar = ICSCalendar.get(
+        "tests/data/DOM_LWS_calendar.ics",
+        "lws.fallback.triager@mozilla.tld",
+        "DOM LWS",
+        people=People([]),
+    )
+    calls = []
+    of = recurring_ical_events.of
+
+    def counted_of(cal):
+        calls.append(cal)
+        return of(cal)
+
+    monkeypatch.setattr(recurring_ical_events, "of", counted_of)
+
+    for date in ["2023-03-11", "2023-03-25", "2023-03-30", "2023-01-01"]:
+        expected = of(calendar.cal).between(
+            lmdutils.get_date_ymd(date), lmdutils.get_date_ymd(date)
+        )
+        assert calendar.get_persons(date) == [
+            (calendar.get_person(event["SUMMARY"]), None) for event in expected
+        ]
+    assert len(calls) == 1
@@ -0,0 +1,88 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot.crash import signature_index
+from bugbot.crash.signature_index import CrashSignatureIndex
+
+
+class FakeBugzilla:
+    API_URL = "https://bugzilla.mozilla.org/rest/bug"
+    bugs: list = []
+    queries: list = []
+
+    def __init__(self, timeout, queries):
+        for query in queries:
+            params = query.params
+            FakeBugzilla.queries.append(params)
+            since = params.get("last_change_time", "")
+            n = next(k[1:] for k, v in params.items() if v == "bug_id" and k[0] == "f")
+            bugs = [
+                bug
+                for bug in sorted(FakeBugzilla.bugs, key=lambda bug: bug["id"])
+                if bug["id"] > params[f"v{n}"]
+                and bug["last_change_time"] >= since
+                and (since or bug["cf_crash_signature"])
+            ]
+            query.handler({"bugs": bugs[: params["limit"]]}, query.handlerdata)
+
+    def wait(self):
+        pass
+
+
+def make_bug(bug_id, signature, last_change_time="2024-01-01T00:00:00Z"):
+    return {
+        "id": bug_id,
+        "cf_crash_signature": signature,
+        "status": "NEW",
+        "resolution": "",
+        "last_change_time": last_change_time,
+    }
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(signature_index, "Bugzilla", FakeBugzilla)
+    monkeypatch.setattr(CrashSignatureIndex, "PAGE_SIZE", 2)
+    FakeBugzilla.bugs = [
+        make_bug(1, "[@ foo]"),
+        make_bug(2, "[@ foo ]\n[@bar]"),
+        make_bug(3, ""),
+        make_bug(4, "[@ baz]"),
+    ]
+    FakeBugzilla.queries = []
+    return CrashSignatureIndex(str(tmp_path / "index.sqlite"), refresh_interval=0)
+
+
+def test_get_bugs(index):
+    bugs = index.get_bugs(["foo", "bar", "qux"])
+    assert {
+        signature: [bug["id"] for bug in bugs[signature]] for signature in bugs
+    } == {
+        "foo": [1, 2],
+        "bar": [2],
+    }
+    # The index is built page by page
+    assert [query["v2"] for query in FakeBugzilla.queries] == [0, 2]
+
+
+def test_refresh(index):
+    index.refresh()
+    FakeBugzilla.queries = []
+
+    FakeBugzilla.bugs[0] = make_bug(1, "", "2024-01-02T00:00:00Z")
+    FakeBugzilla.bugs[2] = make_bug(3, "[@ foo]", "2024-01-02T00:00:00Z")
+
+    bugs = index.get_bugs(["foo"])
+    assert [bug["id"] for bug in bugs["foo"]] == [2, 3]
+    # Only the changed bugs are fetched
+    assert FakeBugzilla.queries[0]["last_change_time"] == "2024-01-01T00:00:00Z"
+    assert "isnotempty" not in FakeBugzilla.queries[0].values()
+
+    # The index is not updated again before the refresh interval
+    count = len(FakeBugzilla.queries)
+    other = CrashSignatureIndex(index.path, refresh_interval=3600)
+    assert [bug["id"] for bug in other.get_bugs(["foo"])["foo"]] == [2, 3]
+    assert len(FakeBugzilla.queries) == count
@@ -39,7 +39,7 @@ def test_bugchange():
 
     data = _by_rule(HISTORY)
     for tool, info in data.items():
-        _data = db.BugChange.get(name=tool).order_by(db.BugChange.date.asc())
+        _data = db.BugChange.get(name=tool)
         _data = list(_data)
         assert len(_data) == len(info)
 
@@ -54,7 +54,7 @@ def test_bugchange():
     db.BugChange.add("A", 123, ts=123456789, extra="")
     db.BugChange.add("A", 456, ts=123456789, extra="B")
 
-    data = db.BugChange.get(name="A").order_by(db.BugChange.bugid.asc())
+    data = db.BugChange.get(name="A")
     data = list(data)
 
     exp = [
@@ -80,7 +80,7 @@ def test_email():
 
     db.Email.import_from_dict(EMAILS)
 
-    data = db.Email.get().order_by(db.Email.date.asc())
+    data = db.Email.get()
     data = list(data)
 
     assert len(data) == len(EMAILS)
@@ -132,3 +132,142 @@ def test_email():
 
         got_extra = got.extra.extra if got.extra else ""
         assert expected["extra"] == got_extra
+
+
+def test_bugchange_add_many():
+    db.BugChange.add_many("M", [(123, ""), ("456", "N")], ts=123456789)
+
+    data = db.BugChange.get(name="M")
+    got = [
+        (x.tool.name, x.bugid, x.date, x.extra.extra if x.extra else "") for x in data
+    ]
+
+    assert got == [("M", 123, 123456789, ""), ("M", 456, 123456789, "N")]
+
+
+def test_email_add_many():
+    db.Email.add_many(
+        [("O", ["P", "Q"], "", "Success"), ("R", ["P"], "S", "Failure")],
+        ts=123456789,
+    )
+
+    data = db.Email.get(start_date=123456789, end_date=123456790)
+    got = sorted(
+        (x.tool.name, x.user.email, x.extra.extra if x.extra else "", x.result)
+        for x in data
+        if x.tool.name in ("O", "R")
+    )
+
+    assert got == [("O", "P", "", 1), ("O", "Q", "", 1), ("R", "P", "S", 0)]
+    assert db.User.get_id("P") == db.User.get_or_create("P").id
+    assert ("autonag_users", "P") in db._ids
+
+
+def test_add_at_call_time(monkeypatch):
+    monkeypatch.setattr(db.lmdutils, "get_timestamp", lambda date: 987654321)
+    db.BugChange.add("AT", 123)
+    db.Email.add("AT", ["AU"], "", "Success")
+
+    end_date = 987654322
+    assert [x.date for x in db.BugChange.get(name="AT", end_date=end_date)] == [
+        987654321
+    ]
+    assert [x.date for x in db.Email.get(name="AT", end_date=end_date)] == [987654321]
+
+
+def test_get_runs_the_query():
+    db.BugChange.add_many("AV", [(123, "AW")], ts=123456789)
+    db.Email.add_many([("AV", ["AX"], "AY", "Success")], ts=123456789)
+
+    changes = db.BugChange.get(name="AV")
+    emails = db.Email.get(name="AV")
+    # The results don't need the session anymore
+    db.session.remove()
+
+    assert [(x.tool.name, x.bugid, x.extra.extra) for x in changes] == [
+        ("AV", 123, "AW")
+    ]
+    assert [(x.tool.name, x.user.email, x.extra.extra) for x in emails] == [
+        ("AV", "AX", "AY")
+    ]
+
+
+def test_bugchange_get_nagged():
+    db.BugChange.add_many("T", [(bugid, "") for bugid in range(1000, 1600, 2)], ts=100)
+    db.BugChange.add_many("U", [(1001, "")], ts=100)
+
+    bugids = list(range(1000, 1600))
+    nagged = db.BugChange.get_nagged(bugids, name="T", start_date=50, end_date=150)
+    assert nagged == set(range(1000, 1600, 2))
+
+    assert db.BugChange.get_nagged([1000, 1001], start_date=50, end_date=150) == {
+        1000,
+        1001,
+    }
+    assert not db.BugChange.get_nagged(bugids, name="T", start_date=150)
+    assert not db.BugChange.get_nagged(bugids, name="Unknown tool")
+
+    assert db.BugChange.has_already_nagged(
+        ["1000", 1001], name="T", start_date=50, end_date=150
+    ) == {1000: True, 1001: False}
+
+
+def test_email_has_already_nagged():
+    db.Email.add("V", ["W"], "", "Success", ts=100)
+
+    assert db.Email.has_already_nagged(name="V", start_date=50, end_date=150)
+    assert not db.Email.has_already_nagged(name="V", start_date=150)
+    assert not db.Email.has_already_nagged(name="Unknown tool")
+
+
+def test_init_incremental(monkeypatch):
+    db.session.query(db.HistorySync).delete()
+    db.session.query(db.BugChange).delete()
+    db.session.commit()
+    calls = []
+    history = [
+        {"tool": "X", "date": 990, "bugid": 1, "extra": ""},
+        {"tool": "X", "date": 1990, "bugid": 2, "extra": ""},
+    ]
+
+    class FakeHistory:
+        def get(self, since=None, until=None):
+            calls.append((since, until))
+            return [
+                change
+                for change in history
+                if (since is None or change["date"] >= since) and change["date"] < until
+            ]
+
+    def get_changes():
+        return [
+            (x.tool.name, x.bugid, x.date, x.extra.extra if x.extra else "")
+            for x in db.BugChange.get(end_date=10000)
+        ]
+
+    monkeypatch.setattr(db, "History", FakeHistory)
+    now = [1000]
+    monkeypatch.setattr(db.lmdutils, "get_timestamp", lambda date: now[0])
+
+    # The changes already added by the rules are not duplicated
+    db.BugChange.add("X", 1, ts=990)
+    assert db.HistorySync.get_date() is None
+    db.init()
+    assert get_changes() == [("X", 1, 990, "")]
+
+    now[0] = 2000
+    db.init()
+    assert calls == [(None, 1000), (1000, 2000)]
+    assert db.HistorySync.get_date() == 2000
+    assert get_changes() == [("X", 1, 990, ""), ("X", 2, 1990, "")]
+
+    # The changes of the tools which can't be guessed from the history are
+    # kept with their extras
+    db.BugChange.add("Unguessable", 3, ts=1500, extra="Core::General")
+    db.init(incremental=False)
+    assert calls[-1] == (None, 2000)
+    assert get_changes() == [
+        ("X", 1, 990, ""),
+        ("Unguessable", 3, 1500, "Core::General"),
+        ("X", 2, 1990, ""),
+    ]
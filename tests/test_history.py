@@ -0,0 +1,70 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot.history import (
+    COMMENT_CLASSIFIER,
+    COMMENT_SIGNATURES,
+    CommentClassifier,
+    History,
+)
+
+
+@pytest.mark.parametrize("kind, text, tool", COMMENT_SIGNATURES)
+def test_classify_comment(kind, text, tool):
+    comment = text + " 7 days." if kind == "prefix" else f"Hello.\n{text} release."
+    assert COMMENT_CLASSIFIER.classify(comment) == tool
+    assert COMMENT_CLASSIFIER.classify("Hi. " + comment) == (
+        tool if kind == "substring" else None
+    )
+
+
+def test_classify_priority():
+    classifier = CommentClassifier(
+        [
+            ("prefix", "Moving to p3", "old_p2_bug"),
+            ("substring", "tracked", "tracking"),
+            ("prefix", "Moving to", "other"),
+        ]
+    )
+    assert classifier.classify("Moving to p3, tracked") == "old_p2_bug"
+    assert classifier.classify("Moving to p2, tracked") == "tracking"
+    assert classifier.classify("Moving to p2") == "other"
+    assert classifier.classify("Moving") is None
+
+    classifier.add("prefix", "Mov", "new_rule")
+    assert classifier.classify("Moving") == "new_rule"
+    with pytest.raises(ValueError):
+        classifier.add("suffix", "bug", "bad")
+
+
+def _get_data(n):
+    comments = [text for _, text, _ in COMMENT_SIGNATURES] + ["Unknown comment"]
+    return {
+        str(bugid): {
+            "2023-01-01T00:00:00Z": {"comment": comments[bugid % len(comments)]},
+            "2023-01-02T00:00:00Z": {
+                "changes": [{"field_name": "keywords", "added": "regression"}]
+            },
+        }
+        for bugid in range(n)
+    }
+
+
+def test_guess_tool_in_processes(monkeypatch):
+    monkeypatch.setattr(History, "CHUNK_SIZE", 5)
+    history = History()
+    expected = history.guess_tool(_get_data(40), processes=1)
+    assert len(expected) == 40 + 40 - 40 // (len(COMMENT_SIGNATURES) + 1)
+    assert history.guess_tool(_get_data(40), processes=2) == expected
+
+
+def test_in_period():
+    when = "2023-11-14T22:13:20Z"
+    assert History.in_period(when)
+    assert History.in_period(when, since=1700000000)
+    assert not History.in_period(when, since=1700000001)
+    assert History.in_period(when, until=1700000001)
+    assert not History.in_period(when, since=1600000000, until=1700000000)
@@ -0,0 +1,113 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+from requests import Request, Response
+from requests.adapters import HTTPAdapter
+
+from bugbot import http_cache, runner
+
+URL = "https://bugzilla.mozilla.org/rest/product?names=Core"
+
+
+class FakeServer:
+    def __init__(self):
+        self.requests = []
+        self.etag = '"v1"'
+        self.content = b'{"products": []}'
+
+    def send(self, adapter, request, **kwargs):
+        self.requests.append(dict(request.headers))
+        response = Response()
+        if request.headers.get("If-None-Match") == self.etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response.headers["ETag"] = self.etag
+            response.headers["Content-Type"] = "application/json"
+            response._content = self.content
+        return response
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        http_cache.ResponseStore,
+        "_instance",
+        http_cache.ResponseStore(str(tmp_path / "http.sqlite")),
+    )
+    monkeypatch.setattr(http_cache, "_stats", http_cache.Counter())
+    monkeypatch.setattr(
+        http_cache, "_endpoints", [(http_cache.re.compile(r"/rest/product\?"), 60)]
+    )
+    return FakeServer()
+
+
+def _get(send, url=URL, method="GET"):
+    return send(None, Request(method, url).prepare())
+
+
+def test_cached_send(server, monkeypatch):
+    send = http_cache._cached_send(server.send)
+
+    assert _get(send).json() == {"products": []}
+    response = _get(send)
+    assert response.json() == {"products": []}
+    assert response.url == URL
+    assert len(server.requests) == 1
+    assert http_cache.get_stats() == {"miss": 1, "hit": 1}
+
+    # Once the TTL is over, the response is revalidated
+    now = http_cache.time.time()
+    monkeypatch.setattr(http_cache.time, "time", lambda: now + 61)
+    assert _get(send).json() == {"products": []}
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    assert http_cache.get_stats()["revalidated"] == 1
+
+    assert _get(send).status_code == 200
+    assert len(server.requests) == 2
+
+    # and fetched again when it changed
+    monkeypatch.setattr(http_cache.time, "time", lambda: now + 200)
+    server.etag = '"v2"'
+    server.content = b'{"products": [{"name": "Core"}]}'
+    assert _get(send).json() == {"products": [{"name": "Core"}]}
+    assert _get(send).json() == {"products": [{"name": "Core"}]}
+    assert len(server.requests) == 3
+
+
+def test_not_cached(server):
+    send = http_cache._cached_send(server.send)
+
+    for url, method in [
+        ("https://bugzilla.mozilla.org/rest/bug?id=123", "GET"),
+        (URL, "POST"),
+    ]:
+        _get(send, url, method)
+        _get(send, url, method)
+
+    assert len(server.requests) == 4
+    assert http_cache.get_stats() == {}
+
+
+def test_hits_are_not_limited(server, monkeypatch):
+    acquired = []
+
+    class FakeSemaphore:
+        def __enter__(self):
+            acquired.append(True)
+
+        def __exit__(self, *args):
+            pass
+
+    monkeypatch.setattr(HTTPAdapter, "send", http_cache._cached_send(server.send))
+    monkeypatch.setattr(runner, "_host_semaphores", {})
+    runner.limit_hosts({"bugzilla.mozilla.org": FakeSemaphore()})
+
+    assert _get(HTTPAdapter.send).json() == {"products": []}
+    assert _get(HTTPAdapter.send).json() == {"products": []}
+    assert http_cache.get_stats() == {"miss": 1, "hit": 1}
+    # Only the request sent to the server waited for the host
+    assert acquired == [True]
@@ -4,7 +4,12 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from bugbot.mail import replaceUnicode
+import smtplib
+
+import pytest
+
+from bugbot import utils
+from bugbot.mail import Transport, replaceUnicode, send_many
 
 
 def test_replaceUnicode():
@@ -23,3 +28,80 @@ def test_replaceUnicode():
     s = ""
     r = replaceUnicode(s)
     assert r == s
+
+
+class FakeSMTP:
+    connections: list = []
+    disconnect_after = None
+
+    def __init__(self, server, port, **kwargs):
+        self.sent = []
+        self.logins = []
+        FakeSMTP.connections.append(self)
+
+    def set_debuglevel(self, level):
+        pass
+
+    def login(self, username, password):
+        self.logins.append(username)
+
+    def sendmail(self, From, To, msg):
+        if "fail" in To:
+            raise smtplib.SMTPRecipientsRefused({"fail": (550, "no")})
+        if len(self.sent) == FakeSMTP.disconnect_after:
+            raise smtplib.SMTPServerDisconnected()
+        self.sent.append(msg)
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    monkeypatch.setattr(smtplib, "SMTP_SSL", FakeSMTP)
+    monkeypatch.setattr(utils, "get_login_info", lambda: {})
+    FakeSMTP.connections = []
+    FakeSMTP.disconnect_after = None
+    return FakeSMTP
+
+
+LOGIN = {"ldap_username": "bot", "ldap_password": "pwd"}
+
+
+def _messages(receivers):
+    return [("from", [to], f"message {i}") for i, to in enumerate(receivers)]
+
+
+def test_send_many(smtp):
+    status = send_many(_messages(["a", "fail", "b", "c"]), login=LOGIN, max_workers=1)
+    assert status == ["Success", "Failure", "Success", "Success"]
+
+    # The connection is opened again after a failure
+    assert [c.sent for c in smtp.connections] == [
+        ["message 0"],
+        ["message 2", "message 3"],
+    ]
+    assert all(c.logins == ["bot"] for c in smtp.connections)
+
+
+def test_send_many_workers(smtp):
+    status = send_many(_messages("abcde"), login=LOGIN, max_workers=2)
+    assert status == ["Success"] * 5
+    assert len(smtp.connections) == 2
+    assert sorted(m for c in smtp.connections for m in c.sent) == [
+        f"message {i}" for i in range(5)
+    ]
+
+
+def test_reconnect(smtp):
+    smtp.disconnect_after = 1
+    transport = Transport(LOGIN)
+    for i in range(3):
+        transport.sendmail("from", ["a"], f"message {i}")
+    transport.close()
+
+    assert [c.sent for c in smtp.connections] == [
+        ["message 0"],
+        ["message 1"],
+        ["message 2"],
+    ]
@@ -0,0 +1,82 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import csv
+import json
+
+from requests import Request, Response
+
+from bugbot import metrics
+
+
+def _fake_send(adapter, request, **kwargs):
+    response = Response()
+    response.status_code = 200
+    response._content = b"0123456789"
+    return response
+
+
+def test_rule_metrics(monkeypatch):
+    monkeypatch.setattr(
+        metrics, "_totals", {"requests": 0, "bytes_sent": 0, "bytes_received": 0}
+    )
+    send = metrics._counted_send(_fake_send)
+    request = Request("POST", "https://bugzilla.mozilla.org/rest", data="abc")
+
+    rule_metrics = metrics.RuleMetrics("test_rule")
+    send(None, request.prepare())
+    with rule_metrics.phase("search"):
+        send(None, request.prepare())
+        send(None, request.prepare())
+    with rule_metrics.phase("search"):
+        send(None, request.prepare())
+    with rule_metrics.phase("render"):
+        pass
+    rule_metrics.add_bugs(5)
+
+    record = rule_metrics.finish()
+    assert record["rule"] == "test_rule"
+    assert record["bugs"] == 5
+    assert record["requests"] == 4
+    assert record["bytes_sent"] == 12
+    assert record["bytes_received"] == 40
+    assert record["phases"]["search"]["requests"] == 3
+    assert record["phases"]["search"]["bytes_received"] == 30
+    assert record["phases"]["render"]["requests"] == 0
+
+    assert metrics.pop_records() == [record]
+    assert metrics.pop_records() == []
+
+
+def test_write_report(tmp_path):
+    records = [
+        {
+            "rule": "test_rule",
+            "duration": 1.5,
+            "bugs": 2,
+            "requests": 3,
+            "bytes_sent": 0,
+            "bytes_received": 100,
+            "phases": {
+                "search": {
+                    "duration": 1.0,
+                    "requests": 3,
+                    "bytes_sent": 0,
+                    "bytes_received": 100,
+                }
+            },
+        }
+    ]
+    path = str(tmp_path / "reports" / "hourly")
+    metrics.write_report(records, path)
+
+    with open(path + ".json") as In:
+        assert json.load(In) == records
+
+    with open(path + ".csv") as In:
+        rows = list(csv.DictReader(In))
+    assert len(rows) == 1
+    assert rows[0]["rule"] == "test_rule"
+    assert rows[0]["search_duration"] == "1.0"
+    assert rows[0]["autofix_duration"] == ""
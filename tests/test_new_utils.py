@@ -2,7 +2,10 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from bugbot import utils
+import contextvars
+import logging
+
+from bugbot import log_level, log_rule, utils
 
 
 def test_get_signatures():
@@ -21,3 +24,17 @@ def test_add_signatures():
 
     sgns = utils.add_signatures("", new)
     assert sgns == "[@ abc]\n[@ def]\n[@ ghi]\n[@ jkl]"
+
+
+def test_context_thread_pool_executor():
+    def get_context():
+        return log_rule.get(), log_level.get()
+
+    def run():
+        log_rule.set("rule")
+        log_level.set(logging.DEBUG)
+        with utils.ContextThreadPoolExecutor(max_workers=2) as pool:
+            return list(pool.map(lambda _: get_context(), range(3)))
+
+    assert contextvars.copy_context().run(run) == [("rule", logging.DEBUG)] * 3
+    assert log_rule.get() is None
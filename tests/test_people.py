@@ -0,0 +1,244 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+import numpy as np
+import pytest
+
+from bugbot import people as people_module
+from bugbot.people import ManagementIndex, NameIndex, People
+
+# name: (manager, title)
+HIERARCHY = {
+    "ceo": ("ceo", "CEO"),
+    "vp1": ("ceo", "VP Engineering"),
+    "vp2": ("ceo", "Vice President Product"),
+    "dir1": ("vp1", "Director Firefox"),
+    "dir2": ("vp2", "Senior Director"),
+    "m1": ("dir1", "Engineering Manager"),
+    "m2": ("dir2", "Manager"),
+    "m3": ("m1", "Manager"),
+    "vp3": ("m3", "VP too deep"),
+    "e1": ("m3", "Engineer"),
+    "e2": ("m2", "Engineer"),
+    "e3": ("vp3", "Engineer"),
+    "e4": ("ceo", "Engineer"),
+}
+
+
+def _mail(name):
+    return f"{name}@mozilla.com"
+
+
+def _get_people_data():
+    return [
+        {
+            "mail": _mail(name),
+            "cn": name.upper(),
+            "manager": {"dn": f"mail={_mail(manager)},o=com,dc=mozilla"},
+            "title": title,
+        }
+        for name, (manager, title) in HIERARCHY.items()
+    ]
+
+
+def _walk(people, mail):
+    """The management chain of someone, one manager at a time"""
+    chain = []
+    while True:
+        mail = people.get_manager_mail(mail)
+        if mail is None:
+            return chain
+        chain.append(mail)
+
+
+def test_management_index():
+    people = People(_get_people_data())
+    assert people.get_vps() == {_mail("vp1"), _mail("vp2")}
+
+    for name in HIERARCHY:
+        mail = _mail(name)
+        chain = _walk(people, mail)
+        assert people.get_distance(mail) == len(chain)
+        assert people.get_director_mail(mail) == next(
+            (m for m in chain if m in people.get_directors()), None
+        )
+        assert people.get_vp_mail(mail) == next(
+            (m for m in chain if m in people.get_vps()), None
+        )
+        for rank in range(5):
+            expected = chain[min(rank, len(chain)) - 1] if rank and chain else mail
+            assert people.get_nth_manager_mail(mail, rank) == expected
+        for other in HIERARCHY:
+            other = _mail(other)
+            assert people.is_under(mail, other) == (other in chain)
+            if other in chain:
+                expected = set(chain[: chain.index(other)])
+                assert people.get_management_chain_mails(mail, other) == expected
+            elif other != mail:
+                assert people.get_management_chain_mails(mail, other, False) == set()
+
+    assert people.get_nth_manager_mail("unknown@mozilla.com", 2) == (
+        "unknown@mozilla.com"
+    )
+    assert not people.is_under("unknown@mozilla.com", _mail("ceo"))
+    assert people.get_director_mail("unknown@mozilla.com") is None
+
+
+def test_circular_management_chain():
+    data = _get_people_data()
+    data.append(
+        {
+            "mail": _mail("x"),
+            "cn": "X",
+            "manager": {"dn": f"mail={_mail('y')},o=com,dc=mozilla"},
+        }
+    )
+    data.append(
+        {
+            "mail": _mail("y"),
+            "cn": "Y",
+            "manager": {"dn": f"mail={_mail('x')},o=com,dc=mozilla"},
+        }
+    )
+    people = People(data)
+
+    assert not people.is_under(_mail("x"), _mail("ceo"))
+    with pytest.raises(Exception, match="Circular"):
+        people.get_management_chain_mails(_mail("x"), _mail("ceo"))
+
+
+def test_management_index_is_saved(tmp_path, monkeypatch):
+    monkeypatch.setattr(people_module, "get_cache_dir", lambda: str(tmp_path))
+    path = tmp_path / "configs" / "people.json"
+    path.parent.mkdir()
+    path.write_text(json.dumps(_get_people_data()))
+
+    people = People(str(path))
+    assert people.get_vp_mail(_mail("e1")) == _mail("vp1")
+    assert (tmp_path / "people.management.json").exists()
+    assert not (tmp_path / "configs" / "people.management.json").exists()
+
+    def build(people):
+        raise AssertionError("The index should be loaded")
+
+    monkeypatch.setattr(ManagementIndex, "build", build)
+    people = People(str(path))
+    assert people.get_vp_mail(_mail("e1")) == _mail("vp1")
+    assert people.is_under(_mail("e2"), _mail("vp2"))
+    assert people.get_vps() == {_mail("vp1"), _mail("vp2")}
+
+    # The index is rebuilt when its format changes
+    version = people_module.INDEX_VERSION
+    monkeypatch.setattr(people_module, "INDEX_VERSION", version + 1)
+    with pytest.raises(AssertionError):
+        People(str(path)).get_vp_mail(_mail("e1"))
+    monkeypatch.setattr(people_module, "INDEX_VERSION", version)
+
+    # or when the people file changes
+    path.write_text(json.dumps(_get_people_data()[:-1]))
+    with pytest.raises(AssertionError):
+        People(str(path)).get_vp_mail(_mail("e1"))
+
+
+NAMES = [
+    "Jane Doe",
+    "John Doe",
+    "Jean-Pierre Dupont",
+    "Marie Dupont",
+    "Li Wei",
+    "Wei Li Zhang",
+    "Ana María López",
+    "Anna Maria Lopez",
+]
+
+
+def _get_named_people_data():
+    return [
+        {
+            "mail": f"p{i}@mozilla.com",
+            "bugzillaEmail": f"p{i}@example.com",
+            "cn": name,
+            "manager": {},
+        }
+        for i, name in enumerate(NAMES)
+    ]
+
+
+def _dense_search_by_name(people, name):
+    """The search with a dense matrix of the bigrams of the names"""
+    rows = {person["cn"]: person for person in people.data}
+    bigrams = sorted({b for cn in rows for b in people._get_bigrams(cn)})
+    columns = {b: i for i, b in enumerate(bigrams)}
+    matrix = np.zeros((len(rows), len(bigrams)))
+    for i, cn in enumerate(rows):
+        stats = people._get_bigrams_stats(cn)
+        L = np.sqrt(sum(v * v for v in stats.values()))
+        for b, n in stats.items():
+            matrix[i][columns[b]] = n / L
+
+    x = np.zeros(len(bigrams))
+    stats = {k: v for k, v in people._get_bigrams_stats(name).items() if k in columns}
+    L = np.sqrt(sum(v * v for v in stats.values()))
+    for b, n in stats.items():
+        x[columns[b]] = n / L
+    res = matrix @ x
+    for cos in [0.99, 0.9, 0.8, 0.7]:
+        index = np.argwhere(res > cos)
+        if index.shape[0] == 1:
+            return list(rows.values())[index[0][0]]
+
+    found = None
+    name_parts = people._get_name_parts(name)
+    for person in rows.values():
+        if name_parts <= people._get_name_parts(person["cn"]):
+            if found is None:
+                found = person
+            else:
+                return None
+    return found
+
+
+@pytest.mark.parametrize(
+    "name",
+    NAMES
+    + ["jane doe", "Doe", "Dupont", "Wei", "Zhang", "Maria", "Jon Do", "Nobody", ""],
+)
+def test_search_by_name(name):
+    people = People(_get_named_people_data())
+    assert people.search_by_name(name) == _dense_search_by_name(people, name)
+
+
+def test_search_by_names():
+    people = People(_get_named_people_data())
+    assert people.get_bzmails_from_names(["Jane Doe", "Zhang", "Doe", "Zhang"]) == {
+        "Jane Doe": "p0@example.com",
+        "Zhang": "p5@example.com",
+        "Doe": None,
+    }
+
+    matches = people.get_top_matches_by_name("Ana Lopez", k=2)
+    assert [person["cn"] for person, _ in matches] == [
+        "Anna Maria Lopez",
+        "Ana María López",
+    ]
+    assert matches[0][1] >= matches[1][1]
+
+
+def test_name_index_is_saved(tmp_path, monkeypatch):
+    monkeypatch.setattr(people_module, "get_cache_dir", lambda: str(tmp_path))
+    path = tmp_path / "people.json"
+    path.write_text(json.dumps(_get_named_people_data()))
+
+    assert People(str(path)).search_by_name("Li Wei")["cn"] == "Li Wei"
+    assert (tmp_path / "people.names.json").exists()
+
+    def build(people):
+        raise AssertionError("The index should be loaded")
+
+    monkeypatch.setattr(NameIndex, "build", build)
+    people = People(str(path))
+    for name in NAMES + ["Zhang", "Doe"]:
+        assert people.search_by_name(name) == _dense_search_by_name(people, name)
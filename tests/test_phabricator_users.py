@@ -0,0 +1,57 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot.phabricator_users import PhabricatorUsers
+
+ACCOUNTS = {"PHID-USER-a": 1, "PHID-USER-b": 2}
+EPOCHS = {"PHID-USER-a": 1600000000}
+
+
+@pytest.fixture
+def users(tmp_path):
+    return PhabricatorUsers(str(tmp_path / "phab.sqlite"), ttl=60, max_workers=2)
+
+
+def test_get_bz_ids(users):
+    chunks = []
+
+    def fetch(phids):
+        chunks.append(phids)
+        return [
+            {"phid": phid, "id": str(ACCOUNTS[phid])}
+            for phid in phids
+            if phid in ACCOUNTS
+        ]
+
+    phids = ["PHID-USER-a", "PHID-USER-b", "PHID-USER-c"]
+    assert users.get_bz_ids(phids, fetch, chunk_size=2) == {
+        "PHID-USER-a": 1,
+        "PHID-USER-b": 2,
+        "PHID-USER-c": None,
+    }
+    assert sorted(chunks) == [["PHID-USER-a", "PHID-USER-b"], ["PHID-USER-c"]]
+
+    other = PhabricatorUsers(users.path, ttl=60)
+    assert other.get_bz_ids(phids, fetch)["PHID-USER-b"] == 2
+    assert len(chunks) == 2
+
+
+def test_get_last_activities(users, monkeypatch):
+    fetched = []
+
+    def fetch(phid):
+        fetched.append(phid)
+        return EPOCHS.get(phid)
+
+    assert users.get_last_activities(["PHID-USER-a", "PHID-USER-b"], fetch) == {
+        "PHID-USER-a": 1600000000,
+        "PHID-USER-b": None,
+    }
+    assert users.get_last_activities(["PHID-USER-b", "PHID-USER-c"], fetch) == {
+        "PHID-USER-b": None,
+        "PHID-USER-c": None,
+    }
+    assert sorted(fetched) == ["PHID-USER-a", "PHID-USER-b", "PHID-USER-c"]
@@ -0,0 +1,91 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot.crash import processed_crashes
+from bugbot.crash.analyzer import SignatureAnalyzer
+from bugbot.crash.processed_crashes import ProcessedCrashes, trim_processed_crash
+
+
+def make_processed_crash(uuid):
+    return {
+        "uuid": uuid,
+        "signature": "foo",
+        "proto_signature": "foo | bar",
+        "crashing_thread": 1,
+        "reason": "SIGSEGV",
+        "addons": ["a", "b"],
+        "json_dump": {
+            "crashing_thread": {"frames": [{"module": "xul.dll"}]},
+            "modules": [{"filename": "xul.dll"}],
+            "threads": [
+                {"frames": [{"module": "ntdll.dll"}]},
+                {"frames": [{"module": "xul.dll", "function": "foo"}]},
+            ],
+        },
+    }
+
+
+class FakeProcessedCrash:
+    URL = "https://crash-stats.mozilla.org/api/ProcessedCrash/"
+    uuids: list = []
+
+    def __init__(self, queries):
+        for query in queries:
+            uuid = query.params["crash_id"]
+            FakeProcessedCrash.uuids.append(uuid)
+            query.handler(make_processed_crash(uuid), query.handlerdata)
+
+    def wait(self):
+        pass
+
+
+@pytest.fixture
+def crashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(processed_crashes.socorro, "ProcessedCrash", FakeProcessedCrash)
+    FakeProcessedCrash.uuids = []
+    crashes = ProcessedCrashes(str(tmp_path / "crashes.sqlite"))
+    monkeypatch.setattr(ProcessedCrashes, "_instance", crashes)
+    return crashes
+
+
+def test_trim_processed_crash():
+    assert trim_processed_crash(make_processed_crash("1")) == {
+        "uuid": "1",
+        "signature": "foo",
+        "proto_signature": "foo | bar",
+        "crashing_thread": 1,
+        "reason": "SIGSEGV",
+        "json_dump": {
+            "crashing_thread": {"frames": [{"module": "xul.dll"}]},
+            "threads": [
+                {"frames": []},
+                {"frames": [{"module": "xul.dll", "function": "foo"}]},
+            ],
+        },
+    }
+
+
+def test_saved_between_runs(crashes):
+    assert crashes.get(["1", "2"])["2"]["uuid"] == "2"
+    assert crashes.get(["2", "3"]).keys() == {"2", "3"}
+    assert FakeProcessedCrash.uuids == ["1", "2", "3"]
+
+    other = ProcessedCrashes(crashes.path)
+    assert other.get(["1"])["1"] == trim_processed_crash(make_processed_crash("1"))
+    assert FakeProcessedCrash.uuids == ["1", "2", "3"]
+
+
+def test_candidates_prefetched(crashes, monkeypatch):
+    monkeypatch.setattr(SignatureAnalyzer, "PREFETCHED_REPORTS", 2)
+    analyzer = object.__new__(SignatureAnalyzer)
+    reports = iter({"uuid": str(i)} for i in range(5))
+
+    candidates = analyzer._iter_processed_crashes(reports)
+    assert next(candidates)["uuid"] == "0"
+    assert FakeProcessedCrash.uuids == ["0", "1"]
+    assert next(candidates)["uuid"] == "1"
+    assert next(candidates)["uuid"] == "2"
+    assert FakeProcessedCrash.uuids == ["0", "1", "2", "3"]
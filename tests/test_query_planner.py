@@ -0,0 +1,82 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from bugbot.crash.query_planner import (
+    PREFIX_FACETS_SIZE,
+    SignatureQueryPlan,
+    get_param_length,
+)
+
+
+class FakeSuperSearch:
+    params: list = []
+
+    def __init__(self, params, handler, handlerdata, **kwargs):
+        FakeSuperSearch.params.append(params)
+        handler(
+            {
+                "facets": {
+                    "signature": [
+                        {"term": value[1:], "count": 1} for value in params["signature"]
+                    ]
+                }
+            },
+            handlerdata,
+        )
+
+    def wait(self):
+        pass
+
+
+def test_chunks_fit():
+    signatures = [f"{'a' * (i % 7 + 1) * 10}{i}" for i in range(100)]
+    plan = SignatureQueryPlan(signatures, max_length=300)
+
+    values = [value for chunk in plan.chunks for value in chunk.values]
+    assert sorted(values) == sorted("=" + signature for signature in signatures)
+    for chunk in plan.chunks:
+        assert sum(get_param_length(value) for value in chunk.values) <= 300
+        assert chunk.facets_size == len(chunk.values)
+
+    # The chunks are almost full
+    total = sum(get_param_length(value) for value in values)
+    assert len(plan) == total // 300 + 1
+
+
+def test_url_encoding():
+    plan = SignatureQueryPlan(["a | b", "c | d"], max_length=40)
+    assert len(plan) == 2
+
+
+def test_oversized_signature():
+    long_signature = "foo | " * 100
+    plan = SignatureQueryPlan(["bar", long_signature], max_length=100)
+
+    assert plan.oversized == [long_signature]
+    assert len(plan) == 2
+    prefix = max(plan.chunks, key=lambda chunk: chunk.facets_size)
+    assert prefix.facets_size == PREFIX_FACETS_SIZE + 1
+    assert prefix.values[0].startswith("^foo | ")
+    assert get_param_length(prefix.values[0]) <= 100
+
+
+def test_run():
+    FakeSuperSearch.params = []
+    signatures = {f"signature {i}" for i in range(10)}
+    plan = SignatureQueryPlan(signatures, max_length=100)
+
+    found = set()
+    plan.run(
+        {"_facets": "signature"},
+        lambda res, data: data.update(
+            facet["term"] for facet in res["facets"]["signature"]
+        ),
+        found,
+        search_class=FakeSuperSearch,
+        max_workers=2,
+    )
+
+    assert found == signatures
+    assert len(FakeSuperSearch.params) == len(plan) > 1
+    assert all(params["_facets"] == "signature" for params in FakeSuperSearch.params)
@@ -13,6 +13,8 @@ import pytest
 from bugbot.people import People
 from bugbot.round_robin import RotationDefinitions, RoundRobin
 from bugbot.round_robin_calendar import BadFallback
+from bugbot.rules.to_triage import ToTriage
+from bugbot.rules.workflow.no_severity_ni import NoSeverityNeedInfo
 
 
 class RotationDefinitionsMockup(RotationDefinitions):
@@ -144,6 +146,48 @@ def test_get_ics(round_robin_config_ics, round_robin_people, mk_bug):
         assert rr.get(mk_bug("Foo::Bar"), "2019-03-01") == ("ij@mozilla.com", "ij")
 
 
+class FakeBugzillaUsers:
+    def __init__(self):
+        self.prefetched = set()
+
+    def prefetch(self, names):
+        self.prefetched.update(names)
+
+
+def test_prefetch_nicks(round_robin_config, round_robin_people):
+    users = FakeBugzillaUsers()
+    rr = RoundRobin(
+        rotation_definitions=round_robin_config,
+        people=round_robin_people,
+        bugzilla_users=users,
+    )
+
+    # Only the calendar of the component is prefetched
+    rr.prefetch_nicks("2019-02-17", ["P3::C3"])
+    assert users.prefetched == {"ef@mozilla.com", "gh@mozilla.com"}
+
+    rr.prefetch_nicks("2019-02-17", ["P1::C1", "Foo::Bar"])
+    assert users.prefetched == {"ab@mozilla.com", "ef@mozilla.com", "gh@mozilla.com"}
+
+
+@pytest.mark.parametrize("rule_class", [ToTriage, NoSeverityNeedInfo])
+def test_rules_prefetch_nicks(rule_class, round_robin_config, round_robin_people):
+    users = FakeBugzillaUsers()
+    rule = rule_class.__new__(rule_class)
+    rule.round_robin = RoundRobin(
+        rotation_definitions=round_robin_config,
+        people=round_robin_people,
+        bugzilla_users=users,
+    )
+    rule.components = rule.round_robin.get_components()
+    rule.lookup = 2
+
+    # The triagers of all the components are prefetched before the bugs are
+    # handled
+    rule.get_bz_params("2019-02-17")
+    assert users.prefetched == {"ab@mozilla.com", "ef@mozilla.com", "gh@mozilla.com"}
+
+
 def test_get_who_to_nag(round_robin_config, round_robin_people):
     rr = RoundRobin(rotation_definitions=round_robin_config, people=round_robin_people)
 
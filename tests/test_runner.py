@@ -0,0 +1,260 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import contextvars
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+import pytest
+from requests import Request
+
+from bugbot import log_level, log_rule, runner, set_log_level
+
+MODULE = """
+class Rule:
+    def __init__(self, channel="nightly"):
+        self.channel = channel
+        self.argv = None
+
+    def run(self, argv=None):
+        self.argv = argv
+
+
+if __name__ == "__main__":
+    Rule().run()
+    Rule("beta").run()
+"""
+
+
+def _load_module(tmp_path, source):
+    path = tmp_path / "fake_rule.py"
+    path.write_text(source)
+    spec = importlib.util.spec_from_file_location("fake_rule", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_parse_schedule():
+    script = """#!/bin/bash
+source ./scripts/cron_common_start.sh
+
+# A comment
+python -m bugbot.rules.no_assignee --production
+# python -m bugbot.rules.has_str_no_hasstr
+python -m bugbot.rules.component --frequency hourly --production
+python -m bugbot.rules.workflow.multi_nag --production
+python -m bugbot.log --send
+"""
+    assert runner.parse_schedule(script) == [
+        runner.RuleInvocation("bugbot.log", ["--clean"]),
+        runner.RuleInvocation("bugbot.rules.no_assignee", ["--production"]),
+        runner.RuleInvocation(
+            "bugbot.rules.component", ["--frequency", "hourly", "--production"]
+        ),
+        runner.RuleInvocation("bugbot.rules.workflow.multi_nag", ["--production"]),
+        runner.RuleInvocation("bugbot.log", ["--send"]),
+    ]
+
+
+def test_parse_schedule_unsupported_command():
+    with pytest.raises(ValueError, match="cannot run the command: ls -l"):
+        runner.parse_schedule("python -m bugbot.rules.no_assignee\nls -l\n")
+
+
+@pytest.mark.parametrize("schedule", runner.SCHEDULES)
+def test_schedules_refer_to_existing_rules(schedule):
+    invocations = runner.get_schedule(schedule)
+    assert invocations
+    for invocation in invocations:
+        path = invocation.module.replace(".", os.path.sep) + ".py"
+        assert os.path.exists(path), path
+
+
+def test_get_invocations():
+    args = argparse.Namespace(
+        schedule=None, rules=["no_assignee", "workflow.p1"], dryrun=False
+    )
+    assert runner.get_invocations(args) == [
+        runner.RuleInvocation("bugbot.rules.no_assignee", ["--production"]),
+        runner.RuleInvocation("bugbot.rules.workflow.p1", ["--production"]),
+    ]
+
+    args = argparse.Namespace(schedule="hourly", rules=None, dryrun=True)
+    for invocation in runner.get_invocations(args):
+        assert "--production" not in invocation.args
+
+    # The steps without a production mode are not changed
+    args = argparse.Namespace(schedule="daily", rules=None, dryrun=False)
+    invocations = runner.get_invocations(args)
+    assert runner.RuleInvocation("bugbot.iam", []) in invocations
+    assert invocations[-1] == runner.RuleInvocation("bugbot.log", ["--send"])
+
+
+def test_get_entry_points(tmp_path):
+    module = _load_module(tmp_path, MODULE)
+    rules = list(runner.get_entry_points(module))
+
+    assert [type(rule) for rule in rules] == [module.Rule, module.Rule]
+    assert [rule.channel for rule in rules] == ["nightly", "beta"]
+
+
+def test_get_entry_points_unsupported(tmp_path):
+    module = _load_module(tmp_path, MODULE.replace("Rule().run()", "print('hi')"))
+    with pytest.raises(runner.InvalidEntryPointError):
+        list(runner.get_entry_points(module))
+
+    module = _load_module(tmp_path, MODULE.split("if __name__")[0])
+    with pytest.raises(runner.InvalidEntryPointError):
+        list(runner.get_entry_points(module))
+
+
+def test_run_isolates_failures(tmp_path, monkeypatch):
+    module = _load_module(
+        tmp_path,
+        MODULE.replace("self.argv = argv", "raise SystemExit(2)"),
+    )
+    monkeypatch.setattr(runner.importlib, "import_module", lambda name: module)
+
+    results = runner.run(
+        [
+            runner.RuleInvocation("fake_rule", []),
+            runner.RuleInvocation("fake_rule", []),
+        ]
+    )
+    assert [result.success for result in results] == [False, False]
+
+
+def test_run_concurrently_respects_dependencies(monkeypatch):
+    order = []
+    first_started = threading.Event()
+
+    def fake_run_rule(invocation):
+        if invocation.module == "bugbot.rules.component":
+            first_started.set()
+            time.sleep(0.1)
+        else:
+            first_started.wait()
+        order.append(invocation.module)
+        return runner.RuleResult(invocation.module, True, 0.0)
+
+    def fake_get_config(name, entry, default=None):
+        if name == "prod_comp_changed_with_priority" and entry == "run_after":
+            return ["component"]
+        return default
+
+    monkeypatch.setattr(runner, "run_rule", fake_run_rule)
+    monkeypatch.setattr(runner.utils, "get_config", fake_get_config)
+
+    invocations = [
+        runner.RuleInvocation("bugbot.rules.component", []),
+        runner.RuleInvocation("bugbot.rules.prod_comp_changed_with_priority", []),
+        runner.RuleInvocation("bugbot.rules.no_assignee", []),
+    ]
+    results = runner.run(invocations, max_workers=3, executor="thread")
+
+    assert [result.module for result in results] == [
+        invocation.module for invocation in invocations
+    ]
+    assert order.index("bugbot.rules.component") < order.index(
+        "bugbot.rules.prod_comp_changed_with_priority"
+    )
+    assert order[0] == "bugbot.rules.no_assignee"
+
+
+def test_run_step(tmp_path, monkeypatch):
+    (tmp_path / "fake_step.py").write_text(
+        "import pathlib, sys\n"
+        "if __name__ == '__main__':\n"
+        "    pathlib.Path(__file__).with_suffix('.out').write_text(' '.join(sys.argv))\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    result = runner.run_rule(runner.RuleInvocation("fake_step", ["--send"]))
+    assert result.success
+    assert (tmp_path / "fake_step.out").read_text() == "fake_step --send"
+
+
+def test_run_concurrently_waits_for_steps(monkeypatch):
+    order = []
+
+    def fake_run_rule(invocation):
+        if invocation.module == "bugbot.iam":
+            time.sleep(0.1)
+        order.append(invocation.module)
+        return runner.RuleResult(invocation.module, True, 0.0)
+
+    monkeypatch.setattr(runner, "run_rule", fake_run_rule)
+
+    invocations = [
+        runner.RuleInvocation("bugbot.rules.component", []),
+        runner.RuleInvocation("bugbot.iam", []),
+        runner.RuleInvocation("bugbot.rules.no_assignee", []),
+        runner.RuleInvocation("bugbot.log", ["--send"]),
+    ]
+    runner.run(invocations, max_workers=3, executor="thread")
+
+    assert order == [invocation.module for invocation in invocations]
+
+
+def test_run_rule_isolates_log_context(tmp_path, monkeypatch):
+    module = _load_module(
+        tmp_path,
+        MODULE.replace(
+            "self.argv = argv",
+            "import logging\n"
+            "        from bugbot import log_level, log_rule\n"
+            "        log_rule.set(self.channel)\n"
+            "        log_level.set(logging.DEBUG)\n"
+            "        self.argv = argv",
+        ),
+    )
+    monkeypatch.setattr(runner.importlib, "import_module", lambda name: module)
+
+    runner.run_rule(runner.RuleInvocation("fake_rule", []))
+    assert log_rule.get() is None
+    assert log_level.get() == logging.INFO
+
+
+def test_set_log_level(monkeypatch):
+    root = logging.getLogger()
+    monkeypatch.setattr(root, "level", logging.INFO)
+
+    # The other contexts don't get the records of a lower level
+    contextvars.copy_context().run(set_log_level, logging.DEBUG)
+    assert root.level == logging.DEBUG
+    assert log_level.get() == logging.INFO
+
+    contextvars.copy_context().run(set_log_level, logging.WARNING)
+    assert root.level == logging.DEBUG
+
+
+def test_limited_send(monkeypatch):
+    acquired = []
+
+    class FakeSemaphore:
+        def __init__(self, host):
+            self.host = host
+
+        def __enter__(self):
+            acquired.append(self.host)
+
+        def __exit__(self, *args):
+            pass
+
+    host = "bugzilla.mozilla.org"
+    monkeypatch.setattr(runner, "_host_semaphores", {host: FakeSemaphore(host)})
+    send = runner._limited_send(lambda adapter, request: request.url)
+
+    for url in [
+        "https://bugzilla.mozilla.org/rest/bug",
+        "https://crash-stats.mozilla.org/api/SuperSearch/",
+    ]:
+        assert send(None, Request("GET", url).prepare()) == url
+
+    assert acquired == [host]
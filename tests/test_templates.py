@@ -0,0 +1,40 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+
+import pytest
+
+from bugbot import templates
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setattr(templates, "get_cache_dir", lambda: str(tmp_path))
+    monkeypatch.setattr(templates, "_env", None)
+    return tmp_path
+
+
+def test_precompile(env):
+    count = templates.precompile()
+    assert count == len(os.listdir(templates.TEMPLATES_DIR))
+    assert len(os.listdir(env / "jinja")) == count
+
+
+def test_compiled_once(env, monkeypatch):
+    template = templates.get_template("common.html")
+    assert templates.get_template("common.html") is template
+
+    # A new process loads the compiled code from the cache directory
+    monkeypatch.setattr(templates, "_env", None)
+    compile = templates.get_env().compile
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError("The template should not be compiled")
+
+    monkeypatch.setattr(templates.get_env(), "compile", no_compile)
+    body = templates.render("common.html", message="Hello", query_url=None)
+    assert "Hello" in body
+
+    monkeypatch.setattr(templates.get_env(), "compile", compile)
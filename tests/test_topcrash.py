@@ -1,11 +1,11 @@
 import responses
 from libmozdata.socorro import Socorro
 
-from bugbot.topcrash import Topcrash
+from bugbot.topcrash import Topcrash, TopcrashSnapshot
 
 
 @responses.activate
-def test_get_blocked_signatures(setup_mock_urls):
+def test_get_blocked_signatures(setup_mock_urls, tmp_path):
     setup_mock_urls([Socorro.API_URL])
     crash_signature_block_patterns = [
         "!^EMPTY: ",
@@ -13,9 +13,50 @@ def test_get_blocked_signatures(setup_mock_urls):
         "!=IPCError-browser | ShutDownKill",
     ]
 
-    topcrash = Topcrash(signature_block_patterns=crash_signature_block_patterns)
+    snapshot = TopcrashSnapshot(str(tmp_path / "topcrash.sqlite"))
+    topcrash = Topcrash(
+        signature_block_patterns=crash_signature_block_patterns, snapshot=snapshot
+    )
     signatures = topcrash.get_blocked_signatures()
 
     assert "OOM | small" in signatures
     assert "IPCError-browser | ShutDownKill" in signatures
     assert "EMPTY: no frame data available; StreamSizeMismatch" in signatures
+
+    # The other rules get the signatures from the snapshot
+    responses.reset()
+    topcrash = Topcrash(
+        signature_block_patterns=crash_signature_block_patterns, snapshot=snapshot
+    )
+    assert topcrash.get_blocked_signatures() == signatures
+    assert len(responses.calls) == 0
+
+
+@responses.activate
+def test_fetch_signature_volume_from_snapshot(tmp_path):
+    snapshot = TopcrashSnapshot(str(tmp_path / "topcrash.sqlite"))
+    topcrash = Topcrash(date="2024-01-15", snapshot=snapshot)
+    snapshot.set_volumes(topcrash.date_range, {"OOM | small": 42, "foo": 0})
+
+    assert topcrash.fetch_signature_volume(["OOM | small", "foo"]) == {
+        "OOM | small": 42,
+        "foo": 0,
+    }
+    assert len(responses.calls) == 0
+
+
+def test_snapshot_search(tmp_path):
+    snapshot = TopcrashSnapshot(str(tmp_path / "topcrash.sqlite"))
+    params = {"product": "Firefox", "_facets_size": 10}
+    response = {"facets": {"signature": [{"term": "foo", "count": 20}]}}
+
+    assert snapshot.get_search(params) is None
+    snapshot.set_search(params, response)
+    assert snapshot.get_search(params) == response
+    assert snapshot.get_search({**params, "_facets_size": 5}) == response
+    assert snapshot.get_search({**params, "_facets_size": 20}) is None
+    assert snapshot.get_search({**params, "product": "Fenix"}) is None
+
+    # A response with fewer facets doesn't replace a larger one
+    snapshot.set_search({**params, "_facets_size": 5}, {"facets": {}})
+    assert snapshot.get_search(params) == response
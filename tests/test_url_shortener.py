@@ -0,0 +1,69 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from bugbot import utils
+from bugbot.url_shortener import UrlShortener, canonicalize
+
+BASE = "https://bugzilla.mozilla.org/buglist.cgi?"
+
+
+def _url(component, order=False):
+    params = [f"product=Core&component={component}", "f1=" + "x" * 600]
+    if order:
+        params.reverse()
+    return BASE + "&".join(params)
+
+
+@pytest.fixture
+def shortener(tmp_path, monkeypatch):
+    calls = []
+
+    def shorten(url):
+        calls.append(url)
+        return None if "Broken" in url else f"https://mzl.la/{len(calls)}"
+
+    monkeypatch.setattr(UrlShortener, "_shorten", staticmethod(shorten))
+    shortener = UrlShortener(str(tmp_path / "short_urls.sqlite"))
+    shortener.calls = calls
+    return shortener
+
+
+def test_canonicalize():
+    assert canonicalize(BASE + "b=1&a=2&b=0") == BASE + "a=2&b=1&b=0"
+    assert canonicalize(_url("DOM", True)) == canonicalize(_url("DOM"))
+
+
+def test_placeholders(shortener):
+    assert shortener.placeholder("https://short") == "https://short"
+    assert shortener.placeholder(None) is None
+
+    texts = [
+        "<a href='{}'>bugs</a>".format(shortener.placeholder(url))
+        for url in [_url("DOM"), _url("DOM", True), _url("Layout")]
+    ]
+    assert not shortener.calls
+
+    filled = [shortener.fill(text) for text in texts]
+    assert len(shortener.calls) == 2
+    assert filled[0] == filled[1]
+    assert filled[2] != filled[0]
+    assert "https://mzl.la/" in filled[2]
+
+    # The next runs use the saved short urls
+    other = UrlShortener(shortener.path)
+    assert other.shorten(_url("Layout")) in filled[2]
+    assert len(shortener.calls) == 2
+
+
+def test_not_shortened(shortener):
+    url = _url("Broken")
+    short = shortener.shorten(url)
+    assert short.replace("\n", "") == url
+    assert max(len(line) for line in short.split("\n")) == utils.MAX_URL_LENGTH
+
+    # It is tried again in the next run
+    UrlShortener(shortener.path).shorten(url)
+    assert len(shortener.calls) == 2
@@ -7,7 +7,9 @@ import responses
 from libmozdata import utils as lmdutils
 from libmozdata.bugzilla import BugzillaUser
 
+from bugbot.bugzilla_users import BugzillaUsers
 from bugbot.people import People
+from bugbot.phabricator_users import PhabricatorUsers
 from bugbot.user_activity import UserActivity, UserStatus
 
 REFERENCE_DATE = "2022-08-18"
@@ -27,6 +29,17 @@ BOTS = {
 }
 
 
+@pytest.fixture(autouse=True)
+def user_activity_caches(tmp_path, monkeypatch):
+    """Don't share the users between the tests"""
+    monkeypatch.setattr(
+        BugzillaUsers, "_instance", BugzillaUsers(str(tmp_path / "bz.sqlite"))
+    )
+    monkeypatch.setattr(
+        PhabricatorUsers, "_instance", PhabricatorUsers(str(tmp_path / "phab.sqlite"))
+    )
+
+
 @pytest.fixture
 def user_activity_employees():
     return {"abc@mozilla.com", "def@mozilla.com"}